@@ -1,8 +1,9 @@
-from fastapi import APIRouter , Request
+from fastapi import APIRouter , Depends, HTTPException, Request
 from fastapi.responses import RedirectResponse
-from app.core.auth import get_auth_flow, save_tokens, load_tokens
+from app.core.accounts import DEFAULT_ACCOUNT, Account, account_for_email, get_current_account, issue_token
+from app.core.auth import get_auth_flow
 from app.core.config import settings
-import jwt
+from app.core.services import registry
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 
@@ -36,22 +37,23 @@ def oauth_callback(request: Request):
     except ValueError:
         user_email = "unknown"
 
-    save_tokens(creds)
+    if settings.MULTI_ACCOUNT:
+        if user_email == "unknown":
+            raise HTTPException(status_code=400, detail="Could not determine the Google account.")
+        account = account_for_email(user_email)
+    else:
+        account = DEFAULT_ACCOUNT
+    registry.credentials(account).save(creds)
 
-    token = jwt.encode({"email": user_email}, settings.SECRET_KEY, algorithm="HS256")
+    # Sent back as `Authorization: Bearer <token>`, it selects the account
+    token = issue_token(user_email)
 
     return RedirectResponse(url=f"http://localhost:5173/connected?token={token}")
 
 @router.get("/status")
-def check_status():
-    creds = load_tokens()
-    # Check if creds is not None (it's a GoogleTokenStore object now, not Credentials directly, but we can check existence)
-    # The load_tokens returns GoogleTokenStore.
-    # We need to check if it has valid fields or convert it back to Credentials to check validity if needed.
-    # For now, just checking if it exists is likely what was intended, or we need to check expiry.
-    
-    if creds:
-        # Simple check: if we have tokens, we are connected.
-        # Ideally we should check expiry, but for status check this might suffice or we can add logic.
+def check_status(account: Account = Depends(get_current_account)):
+    # Served from memory; tokens.json is only re-read when it changed on disk
+    if registry.credentials(account).is_connected():
+        # Expired access tokens are refreshed on the next Gmail call
         return {"status": "connected"}
     return {"status": "not_connected"}
\ No newline at end of file
@@ -1,6 +1,14 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import json
+from typing import List
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from pydantic import BaseModel, Field
+from app.core.concurrency import QueueFullError, chat_limiter
+from app.core.config import settings
+from app.core.services import get_rag_pipeline
 from app.services.rag_pipeline import RagPipeline
+from app.services.rate_limiter import is_rate_limit_error
 
 router = APIRouter()
 
@@ -10,14 +18,97 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     answer: str
 
+class BatchChatRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=settings.CHAT_BATCH_MAX_QUESTIONS)
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, pipeline: RagPipeline = Depends(get_rag_pipeline)):
     """
     Answer a user query about their emails using RAG.
     """
     try:
-        pipeline = RagPipeline()
-        answer = pipeline.answer_query(request.query)
+        async with chat_limiter:
+            answer = await pipeline.aanswer_query(request.query)
         return ChatResponse(answer=answer)
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly.", headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, pipeline: RagPipeline = Depends(get_rag_pipeline)):
+    """
+    Answer a user query as a Server-Sent Events stream.
+    Emits a `sources` event (the emails used) right after retrieval, then
+    `token` events as the answer is generated, and finally `done`
+    (or `error` if generation fails mid-stream).
+    """
+    async def events():
+        try:
+            async with chat_limiter:
+                usage = {}
+                async for event, data in pipeline.astream_answer(request.query):
+                    if event == "sources":
+                        yield _sse("sources", {"sources": data})
+                    elif event == "usage":
+                        usage = data
+                    else:
+                        yield _sse("token", {"text": data})
+            yield _sse("done", {"usage": usage} if usage else {})
+        except QueueFullError:
+            yield _sse("error", {"detail": "Server busy, try again shortly."})
+        except Exception as e:
+            logger.exception("Streaming chat failed")
+            if is_rate_limit_error(e):
+                yield _sse("error", {"detail": "The language model is rate limited, try again shortly."})
+            else:
+                yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/chat/batch")
+async def chat_batch_endpoint(request: BatchChatRequest, pipeline: RagPipeline = Depends(get_rag_pipeline)):
+    """
+    Answer several questions in one request, as a Server-Sent Events stream.
+    The questions share one embedding call and their retrievals; answers
+    are generated concurrently and each is sent as an `answer` event
+    (with its `index` in the request) as soon as it is ready, or as an
+    `error` event for a question that failed. `done` ends the stream.
+    """
+    async def events():
+        answered = failed = 0
+        try:
+            async with chat_limiter:
+                async for index, result in pipeline.abatch_answer(request.queries):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        yield _sse("error", {"index": index, "detail": str(result)})
+                    else:
+                        answered += 1
+                        yield _sse("answer", {"index": index, "answer": result.answer, "sources": result.sources})
+            yield _sse("done", {"answered": answered, "failed": failed})
+        except QueueFullError:
+            yield _sse("error", {"detail": "Server busy, try again shortly."})
+        except Exception as e:
+            logger.exception("Batch chat failed")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/chat/cache")
+def chat_cache_stats(pipeline: RagPipeline = Depends(get_rag_pipeline)):
+    """
+    Semantic answer cache counters (hits, misses, coalesced, hit_rate) of the account.
+    """
+    return pipeline.answer_cache.stats()
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,16 +1,46 @@
-from fastapi import APIRouter, HTTPException
-from app.services.rag_pipeline import RagPipeline
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import JSONResponse
+from app.core.concurrency import QueueFullError, chat_limiter, run_blocking
+from app.core.services import get_highlights_service
+from app.services.highlights_service import HighlightsService
 
 router = APIRouter()
 
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
 @router.get("/highlights")
-async def get_highlights():
+async def get_highlights(request: Request, service: HighlightsService = Depends(get_highlights_service)):
     """
     Get AI-recommended important emails and summaries.
+    Served from the copy precomputed at sync time; clients can revalidate
+    with If-None-Match and get a 304 while the inbox hasn't changed.
     """
     try:
-        pipeline = RagPipeline()
-        highlights = pipeline.get_important_emails()
-        return {"highlights": highlights}
+        highlights = service.current()
+        if highlights is None:
+            # Nothing synced since the server started storing highlights
+            async with chat_limiter:
+                highlights = await run_blocking(service.refresh)
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly.", headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {"ETag": highlights.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, highlights.etag):
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(
+        {
+            "highlights": highlights.summary,
+            "message_ids": highlights.message_ids,
+            "generated_at": highlights.generated_at.isoformat(),
+        },
+        headers=headers,
+    )
@@ -1,37 +1,63 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from loguru import logger
-from app.services.gmail_service import GmailService
-from app.services.chroma_store import ChromaStore
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from app.core.accounts import Account, get_current_account
+from app.core.services import get_sync_jobs, get_sync_scheduler
+from app.models.api import SyncRequest
+from app.services.sync_jobs import SyncJobManager
+from app.services.sync_scheduler import SyncScheduler
 
 router = APIRouter()
 
-def run_sync_task():
+@router.post("/sync")
+async def trigger_sync(
+    request: Optional[SyncRequest] = None,
+    account: Account = Depends(get_current_account),
+    jobs: SyncJobManager = Depends(get_sync_jobs),
+):
     """
-    Background task to run the sync process.
+    Trigger an email sync process in the background.
+    Incremental (historyId based) unless `full_sync` is requested; while a
+    sync is already running, the call joins it instead of starting another.
     """
-    try:
-        logger.info("Starting background sync task...")
-        gmail_service = GmailService()
-        chroma_store = ChromaStore()
-        
-        # Fetch recent emails (e.g., last 50)
-        # In a real app, we'd use historyId for incremental sync
-        emails = gmail_service.fetch_recent(max_results=50)
-        
-        if emails:
-            logger.info(f"Upserting {len(emails)} emails to ChromaDB...")
-            chroma_store.upsert_emails(emails)
-            logger.success("Sync completed successfully.")
-        else:
-            logger.info("No emails found to sync.")
-            
-    except Exception as e:
-        logger.exception("Sync task failed")
+    full_sync = request.full_sync if request else False
+    job = jobs.trigger(full_sync=full_sync, mailbox=account.id)
+    coalesced = job.triggers > 1
+    return {
+        "status": "Sync already running" if coalesced else "Sync started",
+        "message": "Email synchronization is running in the background.",
+        "job_id": job.id,
+        "coalesced": coalesced,
+    }
 
-@router.post("/sync")
-async def trigger_sync(background_tasks: BackgroundTasks):
+@router.post("/sync/reindex")
+async def trigger_reindex(
+    account: Account = Depends(get_current_account),
+    jobs: SyncJobManager = Depends(get_sync_jobs),
+):
     """
-    Trigger an email sync process in the background.
+    Rebuild the index from the local message store, without calling Gmail
+    (e.g. after changing the chunking or the embedding model). The current
+    index keeps answering until the new one is complete.
+    """
+    job = jobs.trigger(mailbox=account.id, reindex=True)
+    if not job.reindex:
+        raise HTTPException(status_code=409, detail=f"Sync job {job.id} is {job.state}; retry once it is done")
+    return {
+        "status": "Re-index started",
+        "message": "The index is being rebuilt from stored messages in the background.",
+        "job_id": job.id,
+    }
+
+@router.get("/sync/status")
+async def sync_status(
+    account: Account = Depends(get_current_account),
+    jobs: SyncJobManager = Depends(get_sync_jobs),
+    scheduler: SyncScheduler = Depends(get_sync_scheduler),
+):
+    """
+    Report the current (or last) sync job: state, throughput, ETA and per-stage counts,
+    plus the background scheduler's next check of this mailbox.
     """
-    background_tasks.add_task(run_sync_task)
-    return {"status": "Sync started", "message": "Email synchronization is running in the background."}
+    status = jobs.status(account.id) or {"state": "idle"}
+    status["schedule"] = scheduler.status(account.id)
+    return status
@@ -0,0 +1,106 @@
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import jwt
+from fastapi import Header, HTTPException
+
+from app.core.config import settings
+
+DEFAULT_ACCOUNT_ID = "default"
+ACCOUNTS_DIR = "storage/accounts"
+
+
+@dataclass(frozen=True)
+class Account:
+    """
+    One connected mailbox and where its state lives.
+
+    The default account is the single-user layout (storage/tokens.json,
+    the `inbox_ai_emails` collection); every other account keeps its files
+    under storage/accounts/<id>/ and has a collection of its own.
+    """
+
+    id: str
+    email: Optional[str] = field(default=None, compare=False)
+
+    @property
+    def is_default(self) -> bool:
+        return self.id == DEFAULT_ACCOUNT_ID
+
+    @property
+    def storage_dir(self) -> str:
+        return "storage" if self.is_default else os.path.join(ACCOUNTS_DIR, self.id)
+
+    @property
+    def token_path(self) -> str:
+        return os.path.join(self.storage_dir, "tokens.json")
+
+    @property
+    def sync_state_path(self) -> str:
+        return os.path.join(self.storage_dir, "sync_state.json")
+
+    @property
+    def sync_checkpoint_path(self) -> str:
+        return os.path.join(self.storage_dir, "sync_checkpoint.json")
+
+    @property
+    def highlights_path(self) -> str:
+        return os.path.join(self.storage_dir, "highlights.json")
+
+    @property
+    def message_store_path(self) -> str:
+        return os.path.join(self.storage_dir, "messages.sqlite")
+
+    @property
+    def collection_name(self) -> str:
+        return "inbox_ai_emails" if self.is_default else f"inbox_ai_{self.id}"
+
+
+DEFAULT_ACCOUNT = Account(DEFAULT_ACCOUNT_ID)
+
+
+def account_for_email(email: str) -> Account:
+    # Hashed: stable, filesystem- and collection-name-safe, and no address on disk
+    digest = hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()
+    return Account(digest[:16], email)
+
+
+def known_accounts() -> List[Account]:
+    """The default account plus every account with a storage directory."""
+    accounts = [DEFAULT_ACCOUNT]
+    if os.path.isdir(ACCOUNTS_DIR):
+        accounts.extend(Account(name) for name in sorted(os.listdir(ACCOUNTS_DIR)))
+    return accounts
+
+
+def issue_token(email: str) -> str:
+    """The JWT handed to the client after login; it selects the account on later calls."""
+    return jwt.encode({"email": email}, settings.SECRET_KEY, algorithm="HS256")
+
+
+# -----------------------
+# FastAPI Dependencies
+# -----------------------
+
+def get_current_account(authorization: Optional[str] = Header(default=None)) -> Account:
+    """
+    The account a request acts on. Single-user deployments always get the
+    default account; with MULTI_ACCOUNT it comes from the bearer JWT.
+    """
+    if not settings.MULTI_ACCOUNT:
+        return DEFAULT_ACCOUNT
+
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token.", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token.", headers={"WWW-Authenticate": "Bearer"})
+
+    email = payload.get("email")
+    if not email or email == "unknown":
+        raise HTTPException(status_code=401, detail="Token carries no account.", headers={"WWW-Authenticate": "Bearer"})
+    return account_for_email(email)
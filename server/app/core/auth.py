@@ -44,7 +44,7 @@ def get_auth_flow():
 
 
 
-def save_tokens(creds: Credentials):
+def save_tokens(creds: Credentials, path: str = TOKEN_PATH):
     token_data = GoogleTokenStore(
         access_token=creds.token,
         refresh_token=creds.refresh_token,
@@ -55,17 +55,20 @@ def save_tokens(creds: Credentials):
         token_uri=creds.token_uri,
     )
 
-    os.makedirs("storage", exist_ok=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
 
-    with open(TOKEN_PATH, "w") as f:
+    # Write then rename, so a concurrent reader never sees a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
         f.write(token_data.model_dump_json(indent=4))
+    os.replace(tmp_path, path)
 
 
-def load_tokens() -> GoogleTokenStore | None:
-    if not os.path.exists(TOKEN_PATH):
+def load_tokens(path: str = TOKEN_PATH) -> GoogleTokenStore | None:
+    if not os.path.exists(path):
         return None
 
-    with open(TOKEN_PATH, "r") as f:
+    with open(path, "r") as f:
         data = json.load(f)
 
     return GoogleTokenStore(**data)
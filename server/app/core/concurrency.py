@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Bounded pool for blocking client calls (Chroma, Gmail) made from async code,
+# kept separate from the event loop's default executor.
+blocking_executor = ThreadPoolExecutor(
+    max_workers=settings.BLOCKING_IO_WORKERS,
+    thread_name_prefix="blocking-io",
+)
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable on the bounded executor without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables over (e.g. the request's timing spans)
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(blocking_executor, partial(context.run, fn, *args, **kwargs))
+
+
+class QueueFullError(Exception):
+    """Raised when a ConcurrencyLimiter already has `max_queue` waiters."""
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many requests run a section concurrently.
+    Up to `max_queue` further requests wait for a slot; beyond that callers
+    get QueueFullError immediately instead of piling up.
+
+        async with chat_limiter:
+            ...
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.active = 0
+        self.waiting = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Asyncio primitives belong to one event loop; rebuild if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    async def __aenter__(self):
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_queue:
+            raise QueueFullError(f"{self.waiting} requests already queued")
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.active -= 1
+        self._semaphore.release()
+        return False
+
+
+# Shared by the chat and highlights endpoints (each one holds an LLM call)
+chat_limiter = ConcurrencyLimiter(
+    max_concurrent=settings.CHAT_MAX_CONCURRENCY,
+    max_queue=settings.CHAT_MAX_QUEUE,
+)
@@ -11,6 +11,83 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: str | None = None    
     GEMINI_API_KEY: str | None = None  
 
+    # Rate limits (Gemini quota). Embedding cost is counted per text embedded.
+    EMBEDDING_REQUESTS_PER_MINUTE: int = 100
+    EMBEDDING_MAX_BATCH_SIZE: int = 100
+    LLM_REQUESTS_PER_MINUTE: int = 10
+
+    # Embedding cache (storage/embedding_cache.sqlite)
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 100_000
+
+    # Chunked indexing (characters)
+    MAX_BODY_CHARS: int = 20_000         # Cleaned body length cap before chunking
+    CHUNK_SIZE: int = 1500
+    CHUNK_OVERLAP: int = 200
+    CHUNK_FETCH_FACTOR: int = 4          # Chunks fetched per requested message before collapsing
+    MAX_CHUNKS_PER_MESSAGE: int = 2      # Chunks of one message passed to the prompt
+
+    # Vector store: "chroma" (storage/chroma_db) or "local" (int8 memory-mapped index, storage/vectors/<collection>)
+    VECTOR_STORE_BACKEND: str = "chroma"
+
+    # Retrieval (storage/lexical/<collection>.sqlite holds the keyword index)
+    HYBRID_SEARCH: bool = True          # Fuse BM25 keyword hits with vector hits
+    RRF_K: int = 60                     # Reciprocal rank fusion damping constant
+    PREFILTER_MAX_CANDIDATES: int = 500   # Filtered searches over fewer chunks are scored exactly
+
+    # Answer prompt context (tokens estimated at ~4 characters each)
+    CONTEXT_TOKEN_BUDGET: int = 2000    # Email context allowed in one answer prompt
+    CONTEXT_CANDIDATES: int = 10        # Emails retrieved before diversity selection / packing
+    CONTEXT_EXCERPT_TOKENS: int = 400   # Longer emails are cut down to their most relevant passages
+    CONTEXT_MMR_LAMBDA: float = 0.7     # 1 = rank by relevance only, lower favours diverse emails
+    CONTEXT_DUPLICATE_SIMILARITY: float = 0.97   # Candidates this cosine-similar to a better one are dropped
+    CONTEXT_THREAD_CONTAINMENT: float = 0.8      # Same-thread emails mostly repeating a better one are dropped
+
+    # Semantic answer cache (chat)
+    ANSWER_CACHE_SIMILARITY: float = 0.95   # Min cosine similarity between queries for a hit
+    ANSWER_CACHE_TTL_SECONDS: int = 900
+    ANSWER_CACHE_MAX_ENTRIES: int = 512
+
+    # Sync
+    SYNC_FULL_SYNC_DAYS: int = 30       # Date window used for full (fallback) syncs; 0 = whole mailbox
+    SYNC_MAX_MESSAGES: int = 0          # Upper bound on messages fetched by a full sync; 0 = no cap
+    SYNC_QUEUE_SIZE: int = 4            # Batches buffered between two sync pipeline stages
+    SYNC_FETCH_WORKERS: int = 2         # Gmail batch requests in flight at once
+    SYNC_MAX_ATTEMPTS: int = 3          # Syncs a message may fail to index in before it is given up on
+    SYNC_MAX_RUNNING_JOBS: int = 2      # Sync / re-index jobs running at once, manual or scheduled; others wait queued
+
+    # Local message store (storage/messages.sqlite): parsed emails kept so re-indexing never refetches from Gmail
+    MESSAGE_STORE_ENABLED: bool = True
+    MESSAGE_STORE_ZSTD_LEVEL: int = 3
+
+    # Background sync scheduler (incremental checks of every connected mailbox)
+    SYNC_SCHEDULER_ENABLED: bool = True
+    SYNC_POLL_MIN_SECONDS: int = 120    # Check interval right after new mail was found
+    SYNC_POLL_MAX_SECONDS: int = 900    # Longest interval of an idle mailbox
+    SYNC_POLL_BACKOFF: float = 1.3      # Interval growth after each idle check
+    SYNC_POLL_JITTER: float = 0.2       # Random +/- share of each interval
+    SYNC_SCHEDULER_CONCURRENCY: int = 2     # Mailboxes checked / synced at once by the scheduler
+    SYNC_QUOTA_PAUSE_SECONDS: int = 300     # Scheduler pause after quota errors, doubled while they continue
+
+    # Gmail fetching
+    GMAIL_FETCH_FORMAT: str = "full"    # "full": headers + text parts only; "raw": whole RFC822 message
+    GMAIL_MAX_PART_BYTES: int = 1_000_000   # Larger text parts are truncated (or skipped if not inline)
+    TOKEN_REFRESH_MARGIN_SECONDS: int = 300  # Refresh the Google access token this long before it expires
+
+    # Accounts
+    MULTI_ACCOUNT: bool = False         # Pick the mailbox from the request's bearer JWT; False = single-user storage/
+    GMAIL_CLIENT_POOL_SIZE: int = 64    # Built Gmail API clients kept, least recently used dropped first
+    ACCOUNT_SERVICES_CACHE_SIZE: int = 256  # Accounts whose collection / answer cache handles stay open
+
+    # Observability
+    SERVER_TIMING_HEADER: bool = True   # Add a per-stage Server-Timing header to API responses
+
+    # Request concurrency
+    CHAT_MAX_CONCURRENCY: int = 8       # Chat / highlights requests served at once
+    CHAT_MAX_QUEUE: int = 32            # Further requests allowed to wait (503 beyond)
+    BLOCKING_IO_WORKERS: int = 16       # Threads for blocking Chroma / Gmail calls
+    CHAT_BATCH_MAX_QUESTIONS: int = 10  # Questions accepted by one POST /chat/batch
+    CHAT_BATCH_CONCURRENCY: int = 4     # LLM generations of one batch in flight at once
+
     # Other optional settings
     APP_ENV: str = "development"
     SECRET_KEY: str
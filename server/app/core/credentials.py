@@ -0,0 +1,169 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from loguru import logger
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+from app.core.auth import TOKEN_PATH, load_tokens, save_tokens
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.domain import GoogleTokenStore
+
+TOKEN_REFRESHES = metrics.counter("inboxai_token_refreshes_total", "OAuth access token refreshes by outcome.", ["result"])
+
+
+def _utcnow() -> datetime:
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _file_mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class ManagedCredentials(Credentials):
+    """
+    Google credentials whose refreshes go through a CredentialManager:
+    refreshed ahead of expiry, once for all threads, and persisted.
+    """
+
+    def __init__(self, manager: "CredentialManager", store: GoogleTokenStore):
+        super().__init__(
+            token=store.access_token,
+            refresh_token=store.refresh_token,
+            client_id=store.client_id,
+            client_secret=store.client_secret,
+            token_uri=store.token_uri,
+            scopes=store.scopes,
+            expiry=store.expiry,
+        )
+        self._manager = manager
+
+    def _apply_store(self, store: GoogleTokenStore):
+        """Take over tokens written to disk by someone else (e.g. a new login)."""
+        self.token = store.access_token
+        self.expiry = store.expiry
+        self._refresh_token = store.refresh_token
+        self._client_id = store.client_id
+        self._client_secret = store.client_secret
+        self._token_uri = store.token_uri
+        self._scopes = store.scopes
+
+    def before_request(self, request, method, url, headers):
+        # Called by AuthorizedHttp before every API call
+        self._manager.ensure_fresh(request)
+        self.apply(headers)
+
+    def refresh(self, request):
+        # Called by AuthorizedHttp after a 401: the token was revoked or expired early
+        self._manager.refresh(request, force=True)
+
+    def _refresh_now(self, request):
+        super().refresh(request)
+
+
+class CredentialManager:
+    """
+    Keeps the OAuth tokens of one tokens.json in memory.
+
+    - Every API call goes through `ensure_fresh()`: a stat() of the token
+      file (reloaded only when it changed on disk) and a refresh when the
+      access token expires within TOKEN_REFRESH_MARGIN_SECONDS.
+    - Refreshes are single-flight: concurrent callers wait for the one in
+      progress instead of each hitting Google's token endpoint.
+    - Refreshed tokens are written atomically (temp file + rename).
+
+    The same ManagedCredentials object is handed to every GmailService and
+    updated in place, so clients built earlier pick up new tokens too.
+    """
+
+    def __init__(self, path: str = TOKEN_PATH, refresh_margin: float = settings.TOKEN_REFRESH_MARGIN_SECONDS):
+        self.path = path
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._creds: Optional[ManagedCredentials] = None
+        self._mtime: Optional[float] = None
+        self._loaded = False
+
+    def is_connected(self) -> bool:
+        """Whether tokens are stored (no network call)."""
+        self._reload_if_changed()
+        return self._creds is not None
+
+    def credentials(self) -> Optional[ManagedCredentials]:
+        """The current credentials, refreshed if close to expiry; None if not connected."""
+        self.ensure_fresh()
+        return self._creds
+
+    def ensure_fresh(self, request: Optional[Request] = None):
+        self._reload_if_changed()
+        creds = self._creds
+        if creds is not None and self._needs_refresh(creds):
+            self.refresh(request)
+
+    def refresh(self, request: Optional[Request] = None, force: bool = False):
+        """Refresh the access token, or wait for the refresh already in flight."""
+        creds = self._creds
+        if creds is None:
+            raise RuntimeError("No Google credentials found. Please authenticate first.")
+
+        seen_token = creds.token
+        with self._refresh_lock:
+            if creds.token != seen_token or not (force or self._needs_refresh(creds)):
+                # Another caller refreshed while we waited for the lock
+                return
+            logger.info("Refreshing Google access token...")
+            try:
+                creds._refresh_now(request or Request())
+            except Exception:
+                TOKEN_REFRESHES.inc(result="error")
+                logger.exception("Failed to refresh Google access token")
+                raise
+            TOKEN_REFRESHES.inc(result="ok")
+            self.save(creds)
+
+    def save(self, creds: Credentials):
+        """Persist `creds` and adopt them as the current tokens."""
+        with self._lock:
+            save_tokens(creds, self.path)
+            self._mtime = _file_mtime(self.path)
+            store = load_tokens(self.path)
+            if self._creds is None:
+                self._creds = ManagedCredentials(self, store)
+            elif creds is not self._creds:
+                self._creds._apply_store(store)
+            self._loaded = True
+
+    def _needs_refresh(self, creds: Credentials) -> bool:
+        if not creds.token:
+            return True
+        return creds.expiry is not None and creds.expiry - _utcnow() < self.refresh_margin
+
+    def _reload_if_changed(self):
+        mtime = _file_mtime(self.path)
+        if self._loaded and mtime == self._mtime:
+            return
+        with self._lock:
+            if self._loaded and mtime == self._mtime:
+                return
+            store = load_tokens(self.path) if mtime is not None else None
+            if store is None:
+                # Never connected, or disconnected (tokens.json removed)
+                self._creds = None
+            elif self._creds is None:
+                self._creds = ManagedCredentials(self, store)
+            else:
+                logger.info(f"{self.path} changed on disk, reloading credentials")
+                self._creds._apply_store(store)
+            self._mtime = mtime
+            self._loaded = True
+
+
+credential_manager = CredentialManager()
@@ -0,0 +1,239 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from loguru import logger
+
+from app.core.config import settings
+
+# Default latency buckets (seconds), from a cache hit to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, one series per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        """Sum over every label combination."""
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> (per-bucket counts (+Inf last), sum)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((k, list(c), t[0]) for k, (c, t) in self._series.items())
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the process' metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: List[object] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# -----------------------
+# Shared Metrics
+# -----------------------
+
+STAGE_SECONDS = metrics.histogram(
+    "inboxai_stage_duration_seconds",
+    "Time spent in each sync / chat stage (gmail_list, gmail_get, mime_parse, embed, chroma_upsert, retrieval, llm_generate, ...).",
+    ["stage"],
+)
+STAGE_ERRORS = metrics.counter("inboxai_stage_errors_total", "Stage calls that raised.", ["stage"])
+HTTP_SECONDS = metrics.histogram(
+    "inboxai_http_request_duration_seconds", "HTTP request latency, until the response headers are sent.", ["method", "route", "status"]
+)
+RATE_LIMITED = metrics.counter("inboxai_rate_limited_total", "429 / quota errors retried by a rate limiter.", ["limiter"])
+RATE_LIMIT_FAILURES = metrics.counter("inboxai_rate_limit_failures_total", "Calls a rate limiter gave up on.", ["limiter"])
+GMAIL_RETRIES = metrics.counter("inboxai_gmail_retries_total", "Gmail sub-requests retried after a transient error.")
+CACHE_LOOKUPS = metrics.counter(
+    "inboxai_cache_lookups_total", "Cache lookups by outcome; hit rate = hit / (hit + miss).", ["cache", "result"]
+)
+PROMPT_TOKENS = metrics.histogram(
+    "inboxai_prompt_tokens",
+    "Answer prompt size in tokens: estimated when built, and as reported by the LLM.",
+    ["source"],
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000),
+)
+CACHE_EVICTIONS = metrics.counter("inboxai_cache_evictions_total", "Entries dropped from a size-bounded cache.", ["cache"])
+SYNC_CHECKS = metrics.counter(
+    "inboxai_sync_checks_total", "Background sync checks by outcome (changed, idle, busy, skipped, throttled, error).", ["result"]
+)
+
+# -----------------------
+# Timing Spans
+# -----------------------
+
+# Per-request stage totals (seconds), set by TimingMiddleware
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a block as `stage`: recorded in the stage histogram and, inside an
+    HTTP request, added to that request's Server-Timing breakdown.
+
+        with span("retrieval"):
+            docs = ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+        logger.trace(f"span {stage} took {elapsed * 1000:.1f} ms")
+
+
+def _route_label(scope) -> str:
+    """The matched route template (not the raw path, to keep label cardinality bounded)."""
+    # Recent FastAPI versions keep the prefixed path of included routers here
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    return getattr(context, "path", None) or getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+def _server_timing(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware recording request latency, and (if SERVER_TIMING_HEADER)
+    adding a `Server-Timing` header with the spans that ran before the
+    response started. For streamed responses that covers retrieval but not
+    the generation that follows.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        response = {}  # total / status once the response has started
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["total"] = time.perf_counter() - start
+                response["status"] = message["status"]
+                if settings.SERVER_TIMING_HEADER:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings, response["total"]).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            if response:
+                # Labelled afterwards: routing details are only complete once the app has run
+                HTTP_SECONDS.observe(
+                    response["total"], method=scope["method"], route=_route_label(scope), status=str(response["status"])
+                )
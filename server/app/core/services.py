@@ -0,0 +1,258 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+from fastapi import Depends
+from loguru import logger
+
+from app.core.accounts import DEFAULT_ACCOUNT, Account, get_current_account, known_accounts
+from app.core.config import settings
+from app.core.credentials import CredentialManager, credential_manager
+from app.core.metrics import CACHE_EVICTIONS, CACHE_LOOKUPS
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.chroma_store import ChromaStore
+from app.services.gmail_service import GmailService
+from app.services.highlights_service import HighlightsService
+from app.services.rag_pipeline import RagPipeline
+from app.services.sync_jobs import SyncJobManager
+from app.services.sync_scheduler import SyncScheduler
+from app.services.sync_service import SyncService
+
+T = TypeVar("T")
+
+
+class LRUPool(Generic[T]):
+    """
+    Thread-safe map of built clients, bounded to `max_size` entries: the
+    least recently used one is dropped first. Concurrent misses on one key
+    build it once.
+    """
+
+    def __init__(self, name: str, max_size: int):
+        self.name = name
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, T]" = OrderedDict()
+        self._building: Dict[str, threading.Lock] = {}
+
+    def get(self, key: str, build: Callable[[], T], is_valid: Optional[Callable[[T], bool]] = None) -> T:
+        item = self._lookup(key, is_valid)
+        if item is not None:
+            CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+            return item
+
+        with self._lock:
+            key_lock = self._building.setdefault(key, threading.Lock())
+        with key_lock:
+            # Built by another caller while we waited?
+            item = self._lookup(key, is_valid)
+            if item is not None:
+                CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return item
+            CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+            item = build()
+            with self._lock:
+                self._items[key] = item
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_size:
+                    evicted, _ = self._items.popitem(last=False)
+                    CACHE_EVICTIONS.inc(cache=self.name)
+                    logger.debug(f"{self.name}: evicted {evicted}")
+                self._building.pop(key, None)
+        return item
+
+    def _lookup(self, key: str, is_valid: Optional[Callable[[T], bool]]) -> Optional[T]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or (is_valid is not None and not is_valid(item)):
+                return None
+            self._items.move_to_end(key)
+            return item
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+@dataclass
+class AccountServices:
+    """The per-account clients: one collection, its RAG pipeline / answer cache and highlights."""
+
+    chroma: ChromaStore
+    rag: RagPipeline
+    highlights: HighlightsService
+
+
+class ServiceRegistry:
+    """
+    Process-wide holder for the expensive clients (Chroma, Gemini, Gmail).
+    Each one is built once on first use and shared by every request.
+
+    The default (single-user) account's clients are kept for the whole
+    process. Other accounts get their own collection, answer cache and
+    highlights, sharing the default account's Chroma database, embedding
+    model and LLM; those, and every account's Gmail client, are kept in
+    LRU pools so hot accounts don't pay the setup on each call.
+    """
+
+    def __init__(
+        self,
+        chroma: Optional[ChromaStore] = None,
+        rag: Optional[RagPipeline] = None,
+        gmail_factory: Optional[Callable[[Account, object], GmailService]] = None,
+    ):
+        """`chroma`, `rag` and `gmail_factory` replace the real clients (e.g. with offline stand-ins)."""
+        self._lock = threading.RLock()
+        self._chroma: Optional[ChromaStore] = chroma
+        self._rag: Optional[RagPipeline] = rag
+        self._highlights: Optional[HighlightsService] = None
+        self._credentials: Dict[str, CredentialManager] = {DEFAULT_ACCOUNT.id: credential_manager}
+        self._gmail_factory = gmail_factory or (lambda account, creds: GmailService(credentials=creds))
+        self.accounts: LRUPool[AccountServices] = LRUPool("account_services", settings.ACCOUNT_SERVICES_CACHE_SIZE)
+        self.gmail_clients: LRUPool[GmailService] = LRUPool("gmail_clients", settings.GMAIL_CLIENT_POOL_SIZE)
+        # Outlives close(): jobs keep running until they finish
+        self.sync_jobs = SyncJobManager(self.sync_service)
+        self.sync_scheduler = SyncScheduler(self.sync_jobs, self.gmail_service, self.connected_accounts)
+
+    def chroma_store(self, account: Account = DEFAULT_ACCOUNT) -> ChromaStore:
+        if not account.is_default:
+            return self.account_services(account).chroma
+        if self._chroma is None:
+            with self._lock:
+                if self._chroma is None:
+                    logger.info("Building shared ChromaStore...")
+                    chroma = ChromaStore()
+                    chroma.label_ids = lambda: self.gmail_service(account).label_ids()
+                    self._chroma = chroma
+        return self._chroma
+
+    def rag_pipeline(self, account: Account = DEFAULT_ACCOUNT) -> RagPipeline:
+        if not account.is_default:
+            return self.account_services(account).rag
+        if self._rag is None:
+            with self._lock:
+                if self._rag is None:
+                    logger.info("Building shared RagPipeline...")
+                    self._rag = RagPipeline(chroma=self.chroma_store())
+        return self._rag
+
+    def highlights_service(self, account: Account = DEFAULT_ACCOUNT) -> HighlightsService:
+        if not account.is_default:
+            return self.account_services(account).highlights
+        if self._highlights is None:
+            with self._lock:
+                if self._highlights is None:
+                    self._highlights = HighlightsService(self.rag_pipeline())
+        return self._highlights
+
+    def account_services(self, account: Account) -> AccountServices:
+        return self.accounts.get(account.id, lambda: self._build_account_services(account))
+
+    def _build_account_services(self, account: Account) -> AccountServices:
+        logger.info(f"Opening services for account {account.id}...")
+        shared = self.rag_pipeline()
+        chroma = self.chroma_store().for_collection(account.collection_name)
+        chroma.label_ids = lambda: self.gmail_service(account).label_ids()
+        rag = RagPipeline(
+            chroma=chroma,
+            llm=shared.llm,
+            limiter=shared.limiter,
+            # Answers must never be shared across mailboxes
+            cache=SemanticAnswerCache(
+                threshold=settings.ANSWER_CACHE_SIMILARITY,
+                ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ),
+        )
+        return AccountServices(chroma=chroma, rag=rag, highlights=HighlightsService(rag, path=account.highlights_path))
+
+    def credentials(self, account: Account = DEFAULT_ACCOUNT) -> CredentialManager:
+        # Never evicted: two managers of one token file would refresh it twice
+        manager = self._credentials.get(account.id)
+        if manager is None:
+            with self._lock:
+                manager = self._credentials.get(account.id)
+                if manager is None:
+                    manager = self._credentials[account.id] = CredentialManager(path=account.token_path)
+        return manager
+
+    def gmail_service(self, account: Account = DEFAULT_ACCOUNT) -> GmailService:
+        # Refreshed tokens are updated in place on the shared credentials;
+        # a rebuild is only needed after a disconnect / reconnect.
+        creds = self.credentials(account).credentials()
+        if creds is None:
+            raise RuntimeError("No Google credentials found. Please authenticate first.")
+        return self.gmail_clients.get(
+            account.id, lambda: self._gmail_factory(account, creds), is_valid=lambda svc: svc.creds is creds
+        )
+
+    def sync_service(self, mailbox: str = DEFAULT_ACCOUNT.id) -> SyncService:
+        """A SyncService for one run of the account `mailbox`, on the shared clients."""
+        account = DEFAULT_ACCOUNT if mailbox == DEFAULT_ACCOUNT.id else Account(mailbox)
+        return SyncService(
+            gmail=self.gmail_service(account),
+            chroma=self.chroma_store(account),
+            highlights=self.highlights_service(account),
+            cache=self.rag_pipeline(account).answer_cache,
+            state_path=account.sync_state_path,
+            checkpoint_path=account.sync_checkpoint_path,
+            message_store_path=account.message_store_path if settings.MESSAGE_STORE_ENABLED else None,
+        )
+
+    def connected_accounts(self) -> List[Account]:
+        """Accounts with stored Google tokens (no network call)."""
+        return [account for account in known_accounts() if self.credentials(account).is_connected()]
+
+    def resume_interrupted_syncs(self):
+        """Pick up the full syncs the previous process was killed in the middle of."""
+        for account in known_accounts():
+            self.sync_jobs.resume_interrupted(account.id, account.sync_checkpoint_path)
+
+    def warm_up(self):
+        """Build the clients that don't need a connected Gmail account."""
+        try:
+            self.rag_pipeline()
+        except Exception:
+            logger.exception("Failed to warm up RAG services")
+
+    def close(self):
+        with self._lock:
+            self._rag = None
+            self._highlights = None
+            self._chroma = None
+            self.accounts.clear()
+            self.gmail_clients.clear()
+
+
+registry = ServiceRegistry()
+
+
+# -----------------------
+# FastAPI Dependencies
+# -----------------------
+
+def get_chroma_store(account: Account = Depends(get_current_account)) -> ChromaStore:
+    return registry.chroma_store(account)
+
+
+def get_rag_pipeline(account: Account = Depends(get_current_account)) -> RagPipeline:
+    return registry.rag_pipeline(account)
+
+
+def get_highlights_service(account: Account = Depends(get_current_account)) -> HighlightsService:
+    return registry.highlights_service(account)
+
+
+def get_gmail_service(account: Account = Depends(get_current_account)) -> GmailService:
+    return registry.gmail_service(account)
+
+
+def get_sync_jobs() -> SyncJobManager:
+    return registry.sync_jobs
+
+
+def get_sync_scheduler() -> SyncScheduler:
+    return registry.sync_scheduler
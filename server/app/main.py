@@ -1,13 +1,32 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.auth import router as auth_router
 from app.api.gmail_test import router as gmail_test_router
-from app.api import sync, chat, highlights
+from app.api import sync, chat, highlights, metrics
+from app.core.config import settings
+from app.core.metrics import TimingMiddleware
+from app.core.services import registry
 import os
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 
-app = FastAPI(title="InboxAI Server", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared Chroma / Gemini clients once, off the event loop
+    await run_in_threadpool(registry.warm_up)
+    # Pick up full syncs the previous process was killed in the middle of
+    registry.resume_interrupted_syncs()
+    # Keep connected mailboxes fresh between manual syncs
+    if settings.SYNC_SCHEDULER_ENABLED:
+        registry.sync_scheduler.start()
+    yield
+    await registry.sync_scheduler.stop()
+    registry.close()
+
+
+app = FastAPI(title="InboxAI Server", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,13 +34,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
+app.add_middleware(TimingMiddleware)
 
 app.include_router(auth_router)
 app.include_router(gmail_test_router)
 app.include_router(sync.router, prefix="/api/v1", tags=["Sync"])
 app.include_router(chat.router, prefix="/api/v1", tags=["Chat"])
 app.include_router(highlights.router, prefix="/api/v1", tags=["Highlights"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 @app.get("/")
 def root():
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class EmailDocument(BaseModel):
@@ -28,3 +28,38 @@ class GoogleTokenStore(BaseModel):
     client_id: str
     client_secret: str
     token_uri: str
+
+class SyncState(BaseModel):
+    """
+    Represents sync_state.json data (the incremental sync checkpoint).
+    `failed_messages` maps messages that failed to index to their failed
+    attempts so far; the next sync retries them, and `last_history_id`
+    isn't advanced while any are left.
+    """
+    last_history_id: Optional[str] = None
+    failed_messages: Dict[str, int] = Field(default_factory=dict)
+    last_sync_at: Optional[datetime] = None
+    last_full_sync_at: Optional[datetime] = None
+
+class SyncCheckpoint(BaseModel):
+    """
+    Represents sync_checkpoint.json data (progress of an unfinished full sync).
+    Pages before `page_token` are fully indexed; a restarted sync lists from there.
+    """
+    query: Optional[str] = None
+    max_results: Optional[int] = None
+    start_history_id: Optional[str] = None
+    page_token: Optional[str] = None
+    pages_done: int = 0
+    messages_done: int = 0
+    started_at: datetime
+    updated_at: Optional[datetime] = None
+
+class Highlights(BaseModel):
+    """
+    Represents highlights.json data (the highlights summary precomputed at sync time).
+    """
+    summary: str
+    message_ids: List[str] = Field(default_factory=list)
+    etag: str
+    generated_at: datetime
@@ -0,0 +1,187 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    source_ids: List[str]
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    filters: Hashable = None
+
+
+class SemanticAnswerCache:
+    """
+    Caches chat answers keyed by query embedding and search filters.
+
+    A lookup hits when a stored query is at least `threshold` cosine-similar
+    to the new one, was searched with the same `filters` (e.g.
+    QueryFilters.cache_key(): "from:alice" and "from:bob" questions embed
+    almost alike) and is younger than `ttl` seconds, so rephrasings of the
+    same question share an answer. Entries remember which emails they were built
+    from and are dropped when a sync touches any of them. Concurrent
+    near-identical queries are coalesced onto a single computation.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 900.0, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._entries: List[CachedAnswer] = []
+        self._inflight: List[Tuple[np.ndarray, Hashable, asyncio.Future]] = []
+        self.stats_counters = {"hits": 0, "misses": 0, "coalesced": 0, "invalidated": 0}
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _match(self, v: np.ndarray, filters: Hashable) -> Optional[int]:
+        """Index of the most similar live entry with these filters above the threshold (lock held)."""
+        if not self._entries or self._vectors.shape[1] != v.shape[0]:
+            return None
+        scores = self._vectors @ v
+        scores[[e.filters != filters for e in self._entries]] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        if time.time() - self._entries[best].created_at > self.ttl:
+            self._remove([best])
+            return None
+        return best
+
+    def _remove(self, indexes: Iterable[int]):
+        drop = set(indexes)
+        keep = [i for i in range(len(self._entries)) if i not in drop]
+        self._entries = [self._entries[i] for i in keep]
+        self._vectors = self._vectors[keep] if keep else np.empty((0, self._vectors.shape[1]), dtype=np.float32)
+
+    def lookup(self, vector: List[float], filters: Hashable = None) -> Optional[CachedAnswer]:
+        v = self._normalize(vector)
+        with self._lock:
+            index = self._match(v, filters)
+            if index is None:
+                self.stats_counters["misses"] += 1
+                CACHE_LOOKUPS.inc(cache="answer", result="miss")
+                return None
+            self.stats_counters["hits"] += 1
+            CACHE_LOOKUPS.inc(cache="answer", result="hit")
+            return self._entries[index]
+
+    def store(self, vector: List[float], entry: CachedAnswer, filters: Hashable = None):
+        if not entry.source_ids:
+            # "Nothing found" answers would go stale as soon as mail arrives
+            return
+        entry.filters = filters
+        v = self._normalize(vector)
+        with self._lock:
+            if self._vectors.shape[1] != v.shape[0]:
+                # First entry, or the embedding model changed dimension
+                self._vectors = np.empty((0, v.shape[0]), dtype=np.float32)
+                self._entries = []
+            self._vectors = np.vstack([self._vectors, v[None, :]])
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                # Oldest entries first out
+                self._remove(range(len(self._entries) - self.max_entries))
+
+    def invalidate(self, message_ids: Iterable[str]) -> int:
+        """Drop every answer built from any of `message_ids`."""
+        ids = set(message_ids)
+        if not ids:
+            return 0
+        with self._lock:
+            stale = [i for i, e in enumerate(self._entries) if ids.intersection(e.source_ids)]
+            if stale:
+                self._remove(stale)
+                self.stats_counters["invalidated"] += len(stale)
+        if stale:
+            logger.info(f"Answer cache: invalidated {len(stale)} answers after sync")
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+
+    async def get_or_compute(
+        self,
+        vector: List[float],
+        compute: Callable[[], Awaitable[CachedAnswer]],
+        filters: Hashable = None,
+    ) -> CachedAnswer:
+        """
+        Return a cached answer for `vector` and `filters`, or run `compute()`
+        once and cache it. Callers arriving while a similar query with the
+        same filters is being computed await that computation instead of
+        starting their own.
+        """
+        cached = self.lookup(vector, filters)
+        if cached is not None:
+            return cached
+
+        v = self._normalize(vector)
+        with self._lock:
+            for other, other_filters, future in self._inflight:
+                if other_filters == filters and other.shape == v.shape and float(other @ v) >= self.threshold:
+                    self.stats_counters["coalesced"] += 1
+                    CACHE_LOOKUPS.inc(cache="answer", result="coalesced")
+                    break
+            else:
+                future = None
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self._inflight.append((v, filters, future))
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return await asyncio.shield(future)
+
+        try:
+            entry = await compute()
+            self.store(vector, entry, filters)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so asyncio doesn't warn when nobody was waiting
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._inflight = [item for item in self._inflight if item[2] is not future]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            counters = dict(self.stats_counters)
+            counters["entries"] = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        return counters
+
+
+# Process-wide cache shared by the chat endpoints and invalidated by sync
+answer_cache = SemanticAnswerCache(
+    threshold=settings.ANSWER_CACHE_SIMILARITY,
+    ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+)
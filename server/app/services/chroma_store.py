@@ -1,98 +1,540 @@
-from typing import List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+import json
 import os
-import time
+import threading
+from datetime import datetime
+from email.utils import parseaddr
+import numpy as np
 from loguru import logger
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from app.models.domain import EmailDocument
 from app.core.config import settings
+from app.core.concurrency import run_blocking
+from app.core.metrics import span
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from app.services.gmail_service import LabelChange
+from app.services.lexical_index import LexicalIndex
+from app.services.query_filters import QueryFilters, label_key, parse_query
+from app.services.rate_limiter import RateLimitedEmbeddings, embedding_limiter
+from app.services.vector_store import VectorStore, open_vector_store
+from app.utils.text_processing import chunk_text, clean_email_body
+
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+
+# Construct path relative to this file: server/app/services/chroma_store.py
+# We want: server/storage
+STORAGE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "storage"
+)
+
+# One email's chunk Documents and their `gmail_id#n` IDs
+PreparedEmail = Tuple[List[Document], List[str]]
+
+# Messages carrying one of these labels are kept out of the index
+HIDDEN_LABELS = frozenset({"TRASH", "SPAM"})
+
+# Collection -> the generation (physical collection) serving it, when not the collection itself
+GENERATIONS_FILE = "collections.json"
+_generations_lock = threading.Lock()
+
+
+def active_generation(storage_dir: str, collection_name: str) -> str:
+    path = os.path.join(storage_dir, GENERATIONS_FILE)
+    if not os.path.exists(path):
+        return collection_name
+    with open(path, "r") as f:
+        return json.load(f).get(collection_name, collection_name)
+
+
+def _set_active_generation(storage_dir: str, collection_name: str, generation: str):
+    path = os.path.join(storage_dir, GENERATIONS_FILE)
+    with _generations_lock:
+        generations = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                generations = json.load(f)
+        generations[collection_name] = generation
+        # Write then rename: the switch is all or nothing, even on a crash
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(generations, f, indent=4)
+        os.replace(tmp_path, path)
+
+
+def _chunk_header(subject: str) -> str:
+    return f"Subject: {subject}\n\n"
+
+
+def _collapse_chunks(hits: List[Document], n_results: int, max_chunks: int) -> List[Document]:
+    """Group ranked chunk hits by message, keeping the best `max_chunks` of each."""
+    grouped: Dict[str, List[Document]] = {}
+    for doc in hits:
+        group = grouped.setdefault(doc.metadata.get("gmail_id") or doc.id, [])
+        if len(group) < max_chunks:
+            group.append(doc)
+
+    results = []
+    for group in list(grouped.values())[:n_results]:
+        group.sort(key=lambda d: d.metadata.get("chunk_index", 0))
+        metadata = {k: v for k, v in group[0].metadata.items() if k != "chunk_index"}
+        metadata["matched_chunks"] = ",".join(str(d.metadata.get("chunk_index", 0)) for d in group)
+
+        header = _chunk_header(metadata.get("subject", ""))
+        bodies = [d.page_content[len(header):] if d.page_content.startswith(header) else d.page_content for d in group]
+        results.append(Document(page_content=header + "\n[...]\n".join(bodies), metadata=metadata))
+    return results
+
+
+def batch_prepared(prepared: Iterable[PreparedEmail], batch_size: int) -> Iterator[List[PreparedEmail]]:
+    """
+    Group whole emails into batches of roughly `batch_size` chunks, so a
+    message's chunks are always written (and cleaned up) together.
+    """
+    current: List[PreparedEmail] = []
+    size = 0
+    for item in prepared:
+        if current and size + len(item[1]) > batch_size:
+            yield current
+            current, size = [], 0
+        current.append(item)
+        size += len(item[1])
+    if current:
+        yield current
+
+
+def _fuse_rankings(rankings: List[List[str]], k: int) -> List[str]:
+    """Reciprocal rank fusion: IDs ordered by the sum of 1 / (k + rank) over the rankings."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
 
 class ChromaStore:
-    def __init__(self):
-        # Explicitly use Google's embedding model
-        self.embedding = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-001",
-            google_api_key=settings.GEMINI_API_KEY,
+    def __init__(
+        self,
+        storage_dir: str = STORAGE_DIR,
+        collection_name: str = "inbox_ai_emails",
+        embedding_model: Optional[Embeddings] = None,
+        embedding_model_name: str = EMBEDDING_MODEL,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        vector_backend: Optional[str] = None,
+        generation: Optional[str] = None,
+    ):
+        """
+        `embedding_model` replaces the (rate-limited) Gemini embedding model,
+        e.g. with an offline stand-in; `embedding_model_name` keys its cache.
+        `embedding_cache` shares an already open cache (see for_collection).
+        `vector_backend` overrides VECTOR_STORE_BACKEND (see vector_store.py).
+
+        A collection is served by one generation at a time (a re-index builds
+        the next one, see new_generation); `generation` picks one other than
+        the active one.
+        """
+        if embedding_model is None:
+            # Explicitly use Google's embedding model
+            embedding_model = RateLimitedEmbeddings(
+                GoogleGenerativeAIEmbeddings(
+                    model=EMBEDDING_MODEL,
+                    google_api_key=settings.GEMINI_API_KEY,
+                ),
+                embedding_limiter,
+            )
+
+        self.storage_dir = storage_dir
+        self.collection_name = collection_name
+        self.generation = generation or active_generation(storage_dir, collection_name)
+        self.embedding_model_name = embedding_model_name
+        self.vector_backend = vector_backend or settings.VECTOR_STORE_BACKEND
+        self._embedding_model = embedding_model
+
+        # Local cache so unchanged content is never sent to the embedding API twice
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            path=os.path.join(storage_dir, "embedding_cache.sqlite"),
+            model=embedding_model_name,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
         )
+        self.embedding = CachedEmbeddings(embedding_model, self.embedding_cache)
         
-        # Construct path relative to this file: server/app/services/chroma_store.py
-        # We want: server/storage/chroma_db
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        persist_dir = os.path.join(base_dir, "storage", "chroma_db")
-        
-        self.vector_db = Chroma(
-            embedding_function=self.embedding,
-            persist_directory=persist_dir,
-            collection_name="inbox_ai_emails",
+        self.vector_db: VectorStore = open_vector_store(
+            self.vector_backend, storage_dir, self.generation, self.embedding
         )
+
+        # BM25 keyword index over the same chunks, for exact-token matches
+        self.lexical_index = LexicalIndex(os.path.join(storage_dir, "lexical", f"{self.generation}.sqlite"))
+
+        # The mailbox's label IDs by name (GmailService.label_ids), for `label:` filters; set by the registry
+        self.label_ids: Optional[Callable[[], Mapping[str, str]]] = None
     
-    def upsert_emails(self, emails: List[EmailDocument], batch_size: int = 2, delay: float = 10.0):
+    def for_collection(self, collection_name: str) -> "ChromaStore":
         """
-        Upserts a list of EmailDocument objects into the Chroma vector store.
-        Converts EmailDocument to LangChain Document format.
-        Handles rate limits by processing in batches with delays and retries.
+        A store over another collection of the same database (e.g. another
+        account's), sharing this store's embedding model, rate limit and cache.
         """
-        documents = []
-        ids = []
-        
-        for email in emails:
-            # Construct the text content for embedding
-            # We prioritize subject and body_text
-            page_content = f"Subject: {email.subject}\n\n{email.body_text or ''}"
-            
-            # Prepare metadata (ensure types are compatible with Chroma)
-            metadata = {
-                "gmail_id": email.gmail_id,
-                "thread_id": email.thread_id,
-                "sender": email.sender,
-                "recipients": ", ".join(email.recipients),  # Convert list to string
-                "subject": email.subject,
-                "timestamp": email.timestamps.isoformat() if email.timestamps else None,
-                "labels": ", ".join(email.labels)  # Convert list to string
-            }
-            
-            # Create LangChain Document
-            doc = Document(
-                page_content=page_content,
-                metadata={k: v for k, v in metadata.items() if v is not None} # Filter None values
+        return ChromaStore(
+            storage_dir=self.storage_dir,
+            collection_name=collection_name,
+            embedding_model=self._embedding_model,
+            embedding_model_name=self.embedding_model_name,
+            embedding_cache=self.embedding_cache,
+            vector_backend=self.vector_backend,
+        )
+
+    def new_generation(self) -> "ChromaStore":
+        """An empty next generation of this collection, to fill and then switch_to()."""
+        return ChromaStore(
+            storage_dir=self.storage_dir,
+            collection_name=self.collection_name,
+            embedding_model=self._embedding_model,
+            embedding_model_name=self.embedding_model_name,
+            embedding_cache=self.embedding_cache,
+            vector_backend=self.vector_backend,
+            generation=f"{self.collection_name}__{datetime.now():%Y%m%d%H%M%S}",
+        )
+
+    def switch_to(self, other: "ChromaStore"):
+        """
+        Serve `other`'s generation from now on, also after a restart (the
+        switch is persisted atomically). Searches already running finish on
+        the previous generation, which `other` is left holding, for drop().
+        """
+        _set_active_generation(self.storage_dir, self.collection_name, other.generation)
+        self.vector_db, other.vector_db = other.vector_db, self.vector_db
+        self.lexical_index, other.lexical_index = other.lexical_index, self.lexical_index
+        self.generation, other.generation = other.generation, self.generation
+        logger.info(f"Collection {self.collection_name} now served by {self.generation}")
+
+    def drop(self):
+        """Delete this store's generation: its vectors and keyword index."""
+        self.vector_db.drop()
+        self.lexical_index.drop()
+        logger.info(f"Dropped {self.generation}")
+
+    def close(self):
+        self.vector_db.close()
+        self.lexical_index.close()
+
+    def upsert_emails(self, emails: List[EmailDocument], batch_size: int = 100):
+        """
+        Upserts a list of EmailDocument objects into the vector store.
+        Each email body is split into overlapping chunks, stored as separate
+        vectors with IDs `gmail_id#n` and mirrored into the keyword index;
+        chunks left over from a previous, longer version of a message are removed.
+        Rate limits are handled by the shared embedding limiter (see rate_limiter.py).
+
+        This runs prepare_emails / embed_prepared / write_prepared in series;
+        the sync pipeline runs the same three steps as overlapping stages.
+        """
+        prepared = self.prepare_emails(emails)
+        total_docs = sum(len(docs) for docs, _ in prepared)
+        if not total_docs:
+            return
+
+        cache_before = self.embedding_cache.stats()
+        logger.info(f"Processing {len(emails)} emails ({total_docs} chunks) in batches of ~{batch_size}...")
+
+        # Embedding calls are paced (and 429s retried) by the shared
+        # embedding rate limiter, so no fixed sleeps here.
+        batches = list(batch_prepared(prepared, batch_size))
+        for n, batch in enumerate(batches, 1):
+            try:
+                logger.info(f"Upserting batch {n}/{len(batches)} ({sum(len(ids) for _, ids in batch)} chunks)...")
+                self.write_prepared(batch, self.embed_prepared(batch))
+            except Exception as e:
+                logger.error(f"Failed to upsert batch {n}: {e}")
+
+        cache_after = self.embedding_cache.stats()
+        logger.info(
+            f"Embedding cache: {cache_after['hits'] - cache_before['hits']} hits, "
+            f"{cache_after['misses'] - cache_before['misses']} misses "
+            f"({cache_after['entries']} cached vectors)"
+        )
+
+    def prepare_emails(self, emails: List[EmailDocument]) -> List[PreparedEmail]:
+        """Clean and chunk emails into Documents (CPU only, no API calls)."""
+        return [self._email_to_documents(email) for email in emails]
+
+    def embed_prepared(self, batch: List[PreparedEmail]) -> List[List[float]]:
+        """Embed every chunk of a batch (cached and rate limited)."""
+        with span("embed"):
+            return self.embedding.embed_documents([doc.page_content for docs, _ in batch for doc in docs])
+
+    def write_prepared(self, batch: List[PreparedEmail], vectors: List[List[float]]):
+        """Store embedded chunks in the vector store and keyword index, dropping stale chunks."""
+        batch_docs = [doc for docs, _ in batch for doc in docs]
+        batch_ids = [doc_id for _, doc_ids in batch for doc_id in doc_ids]
+        if not batch_ids:
+            return
+        with span("chroma_upsert"):
+            self.vector_db.upsert(
+                ids=batch_ids,
+                embeddings=vectors,
+                documents=[doc.page_content for doc in batch_docs],
+                metadatas=[doc.metadata for doc in batch_docs],
             )
-            
-            documents.append(doc)
-            ids.append(email.gmail_id)
-        
-        if documents:
-            total_docs = len(documents)
-            logger.info(f"Processing {total_docs} documents in batches of {batch_size}...")
-            
-            for i in range(0, total_docs, batch_size):
-                batch_docs = documents[i : i + batch_size]
-                batch_ids = ids[i : i + batch_size]
-                
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        logger.info(f"Upserting batch {i//batch_size + 1}/{(total_docs + batch_size - 1)//batch_size} (Attempt {attempt+1})...")
-                        self.vector_db.add_documents(documents=batch_docs, ids=batch_ids)
-                        break # Success, exit retry loop
-                    except Exception as e:
-                        if "429" in str(e) and attempt < max_retries - 1:
-                            wait_time = (attempt + 1) * 10 # Backoff: 10s, 20s
-                            logger.warning(f"Rate limit hit. Retrying in {wait_time}s...")
-                            time.sleep(wait_time)
-                        else:
-                            logger.error(f"Failed to upsert batch starting at index {i}: {e}")
-                            break # Fail or max retries reached
-                
-                # Standard delay between successful batches
-                if i + batch_size < total_docs:
-                    time.sleep(delay)
-
-    def query_similar_emails(self, query: str, n_results: int = 5) -> List[Document]:
+            self.lexical_index.upsert(
+                (doc_id, doc.page_content, doc.metadata) for doc_id, doc in zip(batch_ids, batch_docs)
+            )
+            self._delete_stale_chunks({doc.metadata["gmail_id"] for doc in batch_docs}, set(batch_ids))
+
+    def _email_to_documents(self, email: EmailDocument) -> PreparedEmail:
+        """Split one email into chunk Documents and their `gmail_id#n` IDs."""
+        # We prioritize subject and the cleaned body; every chunk carries the subject
+        header = _chunk_header(email.subject)
+        body = clean_email_body(
+            email.body_text, email.body_html, max_chars=settings.MAX_BODY_CHARS, subject=email.subject
+        )
+        chunks = chunk_text(
+            body,
+            chunk_size=settings.CHUNK_SIZE,
+            overlap=settings.CHUNK_OVERLAP,
+        ) or [""]
+
+        # Prepare metadata (ensure types are compatible with Chroma)
+        sender_email = parseaddr(email.sender)[1].lower()
+        metadata = {
+            "gmail_id": email.gmail_id,
+            "thread_id": email.thread_id,
+            "sender": email.sender,
+            "sender_email": sender_email or None,
+            "sender_domain": sender_email.rpartition("@")[2] or None,
+            "recipients": ", ".join(email.recipients),  # Convert list to string
+            "subject": email.subject,
+            "timestamp": email.timestamps.isoformat() if email.timestamps else None,
+            "timestamp_epoch": int(email.timestamps.timestamp()) if email.timestamps else None,
+            "labels": ", ".join(email.labels),  # Convert list to string
+            "chunk_count": len(chunks),
+            # One boolean per label, since Chroma can't filter on substrings
+            **{label_key(label): True for label in email.labels},
+        }
+        metadata = {k: v for k, v in metadata.items() if v is not None}  # Filter None values
+
+        documents = [
+            Document(page_content=header + chunk, metadata={**metadata, "chunk_index": n})
+            for n, chunk in enumerate(chunks)
+        ]
+        ids = [f"{email.gmail_id}#{n}" for n in range(len(chunks))]
+        return documents, ids
+
+    def _chunks_of(self, gmail_ids: Iterable[str], include: List[str]) -> Dict[str, Any]:
+        """Stored chunks of the given messages (a `get` result)."""
+        gmail_ids = sorted(set(gmail_ids))
+        found: Dict[str, Any] = {"ids": [], "metadatas": []}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(gmail_ids), 500):
+            batch = self.vector_db.get(where={"gmail_id": {"$in": gmail_ids[start : start + 500]}}, include=include)
+            found["ids"].extend(batch["ids"])
+            found["metadatas"].extend(batch.get("metadatas") or [])
+        return found
+
+    def delete_emails(self, gmail_ids: Iterable[str]) -> List[str]:
+        """Remove messages from the vector store and keyword index; returns those that were indexed."""
+        found = self._chunks_of(gmail_ids, include=["metadatas"])
+        if found["ids"]:
+            with span("chroma_upsert"):
+                self.vector_db.delete(ids=found["ids"])
+                self.lexical_index.delete(found["ids"])
+        removed = list(dict.fromkeys(m["gmail_id"] for m in found["metadatas"]))
+        if removed:
+            logger.info(f"Removed {len(removed)} messages ({len(found['ids'])} chunks) from the index")
+        return removed
+
+    def apply_label_changes(self, changes: Dict[str, LabelChange]) -> Dict[str, List[str]]:
+        """
+        Update the labels of indexed messages in place: metadata only, no
+        embedding calls. Each label's `label_X` flag is set to True or False
+        and the keyword index's labels follow. Messages now in TRASH / SPAM
+        are removed from the index.
+
+        Returns the gmail_ids "updated", "removed", and "missing" (not indexed).
+        """
+        found = self._chunks_of(changes, include=["metadatas"])
+        chunks: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for doc_id, meta in zip(found["ids"], found["metadatas"]):
+            chunks.setdefault(meta["gmail_id"], []).append((doc_id, meta))
+
+        result: Dict[str, List[str]] = {"updated": [], "removed": [], "missing": []}
+        update_ids: List[str] = []
+        update_metadatas: List[Dict[str, Any]] = []
+        for gmail_id, change in changes.items():
+            if gmail_id not in chunks:
+                result["missing"].append(gmail_id)
+                continue
+            meta = chunks[gmail_id][0][1]
+            current = {l.strip() for l in str(meta.get("labels") or "").split(",") if l.strip()}
+            labels = change.apply(current)
+            if labels & HIDDEN_LABELS:
+                result["removed"].append(gmail_id)
+                continue
+            if labels == current:
+                continue
+
+            flags = {**{label_key(l): False for l in current - labels}, **{label_key(l): True for l in labels}}
+            for doc_id, chunk_meta in chunks[gmail_id]:
+                update_ids.append(doc_id)
+                update_metadatas.append({**chunk_meta, **flags, "labels": ", ".join(sorted(labels))})
+            result["updated"].append(gmail_id)
+
+        if update_ids:
+            with span("chroma_upsert"):
+                self.vector_db.update_metadata(update_ids, update_metadatas)
+                self.lexical_index.set_labels((i, m["labels"]) for i, m in zip(update_ids, update_metadatas))
+        if result["removed"]:
+            self.delete_emails(result["removed"])
+        return result
+
+    def _delete_stale_chunks(self, gmail_ids: Set[str], keep_ids: Set[str]):
+        existing = self.vector_db.get(where={"gmail_id": {"$in": sorted(gmail_ids)}}, include=[])
+        stale = [doc_id for doc_id in existing["ids"] if doc_id not in keep_ids]
+        if stale:
+            self.vector_db.delete(ids=stale)
+            self.lexical_index.delete(stale)
+            logger.debug(f"Removed {len(stale)} stale chunks")
+
+    def message_vectors(self, docs: List[Document]) -> Dict[str, List[float]]:
+        """
+        One embedding per collapsed search result, keyed by gmail_id: the
+        mean of its matched chunks' stored vectors (no embedding calls).
+        """
+        chunk_ids: Dict[str, List[str]] = {}
+        for doc in docs:
+            gmail_id = doc.metadata.get("gmail_id")
+            if gmail_id:
+                chunks = str(doc.metadata.get("matched_chunks", "0")).split(",")
+                chunk_ids[gmail_id] = [f"{gmail_id}#{n}" for n in chunks]
+        if not chunk_ids:
+            return {}
+
+        found = self.vector_db.get(ids=[i for ids in chunk_ids.values() for i in ids], include=["embeddings"])
+        by_id = dict(zip(found["ids"], found["embeddings"]))
+        vectors = {}
+        for gmail_id, ids in chunk_ids.items():
+            rows = [by_id[i] for i in ids if i in by_id]
+            if rows:
+                vectors[gmail_id] = np.mean(np.asarray(rows, dtype=np.float32), axis=0).tolist()
+        return vectors
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a search query (cached and rate limited)."""
+        with span("embed_query"):
+            return self.embedding.embed_query(query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several search queries in one call (cached and rate limited)."""
+        with span("embed_query"):
+            return self.embedding.embed_queries(queries)
+
+    def query_similar_emails(
+        self,
+        query: str,
+        n_results: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[QueryFilters] = None,
+    ) -> List[Document]:
         """
         Search for emails similar to the query.
+        Sender, label and date constraints parsed from the query (or given as
+        `filters`) restrict both the vector and the keyword search; if
+        nothing matches them, the search is retried unfiltered.
+        Chunk hits are collapsed per message: each result is one email made
+        of its best-matching chunks (at most MAX_CHUNKS_PER_MESSAGE).
+        Pass `query_embedding` when the query has already been embedded.
         """
         if not query:
             return []
-            
-        return self.vector_db.similarity_search(query, k=n_results)
\ No newline at end of file
+
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        if filters is None:
+            filters = self.parse_query(query)
+
+        # Over-fetch chunks so that enough distinct messages survive collapsing
+        fetch_k = n_results * settings.CHUNK_FETCH_FACTOR
+        with span("retrieval"):
+            hits = self._search_chunks(filters, query_embedding, fetch_k)
+            if not hits and not filters.is_empty:
+                logger.info(f"No emails match the filters parsed from {query!r}; searching without them")
+                hits = self._search_chunks(QueryFilters(text=query), query_embedding, fetch_k)
+            return _collapse_chunks(hits, n_results, settings.MAX_CHUNKS_PER_MESSAGE)
+
+    def parse_query(self, query: str) -> QueryFilters:
+        """
+        Filters parsed from `query` (see query_filters.parse_query), with the
+        user's label names resolved to this mailbox's label IDs when
+        `label_ids` is set. Only a `label:` naming a user label lists the
+        labels (from Gmail when the cached list expired): blocking.
+        """
+        return parse_query(query, label_ids=self._label_ids if self.label_ids is not None else None)
+
+    def _label_ids(self) -> Optional[Mapping[str, str]]:
+        try:
+            return self.label_ids()
+        except Exception as e:
+            # System labels still work; user label names stay unresolved
+            logger.warning(f"Could not list Gmail labels to resolve label filters: {e}")
+            return None
+
+    def _search_chunks(self, filters: QueryFilters, query_embedding: List[float], k: int) -> List[Document]:
+        """Top `k` chunks matching `filters`, by vector similarity fused with BM25."""
+        where = filters.to_chroma_where()
+        # Chroma's filtered HNSW search is slow for narrow filters; when the
+        # filter leaves few enough chunks, score those exactly instead
+        candidates = (
+            self.lexical_index.filter_ids(filters, limit=settings.PREFILTER_MAX_CANDIDATES) if where else None
+        )
+        if candidates is not None:
+            vector_hits = self._rank_candidates(candidates, query_embedding, k)
+        else:
+            vector_hits = self.vector_db.search(query_embedding, k, where)
+        if not settings.HYBRID_SEARCH:
+            return vector_hits
+
+        lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(filters.text, k=k, filters=filters)]
+        if not lexical_ids:
+            return vector_hits
+
+        fused = _fuse_rankings([[doc.id for doc in vector_hits], lexical_ids], settings.RRF_K)[:k]
+        docs = {doc.id: doc for doc in vector_hits}
+        missing = [doc_id for doc_id in fused if doc_id not in docs]
+        if missing:
+            found = self.vector_db.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, text, meta in zip(found["ids"], found["documents"], found["metadatas"]):
+                docs[doc_id] = Document(page_content=text, metadata=meta or {}, id=doc_id)
+        # Keyword hits missing from the vector store (e.g. a failed batch) are skipped
+        return [docs[doc_id] for doc_id in fused if doc_id in docs]
+
+    def _rank_candidates(self, doc_ids: List[str], query_embedding: List[float], k: int) -> List[Document]:
+        """Exact cosine ranking of the given chunks against the query."""
+        if not doc_ids:
+            return []
+        # Vectors for every candidate, but documents only for the winners
+        found = self.vector_db.get(ids=doc_ids, include=["embeddings"])
+        if not len(found["ids"]):
+            return []
+        matrix = np.asarray(found["embeddings"], dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+        top_ids = [found["ids"][i] for i in np.argsort(-scores)[:k]]
+
+        found = self.vector_db.get(ids=top_ids, include=["documents", "metadatas"])
+        docs = {
+            doc_id: Document(page_content=text, metadata=meta or {}, id=doc_id)
+            for doc_id, text, meta in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [docs[doc_id] for doc_id in top_ids if doc_id in docs]
+
+    async def aquery_similar_emails(
+        self,
+        query: str,
+        n_results: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[QueryFilters] = None,
+    ) -> List[Document]:
+        """
+        Async variant of query_similar_emails.
+        Chroma's client is blocking, so the search runs on the bounded I/O executor.
+        """
+        return await run_blocking(self.query_similar_emails, query, n_results, query_embedding, filters)
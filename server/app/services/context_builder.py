@@ -0,0 +1,255 @@
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.lexical_index import WORD_PATTERN, query_terms
+
+# Rough size of a Gemini token in English text; good enough to enforce a budget
+CHARS_PER_TOKEN = 4
+
+# Marks text left out between two kept passages of an email
+ELISION = " [...] "
+
+# Passages are paragraphs, split further at sentence ends when too long
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Word n-gram size used to spot a reply that repeats an earlier message
+SHINGLE_SIZE = 5
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class PackedContext:
+    """The prompt context of one question, and how it was put together."""
+
+    text: str
+    docs: List[Document]                 # emails in the prompt, in prompt order
+    tokens: int                          # estimated tokens of `text`
+    candidates: int                      # emails retrieved before selection
+    duplicates: List[str] = field(default_factory=list)   # gmail_ids dropped as redundant
+    excerpted: int = 0                   # emails cut down to their relevant passages
+    prompt_tokens: int = 0               # estimated tokens of the whole prompt, once formatted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "context_tokens": self.tokens,
+            "candidates": self.candidates,
+            "selected": len(self.docs),
+            "duplicates": len(self.duplicates),
+            "excerpted": self.excerpted,
+        }
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+
+
+def _split_body(doc: Document):
+    """(subject header, body) of a collapsed search result."""
+    header, sep, body = doc.page_content.partition("\n\n")
+    return (header, body) if sep and header.startswith("Subject:") else ("", doc.page_content)
+
+
+def _passages(body: str) -> List[str]:
+    passages = []
+    for paragraph in re.split(r"\n\s*\n|\n\[\.\.\.\]\n", body):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= settings.CHUNK_SIZE // 3:
+            passages.append(paragraph)
+        else:
+            passages.extend(s for s in SENTENCE_END.split(paragraph) if s)
+    return passages
+
+
+def _shingles(text: str) -> Set[int]:
+    words = WORD_PATTERN.findall(text.lower())
+    return {hash(tuple(words[i:i + SHINGLE_SIZE])) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+
+
+def _containment(inner: Set[int], outer: Set[int]) -> float:
+    """Share of `inner`'s shingles that also occur in `outer`."""
+    return len(inner & outer) / len(inner) if inner else 1.0
+
+
+class ContextBuilder:
+    """
+    Packs retrieved emails into the answer prompt within a token budget.
+
+    1. Redundant candidates are dropped: near-identical vectors, or a
+       message of the same thread whose text is mostly contained in a
+       better-ranked one (e.g. a reply quoting it).
+    2. The rest are ordered by maximal marginal relevance, so a few similar
+       emails can't crowd out a different but relevant one.
+    3. Each email contributes at most `excerpt_tokens`: its passages sharing
+       the most terms with the question, in their original order.
+
+    Emails are added in MMR order until the budget is spent.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = settings.CONTEXT_TOKEN_BUDGET,
+        excerpt_tokens: int = settings.CONTEXT_EXCERPT_TOKENS,
+        mmr_lambda: float = settings.CONTEXT_MMR_LAMBDA,
+        duplicate_similarity: float = settings.CONTEXT_DUPLICATE_SIMILARITY,
+        thread_containment: float = settings.CONTEXT_THREAD_CONTAINMENT,
+    ):
+        self.token_budget = token_budget
+        self.excerpt_tokens = excerpt_tokens
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_similarity = duplicate_similarity
+        self.thread_containment = thread_containment
+
+    def build(
+        self,
+        query: str,
+        docs: List[Document],
+        query_embedding: Optional[List[float]] = None,
+        vectors: Optional[Dict[str, List[float]]] = None,
+    ) -> PackedContext:
+        """
+        `docs` are the ranked candidates (one per email); `vectors` maps their
+        gmail_id to an embedding. Without vectors, retrieval order is kept.
+        """
+        candidates = len(docs)
+        docs, duplicates = self._drop_duplicates(docs, vectors or {})
+        if query_embedding is not None and vectors:
+            docs = self._mmr_order(docs, query_embedding, vectors)
+
+        terms = set(query_terms(query))
+        parts: List[str] = []
+        used: List[Document] = []
+        tokens = 0
+        excerpted = 0
+        for doc in docs:
+            meta = doc.metadata
+            source_info = f"Email {len(used) + 1} from {meta.get('sender')} (Subject: {meta.get('subject')}, Date: {meta.get('timestamp')}):"
+            overhead = estimate_tokens(source_info) + 2
+            room = min(self.excerpt_tokens, self.token_budget - tokens - overhead)
+            if room < min(self.excerpt_tokens, 64):
+                break
+
+            _, body = _split_body(doc)
+            excerpt = self._excerpt(body, terms, room)
+            if excerpt != body.strip():
+                excerpted += 1
+            part = f"{source_info}\n{excerpt}\n---"
+            parts.append(part)
+            used.append(doc)
+            tokens += estimate_tokens(part) + 1
+
+        return PackedContext(
+            text="\n".join(parts),
+            docs=used,
+            tokens=tokens,
+            candidates=candidates,
+            duplicates=duplicates,
+            excerpted=excerpted,
+        )
+
+    def _drop_duplicates(self, docs: List[Document], vectors: Dict[str, List[float]]):
+        kept: List[Document] = []
+        kept_vectors: List[np.ndarray] = []
+        kept_shingles: List[Set[int]] = []
+        duplicates: List[str] = []
+        for doc in docs:
+            gmail_id = doc.metadata.get("gmail_id")
+            vector = vectors.get(gmail_id)
+            vector = None if vector is None else np.asarray(vector, dtype=np.float32)
+            if vector is not None:
+                vector = vector / (np.linalg.norm(vector) + 1e-12)
+            shingles = _shingles(_split_body(doc)[1])
+
+            redundant = False
+            for other, other_vector, other_shingles in zip(kept, kept_vectors, kept_shingles):
+                if vector is not None and other_vector is not None and float(vector @ other_vector) >= self.duplicate_similarity:
+                    redundant = True
+                elif (
+                    doc.metadata.get("thread_id")
+                    and doc.metadata.get("thread_id") == other.metadata.get("thread_id")
+                    and _containment(shingles, other_shingles) >= self.thread_containment
+                ):
+                    redundant = True
+                if redundant:
+                    break
+
+            if redundant:
+                duplicates.append(gmail_id)
+                continue
+            kept.append(doc)
+            kept_vectors.append(vector)
+            kept_shingles.append(shingles)
+        return kept, duplicates
+
+    def _mmr_order(self, docs: List[Document], query_embedding: List[float], vectors: Dict[str, List[float]]) -> List[Document]:
+        with_vectors = [d for d in docs if d.metadata.get("gmail_id") in vectors]
+        without = [d for d in docs if d.metadata.get("gmail_id") not in vectors]
+        if len(with_vectors) < 2:
+            return docs
+
+        matrix = _normalize_rows(np.asarray([vectors[d.metadata["gmail_id"]] for d in with_vectors], dtype=np.float32))
+        query = np.asarray(query_embedding, dtype=np.float32)
+        relevance = matrix @ (query / (np.linalg.norm(query) + 1e-12))
+        similarity = matrix @ matrix.T
+
+        selected: List[int] = []
+        remaining = list(range(len(with_vectors)))
+        while remaining:
+            if selected:
+                redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining), dtype=np.float32)
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            best = remaining[int(np.argmax(scores))]
+            selected.append(best)
+            remaining.remove(best)
+        # Emails without a vector (e.g. keyword-only hits) keep their rank, after the others
+        return [with_vectors[i] for i in selected] + without
+
+    def _excerpt(self, body: str, terms: Set[str], max_tokens: int) -> str:
+        body = body.strip()
+        if estimate_tokens(body) <= max_tokens:
+            return body
+
+        passages = _passages(body)
+        scores = []
+        for n, passage in enumerate(passages):
+            words = set(WORD_PATTERN.findall(passage.lower()))
+            # Ties go to earlier passages: openings usually say what the email is about
+            scores.append((len(words & terms), -n))
+
+        chosen: Set[int] = set()
+        budget = max_tokens * CHARS_PER_TOKEN
+        for score, neg_index in sorted(scores, reverse=True):
+            n = -neg_index
+            cost = len(passages[n]) + len(ELISION)
+            if cost > budget:
+                continue
+            chosen.add(n)
+            budget -= cost
+
+        if not chosen:
+            # One huge passage: keep its beginning
+            return body[: max_tokens * CHARS_PER_TOKEN].rsplit(" ", 1)[0] + ELISION.rstrip()
+
+        pieces = []
+        previous = -1
+        for n in sorted(chosen):
+            if n != previous + 1:
+                pieces.append(ELISION.strip())
+            pieces.append(passages[n])
+            previous = n
+        if previous != len(passages) - 1:
+            pieces.append(ELISION.strip())
+        return " ".join(pieces)
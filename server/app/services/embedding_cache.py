@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+from loguru import logger
+from langchain_core.embeddings import Embeddings
+
+from app.core.metrics import CACHE_LOOKUPS
+from app.services.rate_limiter import embed_queries
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache stored in SQLite.
+    Entries are keyed by sha256(model, kind, text) so a model change never
+    serves stale vectors. Least-recently-used entries are evicted once the
+    cache grows past `max_entries`.
+    """
+
+    def __init__(self, path: str, model: str, max_entries: int = 100_000):
+        self.path = path
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, text: str, kind: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str], kind: str = "document") -> List[Optional[List[float]]]:
+        keys = [self._key(t, kind) for t in texts]
+        found: Dict[str, List[float]] = {}
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+
+            hits = sum(1 for k in keys if k in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        CACHE_LOOKUPS.inc(hits, cache="embedding", result="hit")
+        CACHE_LOOKUPS.inc(len(keys) - hits, cache="embedding", result="miss")
+
+        return [found.get(k) for k in keys]
+
+    def put_many(self, texts: List[str], vectors: List[List[float]], kind: str = "document"):
+        now = time.time()
+        rows = [(self._key(t, kind), array("f", v).tobytes(), now) for t, v in zip(texts, vectors)]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._entries += self._conn.total_changes - before
+            if self._entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop down to 90% of capacity so eviction doesn't run on every insert
+        excess = self._entries - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Embedding cache evicted {excess} entries ({self._entries} remain)")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": self._entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with an EmbeddingCache.
+    Only cache misses are sent to the underlying model.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(texts, kind="document")
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+        if missing:
+            # Identical texts within one call are embedded once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique_texts, self.embeddings.embed_documents(unique_texts)))
+            self.cache.put_many(unique_texts, [computed[t] for t in unique_texts], kind="document")
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        cached = self.cache.get_many([text], kind="query")[0]
+        if cached is not None:
+            return cached
+
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many([text], [vector], kind="query")
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Batch variant of embed_query: the misses are embedded in one call."""
+        vectors = self.cache.get_many(texts, kind="query")
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+        if missing:
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique_texts, embed_queries(self.embeddings, unique_texts)))
+            self.cache.put_many(unique_texts, [computed[t] for t in unique_texts], kind="query")
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+
+        return vectors
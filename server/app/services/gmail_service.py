@@ -1,60 +1,177 @@
 from loguru import logger
 import os
 import base64
+import random
+import threading
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Set, Tuple
 from email import policy
+from email.header import decode_header, make_header
+from email.message import Message
 from email.parser import BytesParser
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, build_http
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 
-from app.core.auth import load_tokens, save_tokens
-
+from app.core.credentials import credential_manager
+from app.core.config import settings
+from app.core.metrics import GMAIL_RETRIES, span
+
+
+from app.models.domain import EmailDocument
+from app.services.query_filters import label_name_key
+
+# Gmail accepts up to 100 sub-requests per batch, but recommends staying
+# around 50 to avoid per-user rate limiting.
+GMAIL_BATCH_SIZE = 50
+GMAIL_MAX_BATCH_SIZE = 100
+
+# Largest page `messages.list` will return
+GMAIL_MAX_PAGE_SIZE = 500
+
+# How long `labels.list` is trusted before a query resolving label names lists them again
+LABELS_CACHE_SECONDS = 600
+
+# Partial response for format="full": drops snippet / sizeEstimate and keeps
+# the MIME tree; attachment parts only carry an attachmentId, never their bytes.
+_PART_FIELDS = "partId,mimeType,filename,headers,body"
+FULL_FORMAT_FIELDS = (
+    "id,threadId,historyId,internalDate,labelIds,"
+    f"payload({_PART_FIELDS},parts({_PART_FIELDS},parts({_PART_FIELDS},parts)))"
+)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def _is_quota_error(exc: Exception) -> bool:
+    """True for Gmail quota errors (429 / rate-limit 403)."""
+    if not isinstance(exc, HttpError):
+        return False
+    if exc.status_code == 429:
+        return True
+    if exc.status_code == 403:
+        details = exc.error_details if isinstance(exc.error_details, list) else []
+        return any(d.get("reason") in RATE_LIMIT_REASONS for d in details if isinstance(d, dict))
+    return False
+
+
+def _is_retryable_error(exc: Exception) -> bool:
+    """True for transient Gmail errors (rate limiting / server side)."""
+    if not isinstance(exc, HttpError):
+        return False
+    return exc.status_code in RETRYABLE_STATUS_CODES or _is_quota_error(exc)
+
+
+def _decode_header_value(value: str) -> str:
+    """Decode RFC 2047 encoded-words (=?utf-8?...?=) in a header value."""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return value
+
+
+class HistoryExpiredError(Exception):
+    """Raised when a startHistoryId is too old for `users.history.list`."""
+
+
+@dataclass
+class LabelChange:
+    """
+    Net label change of one message over a stretch of history: the labels
+    added and removed since, and its whole label set when Gmail reported it.
+    """
+    added: Set[str] = field(default_factory=set)
+    removed: Set[str] = field(default_factory=set)
+    labels: Optional[Set[str]] = None
+
+    def apply(self, current: Set[str]) -> Set[str]:
+        return ((self.labels if self.labels is not None else current) | self.added) - self.removed
+
+
+@dataclass
+class HistoryChanges:
+    """What `users.history.list` reported since a historyId."""
+    history_id: str
+    added: List[str] = field(default_factory=list)              # new message IDs, oldest first
+    deleted: List[str] = field(default_factory=list)            # permanently deleted message IDs
+    labels: Dict[str, LabelChange] = field(default_factory=dict)  # per message ID, in history order
+
+
+def _apply_history_record(changes: HistoryChanges, record: Dict[str, Any]):
+    """Fold one `history` record into `changes`."""
+    for item in record.get("messagesAdded", []):
+        changes.added.append(item["message"]["id"])
+    for item in record.get("messagesDeleted", []):
+        changes.deleted.append(item["message"]["id"])
+
+    for key, adding in (("labelsAdded", True), ("labelsRemoved", False)):
+        for item in record.get(key, []):
+            message = item["message"]
+            change = changes.labels.setdefault(message["id"], LabelChange())
+            if "labelIds" in message:
+                # The message's labels after this change; the deltas are kept to tell what was removed
+                change.labels = set(message["labelIds"])
+            delta = set(item.get("labelIds", []))
+            if adding:
+                change.added |= delta
+                change.removed -= delta
+            else:
+                change.removed |= delta
+                change.added -= delta
 
-from app.models.domain import EmailDocument, GoogleTokenStore
-from google.auth.transport.requests import Request
 
 class GmailService:
-    def __init__(self):
+    def __init__(self, service=None, fetch_format: Optional[str] = None, credentials: Optional[Credentials] = None):
         """
-        Single-user Gmail service. Calls load_tokens() from core/auth.py.
+        Gmail service for one mailbox, authorized by `credentials` (by default
+        those of the single-user credential_manager).
+        A pre-built API client can be passed as `service` (e.g. an offline stand-in).
+        `fetch_format` ("full" or "raw") defaults to settings.GMAIL_FETCH_FORMAT.
         """
         logger.info("Initializing GmailService...")
-        self.token_store: Optional[GoogleTokenStore] = load_tokens()
-
-        if not self.token_store:
+        self.fetch_format = fetch_format or settings.GMAIL_FETCH_FORMAT
+        # Quota errors this client got while fetching messages (see SyncService.run)
+        self.quota_errors = 0
+        self._quota_lock = threading.Lock()
+        self._label_ids: Optional[Dict[str, str]] = None
+        self._labels_listed_at = 0.0
+        self._labels_lock = threading.Lock()
+        if service is not None:
+            self.creds = None
+            self.service = service
+            return
+
+        # Kept fresh (and refreshed once for all threads) by their manager
+        self.creds: Optional[Credentials] = credentials or credential_manager.credentials()
+
+        if not self.creds:
             logger.error("No Google credentials found! User must authenticate first.")
             raise RuntimeError("No Google credentials found. Please authenticate first.")
 
-        self.creds = self._get_credentials(self.token_store)
         self.service = self._build_service()
         logger.success("GmailService initialized successfully.")
 
-    def _get_credentials(self, store: GoogleTokenStore) -> Credentials:
-        creds = Credentials(
-            token=store.access_token,
-            refresh_token=store.refresh_token,
-            client_id=store.client_id,
-            client_secret=store.client_secret,
-            token_uri=store.token_uri,
-            scopes=store.scopes,
-            expiry=store.expiry
-        )
-
-        if creds.expired and creds.refresh_token:
-            logger.info("Token expired, refreshing...")
-            creds.refresh(Request())
-            save_tokens(creds)
-        
-        return creds
-
     def _build_service(self):
+        # The service object is shared across request threads, but httplib2
+        # connections are not thread-safe: every thread gets its own
+        # authorized Http via requestBuilder.
+        self._local = threading.local()
         try:
-            service = build("gmail", "v1", credentials=self.creds, cache_discovery=False)
+            service = build(
+                "gmail",
+                "v1",
+                http=self._thread_http(),
+                requestBuilder=self._build_request,
+                cache_discovery=False,
+            )
             logger.info("Successfully built Gmail API client.")
             return service
         except Exception as e:
@@ -62,6 +179,16 @@ class GmailService:
             raise
 
 
+    def _thread_http(self) -> AuthorizedHttp:
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = AuthorizedHttp(self.creds, http=build_http())
+            self._local.http = http
+        return http
+
+    def _build_request(self, http, *args, **kwargs) -> HttpRequest:
+        return HttpRequest(self._thread_http(), *args, **kwargs)
+
     def get_profile(self) -> Dict[str, Any]:
         """Return Gmail profile info."""
         try:
@@ -72,138 +199,403 @@ class GmailService:
             logger.exception("Error fetching Gmail profile")
             raise
 
+    def label_ids(self) -> Dict[str, str]:
+        """
+        The mailbox's labels: label_name_key(name) -> label ID, e.g.
+        {"my-project": "Label_12", "inbox": "INBOX"}. Cached for LABELS_CACHE_SECONDS.
+        """
+        with self._labels_lock:
+            if self._label_ids is None or time.monotonic() - self._labels_listed_at > LABELS_CACHE_SECONDS:
+                response = self.service.users().labels().list(userId="me").execute()
+                self._label_ids = {label_name_key(label["name"]): label["id"] for label in response.get("labels", [])}
+                self._labels_listed_at = time.monotonic()
+            return self._label_ids
+
     def list_messages(self, query: Optional[str] = None, max_results: int = 100):
         """List recent messages using Gmail search query."""
+        msgs = [m for page, _ in self.iter_message_pages(query=query, max_results=max_results) for m in page]
+        logger.info(f"Fetched {len(msgs)} message IDs")
+        return msgs
+
+    def iter_message_pages(
+        self,
+        query: Optional[str] = None,
+        max_results: Optional[int] = None,
+        page_size: int = GMAIL_MAX_PAGE_SIZE,
+        page_token: Optional[str] = None,
+    ) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """
+        Yield `(message stubs, next page token)` for each page of messages
+        matching `query`, newest first, following `nextPageToken` until
+        `max_results` messages (or the whole mailbox, if None) have been
+        listed. Pages are requested lazily, as the caller consumes them;
+        pass a yielded token back as `page_token` to resume the listing.
+        """
+        listed = 0
+        while max_results is None or listed < max_results:
+            size = min(page_size, GMAIL_MAX_PAGE_SIZE)
+            if max_results is not None:
+                size = min(size, max_results - listed)
+            try:
+                with span("gmail_list"):
+                    resp = (
+                        self.service.users()
+                        .messages()
+                        .list(userId="me", q=query, maxResults=size, pageToken=page_token)
+                        .execute()
+                    )
+            except HttpError:
+                logger.exception("Error listing Gmail messages")
+                raise
+
+            page = resp.get("messages", [])
+            page_token = resp.get("nextPageToken")
+            listed += len(page)
+            if page:
+                yield page, page_token
+            if not page_token:
+                break
+
+    def estimate_messages(self, query: Optional[str] = None) -> int:
+        """Gmail's (approximate) count of messages matching `query`."""
         try:
-            resp = (
-                self.service.users()
-                .messages()
-                .list(userId="me", q=query, maxResults=max_results)
-                .execute()
-            )
-            msgs = resp.get("messages", [])
-            logger.info(f"Fetched {len(msgs)} message IDs")
-            return msgs
+            resp = self.service.users().messages().list(userId="me", q=query, maxResults=1).execute()
         except HttpError:
-            logger.exception("Error listing Gmail messages")
+            logger.exception("Error estimating Gmail message count")
             raise
+        return int(resp.get("resultSizeEstimate", 0))
 
 
+    def _get_message_request(self, message_id: str):
+        """`messages.get` in the configured fetch format."""
+        if self.fetch_format == "full":
+            return self.service.users().messages().get(
+                userId="me", id=message_id, format="full", fields=FULL_FORMAT_FIELDS
+            )
+        return self.service.users().messages().get(userId="me", id=message_id, format="raw")
+
     def fetch_message_details(self, message_id: str) -> EmailDocument:
         """Fetch + decode full email."""
         try:
-            msg = (
-                self.service.users()
-                .messages()
-                .get(userId="me", id=message_id, format="raw")
-                .execute()
-            )
+            with span("gmail_get"):
+                msg = self._get_message_request(message_id).execute()
+            if self.fetch_format == "full":
+                return self._parse_full_message(msg)
 
-            raw_b64 = msg.get("raw")
-            if not raw_b64:
+            if not msg.get("raw"):
                 logger.warning("Raw format unavailable, falling back to FULL format.")
                 msg_full = (
                     self.service.users()
                     .messages()
-                    .get(userId="me", id=message_id, format="full")
+                    .get(userId="me", id=message_id, format="full", fields=FULL_FORMAT_FIELDS)
                     .execute()
                 )
                 return self._parse_full_message(msg_full)
 
-            raw_bytes = base64.urlsafe_b64decode(raw_b64.encode("utf-8"))
-            email_message = BytesParser(policy=policy.default).parsebytes(raw_bytes)
+            return self._parse_raw_message(msg)
+
+        except HttpError:
+            logger.exception(f"Failed fetching details for message {message_id}")
+            raise
+
+    def _parse_raw_message(self, msg: Dict[str, Any]) -> EmailDocument:
+        """Decode a RAW-format `messages.get` response into an EmailDocument."""
+        message_id = msg.get("id")
+        raw_bytes = base64.urlsafe_b64decode(msg["raw"].encode("utf-8"))
+        email_message = BytesParser(policy=policy.default).parsebytes(raw_bytes)
 
-            body_text, body_html = None, None
+        body_text, body_html = None, None
 
-            if email_message.is_multipart():
-                for part in email_message.walk():
-                    ctype = part.get_content_type()
-                    if ctype == "text/plain":
-                        body_text = (part.get_content() or "").strip()
-                    elif ctype == "text/html":
-                        body_html = (part.get_content() or "").strip()
-            else:
-                if email_message.get_content_type() == "text/plain":
-                    body_text = email_message.get_content().strip()
-                elif email_message.get_content_type() == "text/html":
-                    body_html = email_message.get_content().strip()
-
-            headers = dict(email_message.items())
-
-            # Extract sender and recipients from headers
-            sender = headers.get("From", "Unknown")
-            recipients = []
-            if "To" in headers:
-                recipients.extend([r.strip() for r in headers["To"].split(",")])
-            if "Cc" in headers:
-                recipients.extend([r.strip() for r in headers["Cc"].split(",")])
-            
-            subject = headers.get("Subject", "(No Subject)")
-            
-            # Convert internalDate (ms) to datetime
-            internal_date = msg.get("internalDate")
-            timestamps = datetime.fromtimestamp(int(internal_date) / 1000) if internal_date else datetime.now()
-
-            email_doc = EmailDocument(
-                gmail_id=message_id,
-                thread_id=msg.get("threadId"),
-                history_id=msg.get("historyId"),
-                sender=sender,
-                recipients=recipients,
-                subject=subject,
-                timestamps=timestamps,
-                body_text=body_text,
-                body_html=body_html,
-                labels=msg.get("labelIds", []),
+        if email_message.is_multipart():
+            for part in email_message.walk():
+                if part.is_attachment():
+                    continue
+                ctype = part.get_content_type()
+                if ctype == "text/plain":
+                    body_text = (part.get_content() or "").strip()
+                elif ctype == "text/html":
+                    body_html = (part.get_content() or "").strip()
+        else:
+            if email_message.get_content_type() == "text/plain":
+                body_text = email_message.get_content().strip()
+            elif email_message.get_content_type() == "text/html":
+                body_html = email_message.get_content().strip()
+
+        return self._build_email_document(msg, dict(email_message.items()), body_text, body_html)
+
+    def _build_email_document(
+        self,
+        msg: Dict[str, Any],
+        headers: Dict[str, str],
+        body_text: Optional[str],
+        body_html: Optional[str],
+    ) -> EmailDocument:
+        """Assemble an EmailDocument from a `messages.get` response and its decoded parts."""
+        message_id = msg.get("id")
+
+        # Extract sender and recipients from headers
+        sender = headers.get("From", "Unknown")
+        recipients = []
+        if "To" in headers:
+            recipients.extend([r.strip() for r in headers["To"].split(",")])
+        if "Cc" in headers:
+            recipients.extend([r.strip() for r in headers["Cc"].split(",")])
+
+        subject = headers.get("Subject", "(No Subject)")
+
+        # Convert internalDate (ms) to datetime
+        internal_date = msg.get("internalDate")
+        timestamps = datetime.fromtimestamp(int(internal_date) / 1000) if internal_date else datetime.now()
+
+        email_doc = EmailDocument(
+            gmail_id=message_id,
+            thread_id=msg.get("threadId"),
+            history_id=msg.get("historyId"),
+            sender=sender,
+            recipients=recipients,
+            subject=subject,
+            timestamps=timestamps,
+            body_text=body_text,
+            body_html=body_html,
+            labels=msg.get("labelIds", []),
+        )
+
+        logger.debug(f"Parsed message: {message_id}")
+        return email_doc
+
+    # -----------------------
+    # Batched Fetching
+    # -----------------------
+
+    def fetch_messages_batch(
+        self,
+        message_ids: List[str],
+        batch_size: int = GMAIL_BATCH_SIZE,
+        max_retries: int = 3,
+    ) -> List[EmailDocument]:
+        """
+        Fetch + decode many emails using Gmail batch HTTP requests.
+        Each batch carries up to `batch_size` `messages.get` sub-requests in a
+        single round-trip. Sub-requests that fail with a retryable error
+        (429 / 5xx / rate-limit 403) are retried on their own with exponential
+        backoff; permanent failures are logged and skipped.
+        Returns documents in the order of `message_ids`.
+        """
+        documents = []
+        for response in self.fetch_raw_messages(message_ids, batch_size, max_retries):
+            try:
+                documents.append(self.parse_message(response))
+            except Exception:
+                logger.exception(f"Failed to parse message {response.get('id')}")
+        return documents
+
+    def fetch_raw_messages(
+        self,
+        message_ids: List[str],
+        batch_size: int = GMAIL_BATCH_SIZE,
+        max_retries: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """
+        The network half of fetch_messages_batch: returns the undecoded
+        `messages.get` responses, in the order of `message_ids`, so that
+        MIME parsing can run elsewhere (see parse_message).
+        """
+        batch_size = max(1, min(batch_size, GMAIL_MAX_BATCH_SIZE))
+        ordered_ids = list(dict.fromkeys(message_ids))
+        results: Dict[str, Dict[str, Any]] = {}
+
+        pending = ordered_ids
+        attempt = 0
+        while pending:
+            failed: List[str] = []
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start : start + batch_size]
+                failed.extend(self._execute_fetch_batch(chunk, results))
+
+            if not failed:
+                break
+
+            attempt += 1
+            if attempt > max_retries:
+                logger.error(f"Giving up on {len(failed)} messages after {max_retries} retries")
+                break
+
+            GMAIL_RETRIES.inc(len(failed))
+            wait_time = min(2 ** attempt, 32) + random.uniform(0, 1)
+            logger.warning(f"{len(failed)} sub-requests failed, retrying them in {wait_time:.1f}s...")
+            time.sleep(wait_time)
+            pending = failed
+
+        return [results[mid] for mid in ordered_ids if mid in results]
+
+    def parse_message(self, response: Dict[str, Any]) -> EmailDocument:
+        """Decode a `messages.get` response fetched by fetch_raw_messages."""
+        if response.get("raw"):
+            with span("mime_parse"):
+                return self._parse_raw_message(response)
+        if response.get("payload"):
+            with span("mime_parse"):
+                return self._parse_full_message(response)
+        # Neither format came back for this message: fetch it individually
+        return self.fetch_message_details(response["id"])
+
+    def _execute_fetch_batch(self, message_ids: List[str], results: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Run one batch request; returns the IDs whose sub-requests should be retried."""
+        retry_ids: List[str] = []
+        quota_errors = 0
+
+        def on_response(request_id, response, exception):
+            nonlocal quota_errors
+            if exception is not None:
+                if _is_retryable_error(exception):
+                    retry_ids.append(request_id)
+                    quota_errors += _is_quota_error(exception)
+                else:
+                    logger.error(f"Failed fetching details for message {request_id}: {exception}")
+                return
+            results[request_id] = response
+
+        batch = self.service.new_batch_http_request(callback=on_response)
+        for message_id in message_ids:
+            batch.add(
+                self._get_message_request(message_id),
+                request_id=message_id,
             )
 
-            logger.debug(f"Parsed message: {message_id}")
-            return email_doc
+        try:
+            with span("gmail_get"):
+                batch.execute()
+        except HttpError as e:
+            if not _is_retryable_error(e):
+                raise
+            # The whole batch was rejected: retry everything that didn't complete
+            logger.warning(f"Batch request failed ({e.status_code}), will retry {len(message_ids)} messages")
+            retry_ids = [mid for mid in message_ids if mid not in results]
+            if _is_quota_error(e):
+                self._count_quota_errors(len(retry_ids))
+            return retry_ids
+
+        self._count_quota_errors(quota_errors)
+        logger.debug(f"Batch fetched {len(message_ids) - len(retry_ids)}/{len(message_ids)} messages")
+        return retry_ids
+
+    def _count_quota_errors(self, count: int):
+        if count:
+            with self._quota_lock:
+                self.quota_errors += count
 
-        except HttpError:
-            logger.exception(f"Failed fetching details for message {message_id}")
+    # -----------------------
+    # Incremental Sync (History API)
+    # -----------------------
+
+    def list_history(self, start_history_id: str) -> HistoryChanges:
+        """
+        Return the messages added and deleted and the label changes since
+        `start_history_id`, with the latest historyId.
+        Raises HistoryExpiredError when Gmail no longer has that history
+        (typically after about a week); callers should fall back to a full sync.
+        """
+        changes = HistoryChanges(history_id=start_history_id)
+        page_token = None
+
+        try:
+            while True:
+                with span("gmail_history"):
+                    resp = (
+                        self.service.users()
+                        .history()
+                        .list(
+                            userId="me",
+                            startHistoryId=start_history_id,
+                            historyTypes=["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"],
+                            pageToken=page_token,
+                        )
+                        .execute()
+                    )
+                for record in resp.get("history", []):
+                    _apply_history_record(changes, record)
+                changes.history_id = resp.get("historyId", changes.history_id)
+                page_token = resp.get("nextPageToken")
+                if not page_token:
+                    break
+        except HttpError as e:
+            if e.status_code == 404:
+                raise HistoryExpiredError(f"History ID {start_history_id} has expired") from e
+            logger.exception("Error listing Gmail history")
             raise
 
+        deleted = set(changes.deleted)
+        changes.added = [m for m in dict.fromkeys(changes.added) if m not in deleted]
+        changes.deleted = list(dict.fromkeys(changes.deleted))
+        for message_id in deleted:
+            changes.labels.pop(message_id, None)
+        logger.info(
+            f"History since {start_history_id}: {len(changes.added)} new, {len(changes.deleted)} deleted, "
+            f"{len(changes.labels)} relabelled messages (now at {changes.history_id})"
+        )
+        return changes
+
     # -----------------------
-    # Fallback Parser for FULL format
+    # Parser for FULL format
     # -----------------------
 
-    def _parse_full_message(self, msg_full: Dict[str, Any]) -> Dict[str, Any]:
-        logger.info("Parsing FULL-format message...")
+    def _parse_full_message(self, msg_full: Dict[str, Any]) -> EmailDocument:
+        """
+        Decode a FULL-format `messages.get` response into an EmailDocument.
+        Only text/plain and text/html parts are read; attachments are skipped,
+        and text parts over GMAIL_MAX_PART_BYTES are truncated (or skipped when
+        Gmail didn't inline them).
+        """
+        message_id = msg_full.get("id")
         payload = msg_full.get("payload", {})
-        parts = payload.get("parts", [])
         body_text, body_html = None, None
 
-        def decode_part(part):
-            data = part.get("body", {}).get("data")
-            if not data:
-                return None
-            return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
-
         def walk(p):
             nonlocal body_text, body_html
-            if "mimeType" not in p:
-                return
-            mime = p["mimeType"]
+            mime = p.get("mimeType", "")
+            if p.get("filename"):
+                return  # Attachment
             if mime == "text/plain" and not body_text:
-                body_text = decode_part(p)
+                body_text = self._decode_full_part(message_id, p)
             elif mime == "text/html" and not body_html:
-                body_html = decode_part(p)
+                body_html = self._decode_full_part(message_id, p)
             for sp in p.get("parts", []) or []:
                 walk(sp)
 
         walk(payload)
 
-        return {
-            "gmail_id": msg_full.get("id"),
-            "thread_id": msg_full.get("threadId"),
-            "snippet": msg_full.get("snippet"),
-            "headers": {h["name"]: h["value"] for h in payload.get("headers", [])},
-            "body_text": body_text,
-            "body_html": body_html,
-            "labelIds": msg_full.get("labelIds", []),
-            "internalDate": msg_full.get("internalDate"),
-        }
+        headers = {h["name"]: _decode_header_value(h["value"]) for h in payload.get("headers", [])}
+        return self._build_email_document(msg_full, headers, body_text, body_html)
+
+    def _decode_full_part(self, message_id: str, part: Dict[str, Any]) -> Optional[str]:
+        body = part.get("body", {})
+        data = body.get("data")
+        if not data and body.get("attachmentId"):
+            # Gmail sometimes leaves large text bodies out of the response
+            if body.get("size", 0) > settings.GMAIL_MAX_PART_BYTES:
+                logger.warning(f"Skipping {body.get('size')} byte {part.get('mimeType')} part of message {message_id}")
+                return None
+            data = (
+                self.service.users()
+                .messages()
+                .attachments()
+                .get(userId="me", messageId=message_id, id=body["attachmentId"])
+                .execute()
+                .get("data")
+            )
+        if not data:
+            return None
+
+        raw = base64.urlsafe_b64decode(data)[: settings.GMAIL_MAX_PART_BYTES]
+        content_type = Message()
+        for header in part.get("headers", []):
+            if header["name"].lower() == "content-type":
+                content_type["Content-Type"] = header["value"]
+        charset = content_type.get_content_charset() or "utf-8"
+        try:
+            return raw.decode(charset, errors="replace").strip()
+        except LookupError:
+            return raw.decode("utf-8", errors="replace").strip()
 
     # -----------------------
     # Sending Email
@@ -243,13 +635,7 @@ class GmailService:
     def fetch_recent(self, max_results: int = 10):
         logger.info(f"Fetching {max_results} recent emails...")
         messages = self.list_messages(max_results=max_results)
-        detailed = []
-
-        for m in messages:
-            try:
-                detailed.append(self.fetch_message_details(m["id"]))
-            except Exception:
-                logger.exception(f"Failed to fetch email {m['id']}")
+        detailed = self.fetch_messages_batch([m["id"] for m in messages])
 
         logger.success("Fetched and parsed recent emails")
         return detailed
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional
+from loguru import logger
+
+from app.models.domain import Highlights
+from app.services.rag_pipeline import RagPipeline
+
+HIGHLIGHTS_PATH = "storage/highlights.json"
+
+
+def load_highlights(path: str = HIGHLIGHTS_PATH) -> Optional[Highlights]:
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as f:
+        return Highlights.model_validate_json(f.read())
+
+
+def save_highlights(highlights: Highlights, path: str = HIGHLIGHTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write then rename, so readers never see a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(highlights.model_dump_json(indent=4))
+    os.replace(tmp_path, path)
+
+
+def _etag(summary: str, message_ids: List[str]) -> str:
+    digest = hashlib.sha256("\0".join([summary, *message_ids]).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+class HighlightsService:
+    """
+    Keeps the highlights summary precomputed.
+
+    `refresh()` runs after each sync: it repeats the (cheap) retrieval of
+    highlight candidates and only calls the LLM again when that set of
+    emails changed or one of them (or one the current summary cites) was
+    just re-synced, relabelled or removed. GET /highlights
+    serves the stored copy.
+    """
+
+    def __init__(self, pipeline: RagPipeline, path: str = HIGHLIGHTS_PATH):
+        self.pipeline = pipeline
+        self.path = path
+        self._lock = threading.Lock()
+        self._current: Optional[Highlights] = None
+        self._loaded = False
+
+    def current(self) -> Optional[Highlights]:
+        """The stored highlights, if any have been computed yet."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._current = load_highlights(self.path)
+                    self._loaded = True
+        return self._current
+
+    def refresh(self, changed_ids: Iterable[str] = (), force: bool = False) -> Highlights:
+        """
+        Recompute highlights if needed after `changed_ids` were (re)indexed,
+        relabelled or removed.
+        Concurrent callers wait for one refresh instead of each calling the LLM.
+        """
+        changed = set(changed_ids)
+        current = self.current()
+        with self._lock:
+            if self._current is not current:
+                # Someone else refreshed while we waited for the lock
+                return self._current
+
+            docs = self.pipeline.highlight_candidates()
+            message_ids = [d.metadata.get("gmail_id") for d in docs if d.metadata.get("gmail_id")]
+
+            if (
+                current is not None
+                and not force
+                and set(message_ids) == set(current.message_ids)
+                and not changed.intersection(message_ids)
+                and not changed.intersection(current.message_ids)
+            ):
+                logger.info("Highlights unchanged, skipping regeneration")
+                return current
+
+            logger.info(f"Regenerating highlights from {len(docs)} emails...")
+            summary = self.pipeline.summarize_highlights(docs)
+            highlights = Highlights(
+                summary=summary,
+                message_ids=message_ids,
+                etag=_etag(summary, message_ids),
+                generated_at=datetime.now(),
+            )
+            save_highlights(highlights, self.path)
+            self._current = highlights
+            return highlights
@@ -0,0 +1,242 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from app.services.query_filters import EMAIL_PATTERN, QueryFilters
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Too common in questions to say anything about which email is meant
+STOPWORDS = frozenset(
+    """
+    a about after all an and any are as at be been before but by can could did do does for from
+    get got had has have he her him his how i if in into is it its me my no not of on or our she
+    so than that the their them then there these they this to up us was we were what when where
+    which who why will with would you your email emails mail send sent say said tell told
+    """.split()
+)
+
+# Upper bound on query terms, so a pasted paragraph can't blow up the MATCH
+MAX_QUERY_TERMS = 32
+
+# Words found in more than this share of chunks barely move BM25 but force a
+# scan of most of the index, so they're dropped from searches
+COMMON_TERM_RATIO = 0.1
+
+
+def query_terms(text: str) -> List[str]:
+    """
+    Search terms in `text`: email addresses (kept whole, matched as a phrase)
+    followed by the remaining words, minus stopwords.
+    """
+    lowered = text.lower()
+    terms = [m.group(0) for m in EMAIL_PATTERN.finditer(lowered)]
+    remainder = EMAIL_PATTERN.sub(" ", lowered)
+    terms.extend(w for w in WORD_PATTERN.findall(remainder) if w not in STOPWORDS)
+    return list(dict.fromkeys(terms))[:MAX_QUERY_TERMS]
+
+
+def _match_expression(terms: List[str]) -> str:
+    # Quoting makes every term a literal phrase (no FTS5 operators from user input)
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _labels_column(labels: str) -> str:
+    """Comma-joined labels as stored in `chunks.labels`: ",INBOX,UNREAD," (matched as ",X,")."""
+    return "," + ",".join(l.strip() for l in labels.split(",") if l.strip()) + ","
+
+
+def _filter_clauses(filters: QueryFilters) -> Tuple[List[str], List[Any]]:
+    """SQL conditions on the `chunks` table (aliased `c`) equivalent to `filters`."""
+    clauses: List[str] = []
+    params: List[Any] = []
+    if filters.sender_email:
+        clauses.append("c.sender_email = ?")
+        params.append(filters.sender_email)
+    if filters.sender_domain:
+        clauses.append("c.sender_domain = ?")
+        params.append(filters.sender_domain)
+    for label in filters.labels:
+        # Not LIKE: "_" in user label IDs (Label_12) would be a wildcard
+        clauses.append("instr(c.labels, ',' || ? || ',') > 0")
+        params.append(label)
+    if filters.after:
+        clauses.append("c.timestamp >= ?")
+        params.append(int(filters.after.timestamp()))
+    if filters.before:
+        clauses.append("c.timestamp < ?")
+        params.append(int(filters.before.timestamp()))
+    return clauses, params
+
+
+class LexicalIndex:
+    """
+    BM25 keyword index over email chunks, stored in SQLite FTS5.
+
+    Kept alongside the vector store (same `gmail_id#n` chunk IDs) to catch
+    exact tokens - addresses, invoice numbers, names - that embeddings blur.
+    Each chunk also records sender, timestamp and labels so searches can be
+    restricted with the same filters as the vector search, and so a
+    selective filter can be resolved to its chunk IDs up front.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL UNIQUE,
+                gmail_id TEXT NOT NULL,
+                sender_email TEXT,
+                sender_domain TEXT,
+                timestamp INTEGER,
+                labels TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_gmail_id ON chunks(gmail_id);
+            CREATE INDEX IF NOT EXISTS idx_chunks_sender_email ON chunks(sender_email);
+            CREATE INDEX IF NOT EXISTS idx_chunks_timestamp ON chunks(timestamp);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(content, sender);
+            """
+        )
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def upsert(self, entries: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        """Index `(doc_id, text, metadata)` chunks, replacing earlier versions."""
+        entries = list(entries)
+        if not entries:
+            return
+        with self._lock:
+            self._count -= self._delete_locked([doc_id for doc_id, _, _ in entries])
+            for doc_id, text, meta in entries:
+                cursor = self._conn.execute(
+                    "INSERT INTO chunks (doc_id, gmail_id, sender_email, sender_domain, timestamp, labels) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        doc_id,
+                        meta.get("gmail_id") or doc_id,
+                        meta.get("sender_email"),
+                        meta.get("sender_domain"),
+                        meta.get("timestamp_epoch"),
+                        _labels_column(meta.get("labels") or ""),
+                    ),
+                )
+                self._conn.execute(
+                    "INSERT INTO chunks_fts (rowid, content, sender) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, text, meta.get("sender") or ""),
+                )
+            self._count += len(entries)
+            self._conn.commit()
+
+    def set_labels(self, entries: Iterable[Tuple[str, str]]):
+        """Replace the labels (comma-joined) of `(doc_id, labels)` chunks."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET labels = ? WHERE doc_id = ?",
+                [(_labels_column(labels), doc_id) for doc_id, labels in entries],
+            )
+            self._conn.commit()
+
+    def delete(self, doc_ids: Iterable[str]):
+        with self._lock:
+            self._count -= self._delete_locked(list(doc_ids))
+            self._conn.commit()
+
+    def _delete_locked(self, doc_ids: List[str]) -> int:
+        deleted = 0
+        for start in range(0, len(doc_ids), 500):
+            chunk = doc_ids[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rowids = [
+                (r[0],)
+                for r in self._conn.execute(f"SELECT rowid FROM chunks WHERE doc_id IN ({placeholders})", chunk)
+            ]
+            if rowids:
+                self._conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", rowids)
+                self._conn.executemany("DELETE FROM chunks WHERE rowid = ?", rowids)
+                deleted += len(rowids)
+        return deleted
+
+    def _selective_terms(self, terms: List[str]) -> List[str]:
+        """Drop single-word terms that occur in too many chunks (lock held)."""
+        limit = max(100, int(self._count * COMMON_TERM_RATIO))
+        selective = []
+        for term in terms:
+            if "@" not in term:
+                # Counting stops at `limit`, so probing a common word stays cheap
+                (matches,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM (SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ? LIMIT ?)",
+                    (_match_expression([term]), limit + 1),
+                ).fetchone()
+                if matches > limit:
+                    continue
+            selective.append(term)
+        # A query made only of common words still has to be answered
+        return selective or terms
+
+    def search(self, text: str, k: int = 20, filters: Optional[QueryFilters] = None) -> List[Tuple[str, float]]:
+        """
+        Top `k` chunks for `text` by BM25, as `(doc_id, score)` with higher
+        scores better. `filters` restrict the candidates like the vector search.
+        """
+        terms = query_terms(text)
+        if filters is not None and filters.sender_email:
+            # Already enforced by the filter; matching it again would favour every email from them
+            terms = [t for t in terms if t != filters.sender_email]
+        if not terms:
+            return []
+
+        clauses, params = _filter_clauses(filters) if filters is not None else ([], [])
+        clauses.insert(0, "chunks_fts MATCH ?")
+        sql = (
+            "SELECT c.doc_id, bm25(chunks_fts) AS score FROM chunks_fts "
+            "JOIN chunks c ON c.rowid = chunks_fts.rowid "
+            f"WHERE {' AND '.join(clauses)} ORDER BY score LIMIT ?"
+        )
+        with self._lock:
+            try:
+                match = _match_expression(self._selective_terms(terms))
+                rows = self._conn.execute(sql, [match, *params, k]).fetchall()
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Lexical search failed for {text!r}: {e}")
+                return []
+        # FTS5's bm25() is negated so that ascending order ranks best first
+        return [(doc_id, -score) for doc_id, score in rows]
+
+    def filter_ids(self, filters: QueryFilters, limit: int) -> Optional[List[str]]:
+        """
+        IDs of every chunk matching `filters`, or None when there are more
+        than `limit` of them (the filter is too broad to enumerate).
+        """
+        clauses, params = _filter_clauses(filters)
+        if not clauses:
+            return None
+        sql = f"SELECT c.doc_id FROM chunks c WHERE {' AND '.join(clauses)} LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, [*params, limit + 1]).fetchall()
+        if len(rows) > limit:
+            return None
+        return [r[0] for r in rows]
+
+    def count(self) -> int:
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def drop(self):
+        """Close and delete the index files."""
+        self.close()
+        for path in (self.path, f"{self.path}-wal", f"{self.path}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
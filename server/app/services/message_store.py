@@ -0,0 +1,232 @@
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.models.domain import EmailDocument
+from app.services.gmail_service import LabelChange
+
+try:
+    import zstandard
+except ImportError:  # Bodies are zlib-compressed instead
+    zstandard = None
+
+# Once this many messages are stored, a zstd dictionary is trained on them:
+# most emails are a few KB, too small to compress well on their own
+DICTIONARY_TRAINING_MESSAGES = 1_000
+DICTIONARY_SIZE = 64 * 1024
+
+
+def _labels_of(column: str) -> List[str]:
+    return [label for label in column.split(",") if label]
+
+
+class MessageStore:
+    """
+    Local copy of the parsed emails (SQLite), so the index can be rebuilt
+    - new chunking, cleaning or embedding model - without downloading the
+    mailbox from Gmail again (see reindex.py).
+
+    Each row is an EmailDocument keyed by gmail_id. The body (the document
+    as JSON, minus labels) is zstd-compressed, with a dictionary trained on
+    the first DICTIONARY_TRAINING_MESSAGES messages; without the
+    `zstandard` package, zlib is used. The codec is recorded per row, so
+    rows written either way stay readable. Labels have a column of their
+    own: relabelling never rewrites bodies.
+
+    A write never replaces a row with a newer history_id, so a late write
+    of an older fetch can't undo a newer one.
+    """
+
+    def __init__(self, path: str, level: int = settings.MESSAGE_STORE_ZSTD_LEVEL):
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                gmail_id TEXT PRIMARY KEY,
+                history_id INTEGER,
+                labels TEXT NOT NULL,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                body BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dictionaries (
+                id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+        # Codec -> decompress function, e.g. "zstd:1" (dictionary 1)
+        self._decompressors: Dict[str, Callable[[bytes], bytes]] = {}
+        self._codec = "zlib"
+        self._compress = lambda data: zlib.compress(data, 6)
+        if zstandard is not None:
+            row = self._conn.execute("SELECT id, data FROM dictionaries ORDER BY id DESC LIMIT 1").fetchone()
+            self._use_zstd(*(row or (None, None)))
+        self._training_due = zstandard is not None and self._codec == "zstd"
+
+    def _use_zstd(self, dictionary_id: Optional[int], data: Optional[bytes]):
+        if dictionary_id is None:
+            self._codec = "zstd"
+            compressor = zstandard.ZstdCompressor(level=self.level)
+        else:
+            self._codec = f"zstd:{dictionary_id}"
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=zstandard.ZstdCompressionDict(data))
+        self._compress = compressor.compress
+
+    def _decompressor(self, codec: str):
+        decompress = self._decompressors.get(codec)
+        if decompress is not None:
+            return decompress
+        if codec == "zlib":
+            decompress = zlib.decompress
+        elif zstandard is None:
+            raise RuntimeError(f"{self.path} holds zstd-compressed messages: install the `zstandard` package")
+        elif codec == "zstd":
+            decompress = zstandard.ZstdDecompressor().decompress
+        else:
+            dictionary_id = int(codec.split(":", 1)[1])
+            (data,) = self._conn.execute("SELECT data FROM dictionaries WHERE id = ?", (dictionary_id,)).fetchone()
+            decompress = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(data)).decompress
+        self._decompressors[codec] = decompress
+        return decompress
+
+    def _email(self, labels: str, codec: str, body: bytes) -> EmailDocument:
+        email = EmailDocument.model_validate_json(self._decompressor(codec)(body))
+        email.labels = _labels_of(labels)
+        return email
+
+    # -----------------------
+    # Writing
+    # -----------------------
+
+    def put_many(self, emails: Iterable[EmailDocument]):
+        """Store (or update) parsed emails."""
+        with self._lock:
+            rows = []
+            for email in emails:
+                body = email.model_dump_json(exclude={"labels"}).encode("utf-8")
+                rows.append((
+                    email.gmail_id,
+                    int(email.history_id) if email.history_id else None,
+                    ",".join(email.labels),
+                    self._codec,
+                    len(body),
+                    self._compress(body),
+                ))
+            if not rows:
+                return
+            self._conn.executemany(
+                """
+                INSERT INTO messages (gmail_id, history_id, labels, codec, size, body) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(gmail_id) DO UPDATE SET
+                    history_id = excluded.history_id, labels = excluded.labels,
+                    codec = excluded.codec, size = excluded.size, body = excluded.body
+                WHERE COALESCE(excluded.history_id, 0) >= COALESCE(messages.history_id, 0)
+                """,
+                rows,
+            )
+            self._conn.commit()
+            if self._training_due:
+                self._train_dictionary()
+
+    def _train_dictionary(self):
+        """Train a zstd dictionary on the stored messages, once there are enough (lock held)."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+        if count < DICTIONARY_TRAINING_MESSAGES:
+            return
+        self._training_due = False
+        rows = self._conn.execute(
+            "SELECT codec, body FROM messages ORDER BY rowid LIMIT ?", (DICTIONARY_TRAINING_MESSAGES,)
+        ).fetchall()
+        try:
+            samples = [self._decompressor(codec)(body) for codec, body in rows]
+            dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, samples, level=self.level)
+        except zstandard.ZstdError as e:
+            logger.warning(f"Could not train a compression dictionary for {self.path}: {e}")
+            return
+        cursor = self._conn.execute("INSERT INTO dictionaries (data) VALUES (?)", (dictionary.as_bytes(),))
+        self._conn.commit()
+        self._use_zstd(cursor.lastrowid, dictionary.as_bytes())
+        logger.info(f"Trained a {len(dictionary.as_bytes()) // 1024} KB compression dictionary for {self.path}")
+
+    def set_labels(self, changes: Dict[str, LabelChange]):
+        """Apply label changes to the stored messages (others are ignored)."""
+        ids = list(changes)
+        with self._lock:
+            updates: List[Tuple[str, str]] = []
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for gmail_id, labels in self._conn.execute(
+                    f"SELECT gmail_id, labels FROM messages WHERE gmail_id IN ({placeholders})", chunk
+                ):
+                    new_labels = changes[gmail_id].apply(set(_labels_of(labels)))
+                    updates.append((",".join(sorted(new_labels)), gmail_id))
+            self._conn.executemany("UPDATE messages SET labels = ? WHERE gmail_id = ?", updates)
+            self._conn.commit()
+
+    def delete(self, gmail_ids: Iterable[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM messages WHERE gmail_id = ?", [(i,) for i in gmail_ids])
+            self._conn.commit()
+
+    # -----------------------
+    # Reading
+    # -----------------------
+
+    def get_many(self, gmail_ids: Iterable[str]) -> List[EmailDocument]:
+        """The stored ones of these messages."""
+        ids = list(dict.fromkeys(gmail_ids))
+        emails: List[EmailDocument] = []
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT labels, codec, body FROM messages WHERE gmail_id IN ({placeholders})", chunk
+                ).fetchall()
+                emails.extend(self._email(*row) for row in rows)
+        return emails
+
+    def iter_emails(self, batch_size: int = 500) -> Iterator[List[EmailDocument]]:
+        """Every stored message, in batches (in storage order)."""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, labels, codec, body FROM messages WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size),
+                ).fetchall()
+                batch = [self._email(*row[1:]) for row in rows]
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            yield batch
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        """Message count, and their size before and after compression (bytes)."""
+        with self._lock:
+            count, size, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(body)), 0) FROM messages"
+            ).fetchone()
+        return {"messages": count, "bytes": size, "stored_bytes": stored}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
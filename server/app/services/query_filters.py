@@ -0,0 +1,227 @@
+import functools
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+# Gmail-style operators: from:alice@acme.com label:work is:unread after:2025/01/31
+OPERATOR_PATTERN = re.compile(
+    r"\b(from|label|is|in|after|before|newer_than|older_than):(\"[^\"]+\"|\S+)", re.IGNORECASE
+)
+RELATIVE_PATTERN = re.compile(r"^(\d+)([dwmy])$")
+LAST_N_DAYS_PATTERN = re.compile(r"\b(?:last|past) (\d+) (day|week|month)s?\b", re.IGNORECASE)
+
+# An address right after one of these words names a recipient, not a sender
+RECIPIENT_WORDS = ("to", "cc", "bcc")
+
+# Words in a plain question that unambiguously mean a Gmail system label
+LABEL_WORDS = {
+    "unread": "UNREAD",
+    "starred": "STARRED",
+}
+
+RELATIVE_UNITS = {"d": 1, "w": 7, "m": 30, "y": 365}
+
+# Gmail's own label IDs (plus CATEGORY_*), which are their names uppercased.
+# Labels the user created have opaque IDs (Label_123) looked up by name.
+SYSTEM_LABELS = {"INBOX", "STARRED", "UNREAD", "IMPORTANT", "SENT", "DRAFT", "SPAM", "TRASH", "CHAT"}
+
+
+def label_key(label: str) -> str:
+    """Metadata key of the boolean flag marking a message as carrying `label`."""
+    return "label_" + re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_").upper()
+
+
+def label_name_key(name: str) -> str:
+    """
+    Normalized label name: "label:my-project" names the label "My Project"
+    (or "My/Project"), as in Gmail's search box.
+    """
+    return re.sub(r"[\s/-]+", "-", name.strip().lower())
+
+
+# Returns the mailbox's labels, label_name_key(name) -> label ID (None if unavailable)
+LabelLookup = Callable[[], Optional[Mapping[str, str]]]
+
+
+def _label_id(value: str, label_ids: Optional[LabelLookup]) -> str:
+    """The label ID a `label:` / `is:` / `in:` value refers to."""
+    upper = value.upper()
+    if upper in SYSTEM_LABELS or upper.startswith("CATEGORY_"):
+        return upper
+    names = label_ids() if label_ids is not None else None
+    if names:
+        label_id = names.get(label_name_key(value))
+        if label_id is not None:
+            return label_id
+    # Unknown name, or already a label ID
+    return value
+
+
+@dataclass
+class QueryFilters:
+    """
+    Constraints parsed out of a chat query.
+    `text` is what is left for semantic / lexical matching.
+    """
+    text: str
+    sender_email: Optional[str] = None
+    sender_domain: Optional[str] = None
+    labels: List[str] = field(default_factory=list)
+    after: Optional[datetime] = None
+    before: Optional[datetime] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.sender_email or self.sender_domain or self.labels or self.after or self.before)
+
+    def cache_key(self) -> Tuple:
+        """
+        Normalized constraints, for keying cached answers. Dates are kept to
+        the day, so relative ones ("last week") stay stable between calls.
+        """
+        return (
+            self.sender_email,
+            self.sender_domain,
+            tuple(sorted({label_key(label) for label in self.labels})),
+            self.after.date().isoformat() if self.after else None,
+            self.before.date().isoformat() if self.before else None,
+        )
+
+    def to_chroma_where(self) -> Optional[Dict[str, Any]]:
+        """Chroma metadata filter equivalent to these constraints."""
+        conditions: List[Dict[str, Any]] = []
+        if self.sender_email:
+            conditions.append({"sender_email": self.sender_email})
+        if self.sender_domain:
+            conditions.append({"sender_domain": self.sender_domain})
+        for label in self.labels:
+            conditions.append({label_key(label): True})
+        if self.after:
+            conditions.append({"timestamp_epoch": {"$gte": int(self.after.timestamp())}})
+        if self.before:
+            conditions.append({"timestamp_epoch": {"$lt": int(self.before.timestamp())}})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    for fmt in ("%Y/%m/%d", "%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_relative(value: str, now: datetime) -> Optional[datetime]:
+    match = RELATIVE_PATTERN.match(value.lower())
+    if not match:
+        return None
+    return now - timedelta(days=int(match.group(1)) * RELATIVE_UNITS[match.group(2)])
+
+
+def _apply_operator(
+    filters: QueryFilters, name: str, value: str, now: datetime, label_ids: Optional[LabelLookup] = None
+) -> bool:
+    """Apply one `name:value` operator; False if it wasn't understood."""
+    value = value.strip('"')
+    if name == "from":
+        value = value.lower()
+        if "@" in value and not value.startswith("@"):
+            filters.sender_email = value
+        elif "." in value:
+            filters.sender_domain = value.lstrip("@")
+        else:
+            return False
+    elif name in ("label", "is", "in"):
+        # is: / in: only name system labels
+        label = _label_id(value, label_ids if name == "label" else None)
+        if label not in filters.labels:
+            filters.labels.append(label)
+    elif name in ("after", "before"):
+        when = _parse_date(value)
+        if when is None:
+            return False
+        setattr(filters, name, when)
+    elif name == "newer_than":
+        filters.after = _parse_relative(value, now)
+        return filters.after is not None
+    elif name == "older_than":
+        filters.before = _parse_relative(value, now)
+        return filters.before is not None
+    return True
+
+
+def _apply_time_phrases(filters: QueryFilters, text: str, now: datetime):
+    lowered = text.lower()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    match = LAST_N_DAYS_PATTERN.search(lowered)
+    if match:
+        days = int(match.group(1)) * {"day": 1, "week": 7, "month": 30}[match.group(2)]
+        filters.after = now - timedelta(days=days)
+    elif "yesterday" in lowered:
+        filters.after, filters.before = midnight - timedelta(days=1), midnight
+    elif "today" in lowered:
+        filters.after = midnight
+    elif "this week" in lowered:
+        filters.after = midnight - timedelta(days=midnight.weekday())
+    elif "last week" in lowered or "past week" in lowered:
+        filters.after = now - timedelta(days=7)
+    elif "this month" in lowered:
+        filters.after = midnight.replace(day=1)
+    elif "last month" in lowered or "past month" in lowered:
+        filters.after = now - timedelta(days=30)
+
+
+def parse_query(
+    query: str, now: Optional[datetime] = None, label_ids: Optional[LabelLookup] = None
+) -> QueryFilters:
+    """
+    Extract sender, label and date constraints from a chat query.
+
+    Understands Gmail-style operators (`from:`, `label:`, `is:`, `after:`,
+    `newer_than:` ...), which are removed from the search text, and plain
+    phrasing ("what did alice@acme.com send", "unread", "last week"),
+    which is left in place since it still carries meaning for the search.
+    Names of the user's own labels are resolved through `label_ids()`
+    (see GmailService.label_ids), only called - once - if the query has a
+    `label:` operator that isn't a system label.
+    """
+    now = now or datetime.now()
+    filters = QueryFilters(text=query)
+    if label_ids is not None:
+        # Looked up once, however many label: operators there are
+        label_ids = functools.lru_cache(maxsize=None)(label_ids)
+
+    def operator(match: re.Match) -> str:
+        understood = _apply_operator(filters, match.group(1).lower(), match.group(2), now, label_ids)
+        return "" if understood else match.group(0)
+
+    text = OPERATOR_PATTERN.sub(operator, query)
+    filters.text = re.sub(r"\s+", " ", text).strip()
+
+    if filters.sender_email is None and filters.sender_domain is None:
+        for match in EMAIL_PATTERN.finditer(filters.text):
+            preceding = filters.text[: match.start()].split()
+            if preceding and preceding[-1].lower().rstrip(":") in RECIPIENT_WORDS:
+                continue
+            filters.sender_email = match.group(0).lower()
+            break
+
+    words = set(re.findall(r"[a-z]+", filters.text.lower()))
+    for word, label in LABEL_WORDS.items():
+        if word in words and label not in filters.labels:
+            filters.labels.append(label)
+
+    if filters.after is None and filters.before is None:
+        _apply_time_phrases(filters, filters.text, now)
+
+    return filters
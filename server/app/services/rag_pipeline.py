@@ -1,93 +1,349 @@
 from loguru import logger
+import asyncio
 import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import PromptTemplate
+from app.core.concurrency import run_blocking
+from app.core.metrics import PROMPT_TOKENS, span
+from app.services.answer_cache import CachedAnswer, SemanticAnswerCache, answer_cache
 from app.services.chroma_store import ChromaStore
+from app.services.context_builder import ContextBuilder, PackedContext, estimate_tokens
+from app.services.query_filters import QueryFilters
+from app.services.rate_limiter import AdaptiveRateLimiter, llm_limiter
 
 from app.core.config import settings
 
+NO_EMAILS_ANSWER = "I couldn't find any relevant emails to answer your question."
+NO_HIGHLIGHTS_ANSWER = "No particularly important emails found recently."
+
+# For now, we'll query for generic "important" keywords
+# In a real system, this might be more sophisticated (e.g. recent unread, specific senders)
+HIGHLIGHTS_QUERY = "urgent important deadline meeting action required"
+
+ANSWER_PROMPT = PromptTemplate(
+    input_variables=["context", "question"],
+    template="""You are an intelligent email assistant. Use the following retrieved emails to answer the user's question accurately.
+If the answer is not in the emails, say "I don't have enough information in your emails to answer that."
+
+Retrieved Emails:
+{context}
+
+User Question: {question}
+
+Answer:"""
+)
+
+HIGHLIGHTS_PROMPT = PromptTemplate(
+    input_variables=["context"],
+    template="""Analyze the following list of emails and identify the top 3-5 most important ones that require attention.
+Summarize why each is important.
+
+Emails:
+{context}
+
+Important Emails Summary:"""
+)
+
+
+def _source_info(doc: Document) -> Dict[str, Any]:
+    """Email reference sent to clients alongside a streamed answer."""
+    meta = doc.metadata
+    return {
+        "gmail_id": meta.get("gmail_id"),
+        "thread_id": meta.get("thread_id"),
+        "sender": meta.get("sender"),
+        "subject": meta.get("subject"),
+        "timestamp": meta.get("timestamp"),
+    }
+
+
+def _cache_entry(query: str, answer: str, docs: List[Document]) -> CachedAnswer:
+    return CachedAnswer(
+        query=query,
+        answer=answer,
+        source_ids=[d.metadata.get("gmail_id") for d in docs if d.metadata.get("gmail_id")],
+        sources=[_source_info(d) for d in docs],
+    )
+
+
+def _record_reported_tokens(message):
+    """Record the prompt size the LLM itself reports, when it does (usage metadata)."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        PROMPT_TOKENS.observe(usage["input_tokens"], source="reported")
+
+
 class RagPipeline:
-    def __init__(self):
-        self.chroma = ChromaStore()
+    def __init__(
+        self,
+        chroma: Optional[ChromaStore] = None,
+        llm: Optional[BaseChatModel] = None,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        cache: Optional[SemanticAnswerCache] = None,
+        context_builder: Optional[ContextBuilder] = None,
+    ):
+        self.chroma = chroma or ChromaStore()
         # Using Gemini 1.5 Flash as requested (mapped to valid model name)
-        self.llm = ChatGoogleGenerativeAI(
+        self.llm = llm or ChatGoogleGenerativeAI(
             model="gemini-2.5-flash",
             google_api_key=settings.GEMINI_API_KEY,
             temperature=0.3
         )
-    
+        self.limiter = limiter or llm_limiter
+        self.answer_cache = cache or answer_cache
+        self.context_builder = context_builder or ContextBuilder()
+
     def answer_query(self, query: str) -> str:
         """
         Retrieves relevant emails and answers the user's query.
         """
         logger.info(f"Processing RAG query: {query}")
         
-        # 1. Retrieve relevant documents
-        docs = self.chroma.query_similar_emails(query, n_results=5)
+        query_embedding = self.chroma.embed_query(query)
+        filters = self.chroma.parse_query(query)
+        cached = self.answer_cache.lookup(query_embedding, filters.cache_key())
+        if cached is not None:
+            return cached.answer
+
+        # 1. Retrieve relevant documents and pack them into the token budget
+        packed = self.build_answer_context(query, query_embedding, filters)
         
-        if not docs:
-            return "I couldn't find any relevant emails to answer your question."
-            
-        # 2. Construct context
-        context_parts = []
-        for i, doc in enumerate(docs, 1):
-            meta = doc.metadata
-            content = doc.page_content
-            source_info = f"Email {i} from {meta.get('sender')} (Subject: {meta.get('subject')}):"
-            context_parts.append(f"{source_info}\n{content}\n---")
-            
-        context = "\n".join(context_parts)
+        if not packed.docs:
+            return NO_EMAILS_ANSWER
         
-        # 3. Generate answer
-        prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template="""You are an intelligent email assistant. Use the following retrieved emails to answer the user's question accurately.
-If the answer is not in the emails, say "I don't have enough information in your emails to answer that."
+        # 2. Generate answer
+        chain = ANSWER_PROMPT | self.llm
+        with span("llm_generate"):
+            response = self.limiter.call(lambda: chain.invoke({"context": packed.text, "question": query}))
+        _record_reported_tokens(response)
+        self.answer_cache.store(
+            query_embedding, _cache_entry(query, response.content, packed.docs), filters.cache_key()
+        )
+        
+        return response.content
 
-Retrieved Emails:
-{context}
+    async def aanswer_query(self, query: str) -> str:
+        """
+        Async variant of answer_query: retrieval runs on the bounded I/O
+        executor and generation uses the LLM's native async API.
+        Answers are served from the semantic answer cache when a similar
+        question was answered recently.
+        """
+        logger.info(f"Processing RAG query: {query}")
 
-User Question: {question}
+        query_embedding = await run_blocking(self.chroma.embed_query, query)
+        filters = await run_blocking(self.chroma.parse_query, query)
 
-Answer:"""
+        async def compute() -> CachedAnswer:
+            packed = await run_blocking(self.build_answer_context, query, query_embedding, filters)
+            return await self._agenerate(query, packed)
+
+        entry = await self.answer_cache.get_or_compute(query_embedding, compute, filters.cache_key())
+        return entry.answer
+
+    async def abatch_answer(
+        self, queries: List[str], max_concurrency: int = settings.CHAT_BATCH_CONCURRENCY
+    ) -> AsyncIterator[Tuple[int, Union[CachedAnswer, Exception]]]:
+        """
+        Answer several questions together, yielding (index, answer) as each
+        one is ready, or (index, exception) for a question that failed.
+
+        - All questions are embedded in one call.
+        - Those without a cached answer are retrieved concurrently, and the
+          vectors of the emails they retrieved are fetched once for all.
+        - Generations run concurrently, at most `max_concurrency` at a time
+          (and paced by the LLM rate limiter); near-identical questions,
+          within the batch or in flight elsewhere, share one generation.
+        """
+        logger.info(f"Processing batch of {len(queries)} RAG queries")
+        embeddings = await run_blocking(self.chroma.embed_queries, queries)
+        filters = await run_blocking(lambda: [self.chroma.parse_query(query) for query in queries])
+
+        pending = []
+        for index, embedding in enumerate(embeddings):
+            cached = self.answer_cache.lookup(embedding, filters[index].cache_key())
+            if cached is not None:
+                yield index, cached
+            else:
+                pending.append(index)
+        if not pending:
+            return
+
+        retrieved = await asyncio.gather(
+            *(
+                self.chroma.aquery_similar_emails(queries[i], settings.CONTEXT_CANDIDATES, embeddings[i], filters[i])
+                for i in pending
+            ),
+            return_exceptions=True,
         )
-        
-        chain = prompt | self.llm
-        response = chain.invoke({"context": context, "question": query})
-        
-        return response.content
+        docs_by_index: Dict[int, List[Document]] = {}
+        for index, result in zip(pending, retrieved):
+            if isinstance(result, Exception):
+                yield index, result
+            else:
+                docs_by_index[index] = result
+
+        # Questions often retrieve the same emails: fetch each one's vector once
+        distinct = {d.metadata.get("gmail_id"): d for docs in docs_by_index.values() for d in docs}
+        vectors = await run_blocking(self.chroma.message_vectors, list(distinct.values())) if distinct else {}
+        logger.info(
+            f"Batch retrieval: {sum(len(d) for d in docs_by_index.values())} hits, {len(distinct)} distinct emails"
+        )
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer(index: int) -> Tuple[int, Union[CachedAnswer, Exception]]:
+            query, embedding = queries[index], embeddings[index]
+
+            async def compute() -> CachedAnswer:
+                packed = await run_blocking(self._pack_context, query, embedding, docs_by_index[index], vectors)
+                async with semaphore:
+                    return await self._agenerate(query, packed)
+
+            try:
+                return index, await self.answer_cache.get_or_compute(embedding, compute, filters[index].cache_key())
+            except Exception as e:
+                logger.exception(f"Batch question {index} failed")
+                return index, e
+
+        tasks = [asyncio.ensure_future(answer(index)) for index in docs_by_index]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The client went away: don't keep generating answers nobody reads
+            for task in tasks:
+                task.cancel()
+
+    async def _agenerate(self, query: str, packed: PackedContext) -> CachedAnswer:
+        if not packed.docs:
+            return CachedAnswer(query=query, answer=NO_EMAILS_ANSWER, source_ids=[])
+
+        chain = ANSWER_PROMPT | self.llm
+        with span("llm_generate"):
+            response = await self.limiter.acall(lambda: chain.ainvoke({"context": packed.text, "question": query}))
+        _record_reported_tokens(response)
+        return _cache_entry(query, response.content, packed.docs)
+
+    async def astream_answer(self, query: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of aanswer_query.
+        Yields ("sources", [...]) as soon as retrieval finishes, then
+        ("token", text) for each chunk the LLM generates, and finally
+        ("usage", {...}) with the prompt size when an answer was generated.
+        A cached answer is replayed as a single token.
+        """
+        logger.info(f"Processing streaming RAG query: {query}")
+
+        query_embedding = await run_blocking(self.chroma.embed_query, query)
+        filters = await run_blocking(self.chroma.parse_query, query)
+        cached = self.answer_cache.lookup(query_embedding, filters.cache_key())
+        if cached is not None:
+            yield "sources", cached.sources
+            yield "token", cached.answer
+            return
+
+        packed = await run_blocking(self.build_answer_context, query, query_embedding, filters)
+        yield "sources", [_source_info(doc) for doc in packed.docs]
+
+        if not packed.docs:
+            yield "token", NO_EMAILS_ANSWER
+            return
+
+        chain = ANSWER_PROMPT | self.llm
+
+        parts = []
+        with span("llm_generate"):
+            async for chunk in self.limiter.astream(lambda: chain.astream({"context": packed.text, "question": query})):
+                _record_reported_tokens(chunk)
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield "token", chunk.text
+        self.answer_cache.store(query_embedding, _cache_entry(query, "".join(parts), packed.docs), filters.cache_key())
+        yield "usage", packed.stats()
+
+    def build_answer_context(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[QueryFilters] = None,
+    ) -> PackedContext:
+        """
+        Retrieve CONTEXT_CANDIDATES emails and pack the best of them into
+        the prompt's token budget (see ContextBuilder). Blocking.
+        `filters` default to those parsed from the query.
+        """
+        docs = self.chroma.query_similar_emails(
+            query, n_results=settings.CONTEXT_CANDIDATES, query_embedding=query_embedding, filters=filters
+        )
+        vectors = self.chroma.message_vectors(docs) if docs else {}
+        return self._pack_context(query, query_embedding, docs, vectors)
+
+    def _pack_context(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]],
+        docs: List[Document],
+        vectors: Dict[str, List[float]],
+    ) -> PackedContext:
+        with span("context_build"):
+            packed = self.context_builder.build(query, docs, query_embedding, vectors)
+
+        packed.prompt_tokens = estimate_tokens(ANSWER_PROMPT.format(context=packed.text, question=query))
+        if packed.docs:
+            PROMPT_TOKENS.observe(packed.prompt_tokens, source="estimated")
+        logger.info(
+            f"Answer prompt: ~{packed.prompt_tokens} tokens, {len(packed.docs)}/{packed.candidates} emails "
+            f"({len(packed.duplicates)} redundant dropped, {packed.excerpted} excerpted)"
+        )
+        return packed
 
     def get_important_emails(self) -> str:
         """
         Identifies important emails from recent history.
         """
-        # For now, we'll query for generic "important" keywords
-        # In a real system, this might be more sophisticated (e.g. recent unread, specific senders)
-        query = "urgent important deadline meeting action required"
-        docs = self.chroma.query_similar_emails(query, n_results=10)
-        
+        return self.summarize_highlights(self.highlight_candidates())
+
+    def highlight_candidates(self) -> List[Document]:
+        """The emails a highlights summary is built from (retrieval only, no LLM call)."""
+        return self.chroma.query_similar_emails(HIGHLIGHTS_QUERY, n_results=10)
+
+    def summarize_highlights(self, docs: List[Document]) -> str:
         if not docs:
-            return "No particularly important emails found recently."
-            
+            return NO_HIGHLIGHTS_ANSWER
+
+        context = self._build_highlights_context(docs)
+
+        chain = HIGHLIGHTS_PROMPT | self.llm
+        with span("llm_generate"):
+            response = self.limiter.call(lambda: chain.invoke({"context": context}))
+
+        return response.content
+
+    async def aget_important_emails(self) -> str:
+        """
+        Async variant of get_important_emails.
+        """
+        docs = await self.chroma.aquery_similar_emails(HIGHLIGHTS_QUERY, n_results=10)
+
+        if not docs:
+            return NO_HIGHLIGHTS_ANSWER
+
+        context = self._build_highlights_context(docs)
+
+        chain = HIGHLIGHTS_PROMPT | self.llm
+        with span("llm_generate"):
+            response = await self.limiter.acall(lambda: chain.ainvoke({"context": context}))
+
+        return response.content
+
+    def _build_highlights_context(self, docs: List[Document]) -> str:
         context_parts = []
         for doc in docs:
             meta = doc.metadata
             context_parts.append(f"- From: {meta.get('sender')}, Subject: {meta.get('subject')}, Date: {meta.get('timestamp')}")
             
-        context = "\n".join(context_parts)
-        
-        prompt = PromptTemplate(
-            input_variables=["context"],
-            template="""Analyze the following list of emails and identify the top 3-5 most important ones that require attention.
-Summarize why each is important.
-
-Emails:
-{context}
-
-Important Emails Summary:"""
-        )
-        
-        chain = prompt | self.llm
-        response = chain.invoke({"context": context})
-        
-        return response.content
+        return "\n".join(context_parts)
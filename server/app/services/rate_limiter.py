@@ -0,0 +1,313 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+from loguru import logger
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+from app.core.config import settings
+from app.core.metrics import RATE_LIMITED, RATE_LIMIT_FAILURES
+
+T = TypeVar("T")
+
+# google-api-core exception types for 429 / quota errors
+RATE_LIMIT_EXCEPTIONS = {"ResourceExhausted", "TooManyRequests"}
+RESOURCE_EXHAUSTED = "RESOURCE_EXHAUSTED"
+
+RETRY_DELAY_PATTERN = re.compile(r"retry(?:[ _-]?delay|[ _-]?after| in)[\"':\s]*(?:seconds:\s*)?([\d.]+)\s*s?", re.IGNORECASE)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """
+    True if `exc` (or anything in its cause chain) is a quota / 429 error.
+    Covers google-api-core (ResourceExhausted / TooManyRequests), google-genai
+    (code 429, status RESOURCE_EXHAUSTED) and googleapiclient (resp.status)
+    error shapes. Of LangChain wrappers that only keep the message, only
+    those naming the RESOURCE_EXHAUSTED status count: a bare "429" in a
+    message may as well be an ID or a byte count.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if type(exc).__name__ in RATE_LIMIT_EXCEPTIONS:
+            return True
+        for attr in ("code", "status_code", "status"):
+            value = getattr(exc, attr, None)
+            if value is not None and (_as_int(value) == 429 or _status_name(value) == RESOURCE_EXHAUSTED):
+                return True
+        resp = getattr(exc, "resp", None) or getattr(exc, "response", None)
+        if resp is not None and _as_int(getattr(resp, "status", None) or getattr(resp, "status_code", None)) == 429:
+            return True
+        if RESOURCE_EXHAUSTED in str(exc):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def _status_name(value: Any) -> Optional[str]:
+    """Name of a status given as a string or as a gRPC StatusCode enum."""
+    return value if isinstance(value, str) else getattr(value, "name", None)
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Extract a server-provided retry delay (Retry-After header or retryDelay detail)."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after is not None:
+            return float(retry_after)
+        resp = getattr(exc, "resp", None) or getattr(exc, "response", None)
+        headers = getattr(resp, "headers", None) or (resp if isinstance(resp, dict) else None)
+        if headers:
+            value = headers.get("Retry-After") or headers.get("retry-after")
+            if value and str(value).replace(".", "", 1).isdigit():
+                return float(value)
+        match = RETRY_DELAY_PATTERN.search(str(exc))
+        if match:
+            return float(match.group(1))
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket + AIMD batch sizing for calls against a quota'd API.
+
+    - `acquire(cost)` blocks until `cost` tokens are available; the bucket
+      refills at `requests_per_minute / 60` tokens per second.
+    - `batch_size` grows additively after each success and is cut
+      multiplicatively on a 429, so batches track the quota actually available.
+    - `call(fn, cost)` runs `fn` under the limiter, retrying 429s with
+      jittered exponential backoff, or the server's Retry-After when given.
+
+    `clock` and `sleep` are injectable so the limiter can be tuned offline
+    against a simulated backend.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        burst: Optional[float] = None,
+        min_batch: int = 1,
+        max_batch: int = 1,
+        initial_batch: Optional[int] = None,
+        increase: int = 1,
+        decrease: float = 0.5,
+        max_retries: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.name = name
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, burst if burst is not None else requests_per_minute / 4)
+        self.min_batch = max(1, min_batch)
+        self.max_batch = max(self.min_batch, min(max_batch, int(self.capacity)))
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._batch = float(initial_batch or self.min_batch)
+        self.stats: Dict[str, int] = {"calls": 0, "throttled": 0, "failures": 0}
+
+    @property
+    def batch_size(self) -> int:
+        return max(self.min_batch, min(self.max_batch, int(self._batch)))
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_acquire(self, cost: float) -> float:
+        """Take `cost` tokens if available; otherwise return how long to wait."""
+        cost = min(cost, self.capacity)
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            wait = max(0.0, self._blocked_until - now)
+            if wait == 0.0:
+                # Tolerance absorbs float drift from the refill arithmetic
+                if self._tokens + 1e-9 >= cost:
+                    self._tokens = max(0.0, self._tokens - cost)
+                    return 0.0
+                wait = (cost - self._tokens) / self.rate
+            return wait
+
+    def acquire(self, cost: float = 1.0):
+        """Block until `cost` tokens are available, then take them."""
+        while (wait := self._try_acquire(cost)) > 0:
+            self._sleep(wait)
+
+    async def aacquire(self, cost: float = 1.0):
+        """Async variant of acquire: waits without blocking the event loop."""
+        while (wait := self._try_acquire(cost)) > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.stats["calls"] += 1
+            self._batch = min(self.max_batch, self._batch + self.increase)
+
+    def on_rate_limited(self, retry_after: Optional[float], attempt: int) -> float:
+        """Shrink the batch, drain the bucket and return how long to back off."""
+        RATE_LIMITED.inc(limiter=self.name)
+        with self._lock:
+            self.stats["throttled"] += 1
+            self._batch = max(self.min_batch, self._batch * self.decrease)
+            if retry_after is not None:
+                wait = retry_after + random.uniform(0, min(1.0, retry_after * 0.1 + 0.1))
+            else:
+                wait = random.uniform(0.5, 1.0) * min(self.max_backoff, self.base_backoff * 2 ** attempt)
+            now = self._clock()
+            self._tokens = 0.0
+            self._updated = now
+            self._blocked_until = max(self._blocked_until, now + wait)
+        return wait
+
+    def call(self, fn: Callable[[], T], cost: float = 1.0) -> T:
+        for attempt in range(self.max_retries + 1):
+            self.acquire(cost)
+            try:
+                result = fn()
+            except Exception as e:
+                self._sleep(self._handle_error(e, attempt))
+                continue
+            self.on_success()
+            return result
+        raise RuntimeError("unreachable")
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], cost: float = 1.0) -> T:
+        """Async variant of call: `fn` returns an awaitable (e.g. `lambda: chain.ainvoke(...)`)."""
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(cost)
+            try:
+                result = await fn()
+            except Exception as e:
+                await asyncio.sleep(self._handle_error(e, attempt))
+                continue
+            self.on_success()
+            return result
+        raise RuntimeError("unreachable")
+
+    async def astream(self, fn: Callable[[], AsyncIterator[T]], cost: float = 1.0) -> AsyncIterator[T]:
+        """
+        Streaming variant of acall: `fn` returns an async iterator (e.g.
+        `lambda: chain.astream(...)`). A 429 before the first item is
+        retried like in acall; after it, a retry would repeat what was
+        already yielded, so the error is raised (still backing the limiter off).
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(cost)
+            started = False
+            try:
+                async for item in fn():
+                    started = True
+                    yield item
+            except Exception as e:
+                if started:
+                    if is_rate_limit_error(e):
+                        self.on_rate_limited(retry_after_seconds(e), attempt)
+                    self._record_failure()
+                    raise
+                await asyncio.sleep(self._handle_error(e, attempt))
+                continue
+            self.on_success()
+            return
+
+    def _record_failure(self):
+        RATE_LIMIT_FAILURES.inc(limiter=self.name)
+        with self._lock:
+            self.stats["failures"] += 1
+
+    def _handle_error(self, e: Exception, attempt: int) -> float:
+        """Re-raise non-retryable errors; otherwise return the backoff before retrying."""
+        if not is_rate_limit_error(e) or attempt == self.max_retries:
+            self._record_failure()
+            raise e
+        wait = self.on_rate_limited(retry_after_seconds(e), attempt)
+        logger.warning(
+            f"[{self.name}] Rate limit hit, retrying in {wait:.1f}s "
+            f"(batch size now {self.batch_size}, attempt {attempt + 1}/{self.max_retries})"
+        )
+        return wait
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embed several search queries in one request where the model supports it:
+    an `embed_queries` method, or Gemini's batch endpoint with the query task
+    type. Other models get one `embed_query` call per text.
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if isinstance(embeddings, GoogleGenerativeAIEmbeddings):
+        return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Sends embedding requests through an AdaptiveRateLimiter, splitting the
+    input into batches sized by the limiter's current AIMD batch size.
+    """
+
+    def __init__(self, embeddings: Embeddings, limiter: AdaptiveRateLimiter):
+        self.embeddings = embeddings
+        self.limiter = limiter
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        i = 0
+        while i < len(texts):
+            batch = texts[i : i + self.limiter.batch_size]
+            vectors.extend(self.limiter.call(lambda: self.embeddings.embed_documents(batch), cost=len(batch)))
+            i += len(batch)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.limiter.call(lambda: self.embeddings.embed_query(text))
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several search queries, batched like embed_documents when the model allows it."""
+        vectors: List[List[float]] = []
+        i = 0
+        while i < len(texts):
+            batch = texts[i : i + self.limiter.batch_size]
+            vectors.extend(self.limiter.call(lambda: embed_queries(self.embeddings, batch), cost=len(batch)))
+            i += len(batch)
+        return vectors
+
+
+# Shared, process-wide limiters: every embedding / LLM call goes through these.
+embedding_limiter = AdaptiveRateLimiter(
+    "embedding",
+    requests_per_minute=settings.EMBEDDING_REQUESTS_PER_MINUTE,
+    max_batch=settings.EMBEDDING_MAX_BATCH_SIZE,
+    initial_batch=4,
+    increase=2,
+)
+
+llm_limiter = AdaptiveRateLimiter(
+    "llm",
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+)
@@ -0,0 +1,87 @@
+"""
+Rebuild a collection from the local MessageStore: no Gmail calls, so a
+re-index (after changing the chunking, the text cleaning or the embedding
+model) is bound by the disk and the embedding quota only.
+
+The new index is built as a separate generation of the collection while
+the current one keeps serving searches, then switched to in one step;
+the old generation is dropped afterwards. Unchanged chunks come from the
+embedding cache.
+
+Runs as a sync job (POST /api/v1/sync/reindex), or with the server stopped:
+
+    cd server
+    python -m app.services.reindex [--account <id>]
+"""
+import argparse
+import time
+from typing import Callable, Optional
+
+from loguru import logger
+
+from app.core.accounts import DEFAULT_ACCOUNT_ID, Account
+from app.services.chroma_store import HIDDEN_LABELS, ChromaStore, batch_prepared
+from app.services.message_store import MessageStore
+
+# Searches that picked up the old generation just before the switch get this long to finish
+RETIRE_DELAY_SECONDS = 10.0
+
+
+def reindex_collection(
+    chroma: ChromaStore,
+    store: MessageStore,
+    on_indexed: Optional[Callable[[int], None]] = None,
+    batch_size: int = 100,
+    retire_delay: float = 0.0,
+) -> dict:
+    """
+    Index every stored message into a new generation of `chroma`'s
+    collection and switch `chroma` over to it. `on_indexed(n)` is called
+    as messages get indexed; `batch_size` is in chunks per embedding call.
+    If anything fails, the new generation is dropped and `chroma` is untouched.
+    """
+    if store.count() == 0:
+        # Switching to an empty generation would wipe the index
+        raise RuntimeError(f"No messages stored in {store.path} to re-index from; run a full sync first")
+    target = chroma.new_generation()
+    logger.info(f"Re-indexing {chroma.collection_name} into {target.generation}...")
+    indexed = skipped = 0
+    try:
+        for emails in store.iter_emails():
+            visible = [e for e in emails if not HIDDEN_LABELS.intersection(e.labels)]
+            skipped += len(emails) - len(visible)
+            for batch in batch_prepared(target.prepare_emails(visible), batch_size):
+                target.write_prepared(batch, target.embed_prepared(batch))
+            indexed += len(visible)
+            if on_indexed is not None:
+                on_indexed(indexed)
+    except BaseException:
+        target.drop()
+        raise
+
+    chroma.switch_to(target)
+    # `target` now holds the previous generation
+    previous = target.generation
+    time.sleep(retire_delay)
+    target.drop()
+    return {"mode": "reindex", "indexed": indexed, "skipped": skipped, "generation": chroma.generation, "previous": previous}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--account", default=DEFAULT_ACCOUNT_ID, help="account ID (storage/accounts/<id>)")
+    args = parser.parse_args()
+
+    account = Account(args.account)
+    store = MessageStore(account.message_store_path)
+    chroma = ChromaStore(collection_name=account.collection_name)
+    try:
+        result = reindex_collection(chroma, store, on_indexed=lambda n: logger.info(f"{n} messages indexed"))
+    finally:
+        chroma.close()
+        store.close()
+    logger.success(f"Re-index done: {result}")
+
+
+if __name__ == "__main__":
+    main()
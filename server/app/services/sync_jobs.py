@@ -0,0 +1,143 @@
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+from app.core.accounts import DEFAULT_ACCOUNT_ID
+from app.core.config import settings
+from app.services.sync_service import SYNC_CHECKPOINT_PATH, SyncService, load_sync_checkpoint
+
+
+@dataclass
+class SyncJob:
+    id: str
+    mailbox: str
+    full_sync: bool
+    reindex: bool = False      # rebuild the index from the message store instead of syncing
+    state: str = "queued"      # queued | running | succeeded | failed
+    triggers: int = 1          # POST /sync calls coalesced into this job
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    service: Optional[SyncService] = None
+    exception: Optional[BaseException] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        status = {
+            "job_id": self.id,
+            "mailbox": self.mailbox,
+            "full_sync": self.full_sync,
+            "reindex": self.reindex,
+            "state": self.state,
+            "triggers": self.triggers,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+            "result": self.result,
+        }
+        if self.service is not None:
+            status["progress"] = self.service.progress()
+        return status
+
+
+class SyncJobManager:
+    """
+    Runs syncs as background jobs, at most one per mailbox.
+
+    Triggering a sync while one is already queued or running doesn't start
+    another: the call is coalesced into the active job. A full sync
+    requested during an incremental one runs as a follow-up job right after,
+    since the running job can't change mode halfway. A re-index is never
+    coalesced: it only starts when the mailbox has no active job, so no
+    sync writes to the index while it is being rebuilt. Syncs triggered
+    during a re-index run as a follow-up job right after it.
+
+    At most `max_running` jobs run at once across mailboxes, whoever
+    triggered them (POST /sync, re-index, the scheduler): the others wait
+    queued, so Gmail and embedding work stays bounded.
+
+    `service_factory(mailbox)` builds the SyncService a job runs.
+    """
+
+    def __init__(
+        self, service_factory: Callable[[str], SyncService], max_running: int = settings.SYNC_MAX_RUNNING_JOBS
+    ):
+        self.service_factory = service_factory
+        self._slots = threading.BoundedSemaphore(max(1, max_running))
+        self._lock = threading.Lock()
+        self._active: Dict[str, SyncJob] = {}
+        self._last: Dict[str, SyncJob] = {}
+        # Mailbox -> the sync (full or not) to run once its active job is done
+        self._follow_up: Dict[str, bool] = {}
+
+    def trigger(self, full_sync: bool = False, mailbox: str = DEFAULT_ACCOUNT_ID, reindex: bool = False) -> SyncJob:
+        """
+        Start a sync job, or coalesce into the mailbox's active one. With
+        `reindex`, the active job is returned as is (check `job.reindex`).
+        """
+        with self._lock:
+            job = self._active.get(mailbox)
+            if job is not None and reindex:
+                return job
+            if job is not None:
+                job.triggers += 1
+                if job.reindex:
+                    # The re-index fetches nothing from Gmail: the sync still has to run
+                    self._follow_up[mailbox] = self._follow_up.get(mailbox, False) or full_sync
+                elif full_sync and not job.full_sync:
+                    if job.state == "queued":
+                        job.full_sync = True
+                    else:
+                        self._follow_up[mailbox] = True
+                logger.info(f"Sync already {job.state} for {mailbox}, coalesced into job {job.id}")
+                return job
+
+            job = SyncJob(id=uuid.uuid4().hex[:12], mailbox=mailbox, full_sync=full_sync, reindex=reindex)
+            self._active[mailbox] = job
+        threading.Thread(target=self._run, args=(job,), name=f"sync-job-{job.id}", daemon=True).start()
+        return job
+
+    def status(self, mailbox: str = DEFAULT_ACCOUNT_ID) -> Optional[Dict[str, Any]]:
+        """The active job of the mailbox, or else its last finished one."""
+        with self._lock:
+            job = self._active.get(mailbox) or self._last.get(mailbox)
+        return job.to_dict() if job is not None else None
+
+    def resume_interrupted(
+        self, mailbox: str = DEFAULT_ACCOUNT_ID, checkpoint_path: str = SYNC_CHECKPOINT_PATH
+    ) -> Optional[SyncJob]:
+        """Restart a full sync a previous process didn't finish (from its checkpoint)."""
+        if load_sync_checkpoint(checkpoint_path) is None:
+            return None
+        logger.info(f"Found an interrupted full sync for {mailbox}, resuming it...")
+        return self.trigger(full_sync=True, mailbox=mailbox)
+
+    def _run(self, job: SyncJob):
+        # Stays queued (a full sync may still be requested into it) until a slot frees up
+        with self._slots:
+            with self._lock:
+                job.state = "running"
+            job.started_at = datetime.now()
+            try:
+                job.service = self.service_factory(job.mailbox)
+                job.result = job.service.reindex() if job.reindex else job.service.run(full_sync=job.full_sync)
+                job.state = "succeeded"
+            except Exception as e:
+                logger.exception(f"Sync job {job.id} failed")
+                job.error = str(e)
+                job.exception = e
+                job.state = "failed"
+            finally:
+                job.finished_at = datetime.now()
+
+        with self._lock:
+            del self._active[job.mailbox]
+            self._last[job.mailbox] = job
+            follow_up = self._follow_up.pop(job.mailbox, None)
+        if follow_up is not None:
+            self.trigger(full_sync=follow_up, mailbox=job.mailbox)
@@ -0,0 +1,357 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.models.domain import EmailDocument
+from app.services.chroma_store import HIDDEN_LABELS, ChromaStore, PreparedEmail
+from app.services.gmail_service import GMAIL_BATCH_SIZE, GmailService
+from app.services.message_store import MessageStore
+
+STAGES = ("list", "fetch", "parse", "embed", "write")
+
+# End-of-stream marker passed down the queues
+_DONE = object()
+
+# How often blocked stages check whether the pipeline was stopped
+_POLL_SECONDS = 0.1
+
+
+@dataclass
+class StageStats:
+    messages: int = 0          # Messages that made it through the stage
+    failed: int = 0            # Messages dropped by the stage
+    busy_seconds: float = 0.0  # Time spent working (not waiting on queues)
+
+
+class SyncPipeline:
+    """
+    Streams messages through list -> fetch -> parse -> embed -> write.
+
+    Each stage runs on its own thread(s), connected by bounded queues:
+    at most `queue_size` batches wait between two stages, so memory stays
+    flat whatever the mailbox size, and a slow stage makes the ones before
+    it wait instead of piling up work. The stages overlap, so throughput
+    is limited by the slowest one rather than by the sum of all of them.
+
+    - list:  consumes the (lazy) pages of message IDs, in Gmail batch sizes
+    - fetch: `GmailService.fetch_raw_messages`, `fetch_workers` batches at a time
+    - parse: MIME decoding, body cleaning and chunking (messages in TRASH /
+             SPAM are left out here and collected in `hidden`); parsed
+             emails are saved to `message_store`, if given
+    - embed: `ChromaStore.embed_prepared`, in batches of ~`embed_batch_size` chunks
+    - write: `ChromaStore.write_prepared`, then `on_written(emails)`
+
+    Errors listing or fetching stop the pipeline and are re-raised by
+    `run()`; messages that couldn't be fetched, or whose batch failed to
+    embed or write, are logged and collected in `failed` for the caller to
+    retry. A page holding a failed message is never reported done.
+
+    Every message is settled once it is written or dropped; `on_pages_done(n)`
+    is called whenever the first `n` input pages become fully settled, which
+    is what a resumable checkpoint can safely record.
+    """
+
+    def __init__(
+        self,
+        gmail: GmailService,
+        chroma: ChromaStore,
+        on_written: Optional[Callable[[List[EmailDocument]], None]] = None,
+        message_store: Optional[MessageStore] = None,
+        queue_size: int = settings.SYNC_QUEUE_SIZE,
+        fetch_workers: int = settings.SYNC_FETCH_WORKERS,
+        fetch_batch_size: int = GMAIL_BATCH_SIZE,
+        embed_batch_size: int = 100,
+    ):
+        self.gmail = gmail
+        self.chroma = chroma
+        self.on_written = on_written
+        self.message_store = message_store
+        self.queue_size = max(1, queue_size)
+        self.fetch_workers = max(1, fetch_workers)
+        self.fetch_batch_size = fetch_batch_size
+        self.embed_batch_size = embed_batch_size
+
+        self.stats: Dict[str, StageStats] = {name: StageStats() for name in STAGES}
+        self._stats_lock = threading.Lock()
+        self._queues: Dict[str, queue.Queue] = {}
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        # Parsed emails waiting to fill an embedding batch (parse stage only)
+        self._parsed: List[Tuple[EmailDocument, PreparedEmail]] = []
+        self._parsed_chunks = 0
+        # IDs of fetched messages that were not indexed for being in TRASH / SPAM
+        self.hidden: List[str] = []
+        # IDs of messages that failed to fetch, embed or write (worth retrying)
+        self.failed: List[str] = []
+        # In-flight messages -> input page, and unsettled messages per page
+        self._page_of: Dict[str, int] = {}
+        self._page_remaining: Dict[int, int] = {}
+        self._pages_done = 0
+        self._on_pages_done: Optional[Callable[[int], None]] = None
+
+    # -----------------------
+    # Running
+    # -----------------------
+
+    def run(
+        self,
+        id_pages: Iterable[List[str]],
+        on_pages_done: Optional[Callable[[int], None]] = None,
+    ) -> Dict[str, StageStats]:
+        """Push every page of message IDs through the pipeline; blocks until done."""
+        self._on_pages_done = on_pages_done
+        self._queues = {name: queue.Queue(maxsize=self.queue_size) for name in STAGES[1:]}
+        q = self._queues
+
+        threads = [threading.Thread(target=self._list_stage, args=(id_pages,), name="sync-list")]
+        threads += self._stage("fetch", q["fetch"], q["parse"], self._fetch, workers=self.fetch_workers)
+        threads += self._stage("parse", q["parse"], q["embed"], self._parse, finish=self._flush_parsed)
+        threads += self._stage("embed", q["embed"], q["write"], self._embed)
+        threads += self._stage("write", q["write"], None, self._write)
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+        elapsed = time.perf_counter() - start
+        written = self.stats["write"].messages
+        logger.info(
+            f"Sync pipeline: {written} messages in {elapsed:.1f}s ({written / elapsed if elapsed else 0:.1f} msg/s); "
+            + ", ".join(f"{name} {s.busy_seconds:.1f}s busy" for name, s in self.stats.items())
+        )
+        return self.stats
+
+    def stop(self):
+        """Ask every stage to finish early (work in flight is dropped)."""
+        self._stop.set()
+
+    def progress(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage counters plus how many batches wait in front of each stage."""
+        with self._stats_lock:
+            snapshot = {
+                name: {"messages": s.messages, "failed": s.failed, "busy_seconds": round(s.busy_seconds, 3)}
+                for name, s in self.stats.items()
+            }
+        for name, q in self._queues.items():
+            snapshot[name]["queued_batches"] = q.qsize()
+        return snapshot
+
+    # -----------------------
+    # Plumbing
+    # -----------------------
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, stage: str, error: BaseException):
+        logger.exception(f"Sync pipeline stage '{stage}' failed")
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _record(self, stage: str, messages: int = 0, failed: int = 0, busy: float = 0.0):
+        with self._stats_lock:
+            stats = self.stats[stage]
+            stats.messages += messages
+            stats.failed += failed
+            stats.busy_seconds += busy
+
+    def _track_page(self, page: List[str]) -> List[str]:
+        """Register a new input page; returns its IDs that aren't already in flight."""
+        with self._stats_lock:
+            index = len(self._page_remaining) + self._pages_done
+            # A message re-listed on a later page (mailbox changed mid-listing) is already on its way
+            fresh = [mid for mid in dict.fromkeys(page) if mid not in self._page_of]
+            for mid in fresh:
+                self._page_of[mid] = index
+            self._page_remaining[index] = len(fresh)
+        if not fresh:
+            self._settle([])
+        return fresh
+
+    def _settle(self, message_ids: Iterable[str], failed: bool = False):
+        """
+        Mark messages written (or dropped for good), and report newly
+        completed pages. `failed` messages are recorded in `failed` instead,
+        and keep their page from ever completing.
+        """
+        with self._stats_lock:
+            for mid in message_ids:
+                index = self._page_of.pop(mid, None)
+                if failed:
+                    self.failed.append(mid)
+                elif index is not None:
+                    self._page_remaining[index] -= 1
+            before = self._pages_done
+            while self._page_remaining.get(self._pages_done) == 0:
+                del self._page_remaining[self._pages_done]
+                self._pages_done += 1
+            done = self._pages_done if self._pages_done != before else None
+        if done is not None and self._on_pages_done is not None:
+            self._on_pages_done(done)
+
+    def _stage(
+        self,
+        name: str,
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue],
+        handle: Callable[[Any], List[Any]],
+        workers: int = 1,
+        finish: Optional[Callable[[], List[Any]]] = None,
+    ) -> List[threading.Thread]:
+        """Threads that apply `handle` to each batch from `inbox` and pass its outputs on."""
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def emit(outputs: List[Any]) -> bool:
+            return outbox is None or all(self._put(outbox, out) for out in outputs)
+
+        def work():
+            try:
+                while True:
+                    item = self._get(inbox)
+                    if item is _DONE:
+                        # Let sibling workers see the end of the stream too
+                        try:
+                            inbox.put_nowait(_DONE)
+                        except queue.Full:
+                            pass
+                        break
+                    if not emit(handle(item)):
+                        return
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    if finish is not None and not emit(finish()):
+                        return
+                    if outbox is not None:
+                        self._put(outbox, _DONE)
+            except Exception as e:
+                self._fail(name, e)
+
+        return [threading.Thread(target=work, name=f"sync-{name}-{i}") for i in range(workers)]
+
+    # -----------------------
+    # Stages
+    # -----------------------
+
+    def _list_stage(self, id_pages: Iterable[List[str]]):
+        try:
+            pages = iter(id_pages)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                page = next(pages, None)
+                self._record("list", busy=time.perf_counter() - start)
+                if page is None:
+                    break
+                page = self._track_page(page)
+                for i in range(0, len(page), self.fetch_batch_size):
+                    batch = page[i : i + self.fetch_batch_size]
+                    self._record("list", messages=len(batch))
+                    if not self._put(self._queues["fetch"], batch):
+                        return
+            self._put(self._queues["fetch"], _DONE)
+        except Exception as e:
+            self._fail("list", e)
+
+    def _fetch(self, message_ids: List[str]) -> List[Any]:
+        start = time.perf_counter()
+        responses = self.gmail.fetch_raw_messages(message_ids)
+        fetched = {r.get("id") for r in responses}
+        self._settle((mid for mid in message_ids if mid not in fetched), failed=True)
+        self._record(
+            "fetch",
+            messages=len(responses),
+            failed=len(message_ids) - len(responses),
+            busy=time.perf_counter() - start,
+        )
+        return [responses] if responses else []
+
+    def _parse(self, responses: List[dict]) -> List[Any]:
+        start = time.perf_counter()
+        ready, failed = [], 0
+        parsed: List[EmailDocument] = []
+        for response in responses:
+            try:
+                email = self.gmail.parse_message(response)
+                if HIDDEN_LABELS.intersection(email.labels):
+                    self.hidden.append(email.gmail_id)
+                    self._settle([email.gmail_id])
+                    continue
+                prepared = self.chroma.prepare_emails([email])[0]
+            except Exception:
+                logger.exception(f"Failed to parse message {response.get('id')}")
+                self._settle([response.get("id")])
+                failed += 1
+                continue
+            parsed.append(email)
+            self._parsed.append((email, prepared))
+            self._parsed_chunks += len(prepared[1])
+            # Regroup whole emails into embedding-sized batches
+            if self._parsed_chunks >= self.embed_batch_size:
+                ready.extend(self._flush_parsed())
+        if self.message_store is not None and parsed:
+            try:
+                self.message_store.put_many(parsed)
+            except Exception:
+                # Only a re-index needs them: the sync itself goes on
+                logger.exception(f"Failed to store {len(parsed)} parsed messages")
+        self._record("parse", messages=len(responses) - failed, failed=failed, busy=time.perf_counter() - start)
+        return ready
+
+    def _flush_parsed(self) -> List[Any]:
+        batch, self._parsed, self._parsed_chunks = self._parsed, [], 0
+        return [batch] if batch else []
+
+    def _embed(self, batch: List[Tuple[EmailDocument, PreparedEmail]]) -> List[Any]:
+        start = time.perf_counter()
+        try:
+            vectors = self.chroma.embed_prepared([prepared for _, prepared in batch])
+        except Exception as e:
+            logger.error(f"Failed to embed {len(batch)} emails: {e}")
+            self._settle((email.gmail_id for email, _ in batch), failed=True)
+            self._record("embed", failed=len(batch), busy=time.perf_counter() - start)
+            return []
+        self._record("embed", messages=len(batch), busy=time.perf_counter() - start)
+        return [(batch, vectors)]
+
+    def _write(self, item: Tuple[List[Tuple[EmailDocument, PreparedEmail]], List[List[float]]]) -> List[Any]:
+        batch, vectors = item
+        start = time.perf_counter()
+        try:
+            self.chroma.write_prepared([prepared for _, prepared in batch], vectors)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} emails: {e}")
+            self._settle((email.gmail_id for email, _ in batch), failed=True)
+            self._record("write", failed=len(batch), busy=time.perf_counter() - start)
+            return []
+        if self.on_written is not None:
+            self.on_written([email for email, _ in batch])
+        self._record("write", messages=len(batch), busy=time.perf_counter() - start)
+        self._settle(email.gmail_id for email, _ in batch)
+        return []
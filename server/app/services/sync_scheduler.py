@@ -0,0 +1,228 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+from app.core.accounts import Account
+from app.core.concurrency import run_blocking
+from app.core.config import settings
+from app.core.metrics import SYNC_CHECKS
+from app.services.gmail_service import GmailService
+from app.services.rate_limiter import is_rate_limit_error, retry_after_seconds
+from app.services.sync_jobs import SyncJobManager
+from app.services.sync_service import load_sync_state
+
+# How often a scheduled job is polled for completion
+JOB_POLL_SECONDS = 1.0
+
+# Longest quota pause, however many quota errors in a row
+MAX_QUOTA_PAUSE_SECONDS = 3600
+
+
+@dataclass
+class MailboxSchedule:
+    """
+    Adaptive check interval of one mailbox: back to `min_interval` when a
+    check finds new history, multiplied by `backoff` (up to `max_interval`)
+    after each idle check, and spread by +/- `jitter` so mailboxes don't
+    poll in lockstep.
+    """
+
+    mailbox: str
+    min_interval: float = settings.SYNC_POLL_MIN_SECONDS
+    max_interval: float = settings.SYNC_POLL_MAX_SECONDS
+    backoff: float = settings.SYNC_POLL_BACKOFF
+    jitter: float = settings.SYNC_POLL_JITTER
+    interval: float = settings.SYNC_POLL_MIN_SECONDS
+    next_check: float = 0.0
+    checks: int = 0
+    syncs: int = 0
+
+    def reschedule(self, now: float, changed: Optional[bool], rng: random.Random) -> float:
+        """
+        Set the next check after one that found new history (True), none
+        (False) or couldn't run (None: not connected / never synced).
+        """
+        if changed:
+            self.interval = self.min_interval
+        elif changed is False:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        else:
+            self.interval = self.max_interval
+        self.next_check = now + self.interval * rng.uniform(1 - self.jitter, 1 + self.jitter)
+        return self.next_check
+
+
+class SyncScheduler:
+    """
+    Keeps connected mailboxes fresh without a manual POST /sync.
+
+    Each mailbox is checked on its own adaptive interval (MailboxSchedule).
+    A check is one `getProfile` call: only when the mailbox's historyId
+    moved past the last synced one is an incremental sync job started
+    (through the SyncJobManager, so it coalesces with manual syncs).
+    Mailboxes that never had a first sync are left to POST /sync.
+
+    At most SYNC_SCHEDULER_CONCURRENCY checks / scheduled syncs run at once
+    (and the jobs count against the SyncJobManager's cap on all sync jobs),
+    and a quota error (or Gmail / embedding 429s retried during a scheduled sync) pauses the
+    whole scheduler for SYNC_QUOTA_PAUSE_SECONDS, doubling while they continue.
+    """
+
+    def __init__(
+        self,
+        jobs: SyncJobManager,
+        gmail_for: Callable[[Account], GmailService],
+        accounts: Callable[[], List[Account]],
+        concurrency: int = settings.SYNC_SCHEDULER_CONCURRENCY,
+        quota_pause: float = settings.SYNC_QUOTA_PAUSE_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        self.jobs = jobs
+        self.gmail_for = gmail_for
+        self.accounts = accounts
+        self.concurrency = concurrency
+        self.quota_pause = quota_pause
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self.schedules: Dict[str, MailboxSchedule] = {}
+        self._accounts: Dict[str, Account] = {}
+        self.paused_until = 0.0
+        self._pause_seconds = 0.0
+        self._checking: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start checking in the background (call from the running event loop)."""
+        if self._task is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="sync-scheduler")
+            logger.info(f"Sync scheduler started (every {settings.SYNC_POLL_MIN_SECONDS}-{settings.SYNC_POLL_MAX_SECONDS}s)")
+
+    async def stop(self):
+        tasks = [t for t in (self._task, *self._checking.values()) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._checking.clear()
+
+    def status(self, mailbox: str) -> Optional[Dict[str, Any]]:
+        schedule = self.schedules.get(mailbox)
+        if schedule is None:
+            return None
+        now = self._clock()
+        return {
+            "interval_seconds": round(schedule.interval, 1),
+            "next_check_in_seconds": round(max(0.0, schedule.next_check - now), 1),
+            "paused_for_seconds": round(max(0.0, self.paused_until - now), 1),
+            "checks": schedule.checks,
+            "syncs": schedule.syncs,
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                self._refresh_mailboxes(await run_blocking(self.accounts))
+            except Exception:
+                logger.exception("Sync scheduler failed to list accounts")
+
+            now = self._clock()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            for schedule in self.schedules.values():
+                if schedule.next_check <= now and schedule.mailbox not in self._checking:
+                    task = asyncio.get_running_loop().create_task(self._check(schedule))
+                    self._checking[schedule.mailbox] = task
+
+            # Wake for the next due check; accounts connected meanwhile are picked up within min_interval
+            upcoming = [s.next_check for s in self.schedules.values() if s.mailbox not in self._checking]
+            wake = min(upcoming, default=now + settings.SYNC_POLL_MIN_SECONDS)
+            await asyncio.sleep(min(max(wake - now, 1.0), settings.SYNC_POLL_MIN_SECONDS))
+
+    def _refresh_mailboxes(self, accounts: List[Account]):
+        self._accounts = {account.id: account for account in accounts}
+        for mailbox in list(self.schedules):
+            if mailbox not in self._accounts:
+                del self.schedules[mailbox]
+        now = self._clock()
+        for mailbox in self._accounts.keys() - self.schedules.keys():
+            # Spread the first checks, e.g. of every account after a restart
+            self.schedules[mailbox] = MailboxSchedule(
+                mailbox, next_check=now + self._rng.uniform(0, settings.SYNC_POLL_MIN_SECONDS)
+            )
+
+    async def _check(self, schedule: MailboxSchedule):
+        changed: Optional[bool] = None
+        deferred = False
+        try:
+            async with self._slots:
+                if self._clock() < self.paused_until:
+                    # Paused while waiting for a slot: check once the pause is over
+                    deferred = True
+                    schedule.next_check = self.paused_until
+                    return
+                active = self.jobs.status(schedule.mailbox)
+                if active is not None and active["state"] in ("queued", "running"):
+                    # A manual sync is already bringing it up to date
+                    changed = True
+                    SYNC_CHECKS.inc(result="busy")
+                    return
+
+                schedule.checks += 1
+                changed = await run_blocking(self._has_new_history, self._accounts.get(schedule.mailbox))
+                SYNC_CHECKS.inc(result={True: "changed", False: "idle", None: "skipped"}[changed])
+                # Gmail answered: quota pauses start over from SYNC_QUOTA_PAUSE_SECONDS
+                self._pause_seconds = 0.0
+                if changed:
+                    schedule.syncs += 1
+                    await self._sync(schedule.mailbox)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Back off as for an idle mailbox
+            changed = False
+            if is_rate_limit_error(e):
+                SYNC_CHECKS.inc(result="throttled")
+                self._pause(retry_after_seconds(e))
+            else:
+                SYNC_CHECKS.inc(result="error")
+                logger.warning(f"Scheduled sync check of {schedule.mailbox} failed: {e}")
+        finally:
+            if not deferred:
+                schedule.reschedule(max(self._clock(), self.paused_until), changed, self._rng)
+            self._checking.pop(schedule.mailbox, None)
+
+    def _has_new_history(self, account: Optional[Account]) -> Optional[bool]:
+        """Whether Gmail's historyId moved past the last synced one (one getProfile call)."""
+        if account is None:
+            return None
+        synced = load_sync_state(account.sync_state_path).last_history_id
+        if not synced:
+            return None
+        current = self.gmail_for(account).get_profile().get("historyId")
+        return current is not None and int(current) > int(synced)
+
+    async def _sync(self, mailbox: str):
+        job = self.jobs.trigger(full_sync=False, mailbox=mailbox)
+        logger.info(f"New mail in {mailbox}, scheduled sync job {job.id}")
+        while job.state in ("queued", "running"):
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+        if job.exception is not None and is_rate_limit_error(job.exception):
+            raise job.exception
+        if job.result and (job.result.get("throttled") or job.result.get("embedding_throttled")):
+            # The sync got through, but only by retrying 429s: leave the quotas alone for a while
+            SYNC_CHECKS.inc(result="throttled")
+            self._pause(None)
+
+    def _pause(self, retry_after: Optional[float]):
+        self._pause_seconds = min(MAX_QUOTA_PAUSE_SECONDS, self._pause_seconds * 2 or self.quota_pause)
+        pause = max(self._pause_seconds, retry_after or 0.0)
+        self.paused_until = max(self.paused_until, self._clock() + pause)
+        logger.warning(f"Quota errors during background sync: scheduler paused for {pause:.0f}s")
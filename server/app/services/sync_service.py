@@ -0,0 +1,383 @@
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from loguru import logger
+
+from app.core.config import settings
+from app.models.domain import EmailDocument, SyncCheckpoint, SyncState
+from app.services.gmail_service import GmailService, HistoryExpiredError
+from app.services.answer_cache import SemanticAnswerCache, answer_cache
+from app.services.chroma_store import HIDDEN_LABELS, ChromaStore
+from app.services.highlights_service import HighlightsService
+from app.services.message_store import MessageStore
+from app.services.rate_limiter import embedding_limiter
+from app.services.reindex import RETIRE_DELAY_SECONDS, reindex_collection
+from app.services.sync_pipeline import SyncPipeline
+
+SYNC_STATE_PATH = "storage/sync_state.json"
+SYNC_CHECKPOINT_PATH = "storage/sync_checkpoint.json"
+MESSAGE_STORE_PATH = "storage/messages.sqlite"
+
+
+def load_sync_state(path: str = SYNC_STATE_PATH) -> SyncState:
+    if not os.path.exists(path):
+        return SyncState()
+
+    with open(path, "r") as f:
+        return SyncState.model_validate_json(f.read())
+
+
+def save_sync_state(state: SyncState, path: str = SYNC_STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w") as f:
+        f.write(state.model_dump_json(indent=4))
+
+
+def load_sync_checkpoint(path: str = SYNC_CHECKPOINT_PATH) -> Optional[SyncCheckpoint]:
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as f:
+        return SyncCheckpoint.model_validate_json(f.read())
+
+
+def save_sync_checkpoint(checkpoint: SyncCheckpoint, path: str = SYNC_CHECKPOINT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Written often while a sync runs: write then rename, so a crash never leaves half a file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(checkpoint.model_dump_json(indent=4))
+    os.replace(tmp_path, path)
+
+
+def clear_sync_checkpoint(path: str = SYNC_CHECKPOINT_PATH):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class SyncService:
+    """
+    Syncs Gmail into the vector store.
+    Incremental syncs replay `users.history.list` from the last checkpointed
+    historyId, so only newly added messages are fetched and embedded;
+    deletions and label changes are applied to the stored metadata.
+    A date-bounded full sync is used for the first run, when explicitly
+    requested, or when the checkpoint has expired; it pages through every
+    matching message, streaming them through the SyncPipeline.
+    When `highlights` is given, the highlights summary is refreshed
+    after a sync that indexed, relabelled or removed anything.
+
+    A full sync checkpoints its listing position (storage/sync_checkpoint.json)
+    as pages get fully indexed; if it is interrupted, the next run resumes
+    it from there instead of starting over.
+
+    Messages that fail to fetch, embed or write are kept in the sync state
+    and retried by the next syncs (up to SYNC_MAX_ATTEMPTS); until they
+    are indexed or given up on, `last_history_id` stays where it was.
+
+    Parsed emails are also kept in the local MessageStore at
+    `message_store_path` (None to not keep them), which reindex() rebuilds
+    the index from without calling Gmail.
+
+    The state / checkpoint / message store paths and the answer cache to
+    invalidate default to the single-user ones; other accounts pass their own.
+    """
+
+    def __init__(
+        self,
+        gmail: Optional[GmailService] = None,
+        chroma: Optional[ChromaStore] = None,
+        highlights: Optional[HighlightsService] = None,
+        cache: Optional[SemanticAnswerCache] = None,
+        state_path: str = SYNC_STATE_PATH,
+        checkpoint_path: str = SYNC_CHECKPOINT_PATH,
+        message_store_path: Optional[str] = MESSAGE_STORE_PATH if settings.MESSAGE_STORE_ENABLED else None,
+    ):
+        self.gmail = gmail or GmailService()
+        self.chroma = chroma or ChromaStore()
+        self.highlights = highlights
+        self.answer_cache = cache or answer_cache
+        self.state_path = state_path
+        self.checkpoint_path = checkpoint_path
+        self.message_store_path = message_store_path
+        self.message_store: Optional[MessageStore] = None
+        self.synced_ids: List[str] = []
+        # Messages relabelled or removed without being re-indexed
+        self.changed_ids: List[str] = []
+
+        # Progress of the current run, for status reporting
+        self.mode: Optional[str] = None
+        self.expected_messages: Optional[int] = None
+        self.resumed_messages = 0
+        self.reindexed = 0
+        self.pipeline: Optional[SyncPipeline] = None
+        self._pipeline_started: Optional[float] = None
+        self._pipeline_ended: Optional[float] = None
+
+    def run(self, full_sync: bool = False) -> dict:
+        state = load_sync_state(self.state_path)
+        checkpoint = load_sync_checkpoint(self.checkpoint_path)
+        self.synced_ids = []
+        self.changed_ids = []
+        quota_errors = self.gmail.quota_errors
+        embedding_throttled = embedding_limiter.stats["throttled"]
+
+        self.message_store = MessageStore(self.message_store_path) if self.message_store_path else None
+        try:
+            if checkpoint is not None:
+                summary = self._full_sync(state, checkpoint)
+            elif full_sync or not state.last_history_id:
+                summary = self._full_sync(state)
+            else:
+                try:
+                    summary = self._incremental_sync(state)
+                except HistoryExpiredError:
+                    logger.warning(f"History ID {state.last_history_id} expired, falling back to full sync")
+                    summary = self._full_sync(state)
+        finally:
+            if self.message_store is not None:
+                self.message_store.close()
+                self.message_store = None
+
+        # 429s this run retried through (the scheduler backs off on them). The
+        # embedding quota is shared by everything using the API key, so any
+        # embedding 429 during the run counts.
+        summary["throttled"] = self.gmail.quota_errors - quota_errors
+        summary["embedding_throttled"] = embedding_limiter.stats["throttled"] - embedding_throttled
+        state.last_sync_at = datetime.now()
+        save_sync_state(state, self.state_path)
+        logger.success(f"Sync completed: {summary}")
+
+        if self.highlights is not None and (self.synced_ids or self.changed_ids):
+            try:
+                self.highlights.refresh([*self.synced_ids, *self.changed_ids])
+            except Exception:
+                # The previous highlights stay served; the next sync retries
+                logger.exception("Failed to refresh highlights")
+        return summary
+
+    def _full_sync(self, state: SyncState, checkpoint: Optional[SyncCheckpoint] = None) -> dict:
+        self.mode = "full"
+        if checkpoint is None:
+            query = f"newer_than:{settings.SYNC_FULL_SYNC_DAYS}d" if settings.SYNC_FULL_SYNC_DAYS else None
+            checkpoint = SyncCheckpoint(
+                query=query,
+                max_results=settings.SYNC_MAX_MESSAGES or None,
+                # Capture the history ID *before* listing so anything that arrives
+                # during the sync is picked up by the next incremental run.
+                start_history_id=self.gmail.get_profile().get("historyId"),
+                started_at=datetime.now(),
+            )
+            save_sync_checkpoint(checkpoint, self.checkpoint_path)
+            logger.info(
+                f"Running full sync ({checkpoint.query or 'whole mailbox'}, "
+                f"max {checkpoint.max_results or 'all'} messages)..."
+            )
+        else:
+            logger.info(
+                f"Resuming full sync started {checkpoint.started_at:%Y-%m-%d %H:%M} "
+                f"after {checkpoint.pages_done} pages ({checkpoint.messages_done} messages)..."
+            )
+
+        try:
+            estimate = self.gmail.estimate_messages(checkpoint.query)
+            self.expected_messages = min(estimate, checkpoint.max_results) if checkpoint.max_results else estimate
+        except Exception:
+            # Only used for the ETA
+            self.expected_messages = None
+        self.resumed_messages = checkpoint.messages_done
+
+        remaining = checkpoint.max_results - checkpoint.messages_done if checkpoint.max_results else None
+        pages = self.gmail.iter_message_pages(
+            query=checkpoint.query, max_results=remaining, page_token=checkpoint.page_token
+        )
+        synced = self._ingest(*_checkpointed_pages(pages, checkpoint, self.checkpoint_path))
+        clear_sync_checkpoint(self.checkpoint_path)
+
+        # A full sync re-lists everything in scope: earlier failures it didn't list are dropped
+        _update_failed(state, self.pipeline.failed, resolved=state.failed_messages)
+        if not state.failed_messages:
+            state.last_history_id = checkpoint.start_history_id
+        state.last_full_sync_at = datetime.now()
+        return {
+            "mode": "full",
+            "synced": synced,
+            "failed": len(state.failed_messages),
+            "history_id": state.last_history_id,
+        }
+
+    def _incremental_sync(self, state: SyncState) -> dict:
+        logger.info(f"Running incremental sync from history ID {state.last_history_id}...")
+        self.mode = "incremental"
+        changes = self.gmail.list_history(state.last_history_id)
+
+        # Deletions and label changes only touch stored metadata: nothing is re-fetched or re-embedded
+        removed = self.chroma.delete_emails(changes.deleted)
+        added = set(changes.added)
+        relabelled = self.chroma.apply_label_changes(
+            {mid: change for mid, change in changes.labels.items() if mid not in added}
+        )
+        removed += relabelled["removed"]
+        # Messages taken out of TRASH / SPAM come back through the pipeline (their embeddings are cached)
+        restored = [
+            mid for mid in relabelled["missing"] if changes.labels[mid].removed & HIDDEN_LABELS
+        ]
+        self.answer_cache.invalidate(removed + relabelled["updated"])
+        self.changed_ids.extend(removed + relabelled["updated"])
+
+        synced = 0
+        if self.message_store is not None:
+            self.message_store.delete(changes.deleted)
+            self.message_store.set_labels({mid: changes.labels[mid] for mid in changes.labels if mid not in added})
+            # Restored messages still in the store don't need fetching either
+            stored = [e for e in self.message_store.get_many(restored) if not HIDDEN_LABELS.intersection(e.labels)]
+            if stored:
+                self.chroma.upsert_emails(stored)
+                self._on_written(stored)
+                synced += len(stored)
+            restored = [mid for mid in restored if mid not in {e.gmail_id for e in stored}]
+
+        # Messages earlier syncs failed to index are retried along with the new ones
+        deleted = set(changes.deleted)
+        retries = [mid for mid in state.failed_messages if mid not in deleted]
+        message_ids = list(dict.fromkeys(changes.added + restored + retries))
+        self.expected_messages = len(message_ids)
+        self.resumed_messages = 0
+        # Not checkpointed: if interrupted, the next run simply replays the same history
+        synced += self._ingest([message_ids] if message_ids else [])
+
+        _update_failed(state, self.pipeline.failed, resolved=[*message_ids, *deleted])
+        # While messages are still failing, the next run replays this history too
+        if not state.failed_messages:
+            state.last_history_id = changes.history_id
+        return {
+            "mode": "incremental",
+            "synced": synced,
+            "failed": len(state.failed_messages),
+            "relabelled": len(relabelled["updated"]),
+            "removed": len(removed),
+            "history_id": state.last_history_id,
+        }
+
+    def _ingest(
+        self, id_pages: Iterable[List[str]], on_pages_done: Optional[Callable[[int], None]] = None
+    ) -> int:
+        """Stream pages of message IDs into ChromaDB; returns how many emails were indexed."""
+        self.pipeline = SyncPipeline(
+            self.gmail, self.chroma, on_written=self._on_written, message_store=self.message_store
+        )
+        self._pipeline_started, self._pipeline_ended = time.monotonic(), None
+        try:
+            stats = self.pipeline.run(id_pages, on_pages_done=on_pages_done)
+        finally:
+            self._pipeline_ended = time.monotonic()
+        if not stats["list"].messages:
+            logger.info("No new emails to sync.")
+        return stats["write"].messages
+
+    def reindex(self) -> dict:
+        """
+        Rebuild the index from the message store (no Gmail calls), e.g. after
+        a chunking, cleaning or embedding model change; searches are served
+        from the current index until the new one is complete.
+        """
+        if not self.message_store_path:
+            raise RuntimeError("Re-indexing needs the message store (MESSAGE_STORE_ENABLED)")
+        self.mode = "reindex"
+        self.reindexed = 0
+        self.resumed_messages = 0
+        store = MessageStore(self.message_store_path)
+        self.expected_messages = store.count()
+        self._pipeline_started, self._pipeline_ended = time.monotonic(), None
+        try:
+            summary = reindex_collection(
+                self.chroma,
+                store,
+                on_indexed=lambda n: setattr(self, "reindexed", n),
+                retire_delay=RETIRE_DELAY_SECONDS,
+            )
+        finally:
+            self._pipeline_ended = time.monotonic()
+            store.close()
+        # Cached answers quote the previous index's chunks
+        self.answer_cache.clear()
+        logger.success(f"Re-index completed: {summary}")
+        return summary
+
+    def progress(self) -> Dict[str, Any]:
+        """Throughput, ETA and per-stage counts of the sync in progress."""
+        pipeline = self.pipeline
+        stages = pipeline.progress() if pipeline is not None else {}
+        written = stages.get("write", {}).get("messages", self.reindexed)
+        settled = written + sum(stage.get("failed", 0) for stage in stages.values())
+        end = self._pipeline_ended or time.monotonic()
+        elapsed = end - self._pipeline_started if self._pipeline_started else 0.0
+        rate = settled / elapsed if elapsed > 0 else 0.0
+
+        eta = None
+        if self._pipeline_ended is None and self.expected_messages is not None and rate > 0:
+            eta = max(0.0, (self.expected_messages - self.resumed_messages - settled) / rate)
+        return {
+            "mode": self.mode,
+            "expected_messages": self.expected_messages,
+            "resumed_from": self.resumed_messages,
+            "indexed": written,
+            "messages_per_second": round(written / elapsed, 2) if elapsed > 0 else 0.0,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "stages": stages,
+        }
+
+    def _on_written(self, emails: List[EmailDocument]):
+        # Cached chat answers built from these emails may now be stale
+        self.answer_cache.invalidate(e.gmail_id for e in emails)
+        self.synced_ids.extend(e.gmail_id for e in emails)
+
+
+def _checkpointed_pages(pages, checkpoint: SyncCheckpoint, path: str = SYNC_CHECKPOINT_PATH):
+    """
+    Adapt `iter_message_pages` output for SyncService._ingest: returns
+    (ID pages, on_pages_done) where on_pages_done moves the checkpoint past
+    every page the pipeline has fully indexed.
+    """
+    next_tokens: List[Optional[str]] = []
+    page_sizes: List[int] = []
+    base_pages, base_messages = checkpoint.pages_done, checkpoint.messages_done
+
+    def id_pages():
+        for messages, next_token in pages:
+            next_tokens.append(next_token)
+            page_sizes.append(len(messages))
+            yield [m["id"] for m in messages]
+
+    def on_pages_done(done: int):
+        checkpoint.page_token = next_tokens[done - 1]
+        checkpoint.pages_done = base_pages + done
+        checkpoint.messages_done = base_messages + sum(page_sizes[:done])
+        checkpoint.updated_at = datetime.now()
+        save_sync_checkpoint(checkpoint, path)
+
+    return id_pages(), on_pages_done
+
+
+def _update_failed(state: SyncState, failed: Iterable[str], resolved: Iterable[str]):
+    """
+    Record the messages a run `failed` to index in `state.failed_messages`,
+    dropping those it `resolved` (indexed or no longer wanted). A message
+    is given up on after SYNC_MAX_ATTEMPTS failed syncs.
+    """
+    previous = state.failed_messages
+    resolved = set(resolved)
+    outstanding = {mid: attempts for mid, attempts in previous.items() if mid not in resolved}
+    for mid in dict.fromkeys(failed):
+        attempts = previous.get(mid, 0) + 1
+        if attempts >= settings.SYNC_MAX_ATTEMPTS:
+            logger.error(f"Giving up on message {mid} after {attempts} failed syncs")
+            outstanding.pop(mid, None)
+        else:
+            outstanding[mid] = attempts
+    if outstanding:
+        logger.warning(f"{len(outstanding)} messages failed to index; the next sync retries them")
+    state.failed_messages = outstanding
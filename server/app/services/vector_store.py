@@ -0,0 +1,451 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+# Backends selectable with VECTOR_STORE_BACKEND
+BACKENDS = ("chroma", "local")
+
+# Rows converted to float32 and scored at a time: the whole index is never
+# materialised as float32, and a block (1k rows x 768 dims = 3 MB) stays in cache
+SEARCH_BLOCK_ROWS = 1_024
+
+# Initial row capacity of a local index; it doubles as it fills
+INITIAL_CAPACITY = 1_024
+
+METADATA_KEY = re.compile(r"^[A-Za-z0-9_]+$")
+
+COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+class VectorStore(ABC):
+    """
+    Storage and similarity search for embedded email chunks.
+
+    ChromaStore talks to its backend only through these methods. IDs are
+    chunk IDs (`gmail_id#n`), `where` filters use Chroma's syntax ($and,
+    $or, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin), and `get` returns
+    Chroma-style dicts (`ids` plus the `include`d fields).
+    """
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of existing chunks, keeping their vectors and text."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        ...
+
+    @abstractmethod
+    def search(self, query_embedding: List[float], k: int, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Top `k` chunks by cosine similarity to `query_embedding`, best first."""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def drop(self):
+        """Delete the collection and everything in it."""
+
+    def close(self):
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    """Persistent Chroma collection (storage/chroma_db), via langchain_chroma."""
+
+    def __init__(self, persist_dir: str, collection_name: str, embedding: Embeddings):
+        # Imported here so the local backend runs without chromadb installed
+        from langchain_chroma import Chroma
+
+        self.db = Chroma(
+            embedding_function=embedding,
+            persist_directory=persist_dir,
+            collection_name=collection_name,
+        )
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        # Same call add_documents ends in, minus the embedding step
+        self.db._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        return self.db.get(ids=ids, where=where, include=list(include))
+
+    def update_metadata(self, ids, metadatas):
+        self.db._collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.db.delete(ids=ids)
+
+    def search(self, query_embedding, k, where=None):
+        return self.db.similarity_search_by_vector(query_embedding, k=k, filter=where)
+
+    def count(self) -> int:
+        return self.db._collection.count()
+
+    def drop(self):
+        self.db.delete_collection()
+
+
+def _where_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """SQL condition on `entries.metadata` (JSON) equivalent to a Chroma `where` filter."""
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(sub) for sub in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params.extend(p for _, sub_params in parts for p in sub_params)
+            continue
+        if not METADATA_KEY.match(key):
+            raise ValueError(f"Unsupported metadata key in filter: {key!r}")
+
+        # Literal path, so the expression indexes on entries can be used
+        column = f"json_extract(metadata, '$.{key}')"
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op in COMPARISONS:
+                clauses.append(f"{column} {COMPARISONS[op]} ?")
+                params.append(value)
+            elif op in ("$in", "$nin"):
+                if not value:
+                    clauses.append("0" if op == "$in" else "1")
+                    continue
+                negation = "NOT " if op == "$nin" else ""
+                clauses.append(f"{column} {negation}IN ({','.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op!r}")
+    return " AND ".join(clauses) or "1", params
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Compact on-disk vector index: int8 vectors in a memory-mapped NumPy
+    matrix, with chunk text and metadata in a sidecar SQLite table.
+
+    Layout of `path/`:
+      vectors.i8   row-major int8 matrix, one row per chunk
+      scales.f32   float32 dequantization scale of each row
+      meta.sqlite  entries(row, doc_id, document, metadata JSON) + info
+
+    Vectors are normalised, then quantised per row (scale = max |x| / 127),
+    so a row's dot product with the normalised query times its scale is
+    the cosine similarity, at a quarter of the float32 size. Searches are a
+    blocked matrix-vector product over the mapped rows (or only the rows a
+    `where` filter selects in SQLite) followed by a partial sort. Deleted
+    rows are recycled by later upserts.
+
+    Which rows are in use is tracked in memory (loaded from SQLite on open),
+    so a directory must only be open once per process: open_vector_store()
+    hands out one shared instance per directory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.closed = False
+        self._lock = threading.RLock()
+
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(path, "meta.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                row INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL UNIQUE,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_gmail_id ON entries(json_extract(metadata, '$.gmail_id'));
+            CREATE INDEX IF NOT EXISTS idx_entries_sender_email ON entries(json_extract(metadata, '$.sender_email'));
+            CREATE INDEX IF NOT EXISTS idx_entries_sender_domain ON entries(json_extract(metadata, '$.sender_domain'));
+            CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries(json_extract(metadata, '$.timestamp_epoch'));
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT value FROM info WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._capacity = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0           # rows ever used (high-water mark)
+        self._free: List[int] = []
+
+        if self.dim is not None:
+            self._open_matrix()
+            rows = np.fromiter((r for (r,) in self._conn.execute("SELECT row FROM entries")), dtype=np.int64)
+            self._size = int(rows.max()) + 1 if len(rows) else 0
+            self._alive[rows] = True
+            self._free = [int(r) for r in np.flatnonzero(~self._alive[: self._size])]
+
+    # -----------------------
+    # Matrix files
+    # -----------------------
+
+    def _open_matrix(self, capacity: int = 0):
+        vectors_path = os.path.join(self.path, "vectors.i8")
+        scales_path = os.path.join(self.path, "scales.f32")
+        existing = os.path.getsize(scales_path) // 4 if os.path.exists(scales_path) else 0
+        capacity = max(capacity, existing)
+        for file_path, row_bytes in ((vectors_path, self.dim), (scales_path, 4)):
+            with open(file_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+
+        # Searches in flight keep their reference to the previous mapping
+        self._vectors = np.memmap(vectors_path, dtype=np.int8, mode="r+", shape=(capacity, self.dim)) if capacity else None
+        self._scales = np.memmap(scales_path, dtype=np.float32, mode="r+", shape=(capacity,)) if capacity else None
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: len(self._alive)] = self._alive[:capacity]
+        self._alive = alive
+        self._capacity = capacity
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._capacity:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._scales.flush()
+        self._open_matrix(max(rows, self._capacity * 2, INITIAL_CAPACITY))
+
+    @staticmethod
+    def _quantize(embeddings: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    # -----------------------
+    # VectorStore API
+    # -----------------------
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(embeddings[0])
+                self._conn.execute("INSERT INTO info (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            elif len(embeddings[0]) != self.dim:
+                raise ValueError(f"Embedding dimension {len(embeddings[0])} doesn't match the index ({self.dim})")
+
+            rows = self._rows_of(ids)
+            targets = []
+            for doc_id in ids:
+                if doc_id not in rows:
+                    rows[doc_id] = self._free.pop() if self._free else self._next_row()
+                targets.append(rows[doc_id])
+            self._ensure_capacity(self._size)
+
+            quantized, scales = self._quantize(embeddings)
+            targets = np.asarray(targets, dtype=np.int64)
+            self._vectors[targets] = quantized
+            self._scales[targets] = scales
+            self._vectors.flush()
+            self._scales.flush()
+
+            self._conn.executemany(
+                "INSERT INTO entries (row, doc_id, document, metadata) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(doc_id) DO UPDATE SET document = excluded.document, metadata = excluded.metadata",
+                [
+                    (int(row), doc_id, text, json.dumps(meta))
+                    for row, doc_id, text, meta in zip(targets, ids, documents, metadatas)
+                ],
+            )
+            self._conn.commit()
+            self._alive[targets] = True
+
+    def _next_row(self) -> int:
+        self._size += 1
+        return self._size - 1
+
+    def _rows_of(self, ids: List[str]) -> Dict[str, int]:
+        rows: Dict[str, int] = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.update(self._conn.execute(f"SELECT doc_id, row FROM entries WHERE doc_id IN ({placeholders})", chunk))
+        return rows
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        clauses, params = [], []
+        if where:
+            sql, where_params = _where_sql(where)
+            clauses.append(sql)
+            params.extend(where_params)
+
+        selected = []
+        with self._lock:
+            batches = [None] if ids is None else [ids[s : s + 500] for s in range(0, len(ids), 500)]
+            for batch in batches:
+                batch_clauses, batch_params = list(clauses), list(params)
+                if batch is not None:
+                    batch_clauses.append(f"doc_id IN ({','.join('?' * len(batch))})")
+                    batch_params.extend(batch)
+                condition = " AND ".join(batch_clauses) or "1"
+                selected.extend(
+                    self._conn.execute(
+                        f"SELECT row, doc_id, document, metadata FROM entries WHERE {condition}", batch_params
+                    )
+                )
+            vectors, scales = self._vectors, self._scales
+
+        result: Dict[str, Any] = {"ids": [doc_id for _, doc_id, _, _ in selected]}
+        if "embeddings" in include:
+            rows = np.asarray([row for row, _, _, _ in selected], dtype=np.int64)
+            result["embeddings"] = (
+                vectors[rows].astype(np.float32) * scales[rows][:, None] if len(rows) else np.zeros((0, self.dim or 0))
+            )
+        if "documents" in include:
+            result["documents"] = [text for _, _, text, _ in selected]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(meta) for _, _, _, meta in selected]
+        return result
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE entries SET metadata = ? WHERE doc_id = ?",
+                [(json.dumps(meta), doc_id) for doc_id, meta in zip(ids, metadatas)],
+            )
+            self._conn.commit()
+
+    def delete(self, ids):
+        with self._lock:
+            rows = list(self._rows_of(list(ids)).values())
+            if not rows:
+                return
+            self._conn.executemany("DELETE FROM entries WHERE row = ?", [(r,) for r in rows])
+            self._conn.commit()
+            self._alive[rows] = False
+            self._free.extend(rows)
+
+    def search(self, query_embedding, k, where=None):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+
+        with self._lock:
+            if where:
+                sql, params = _where_sql(where)
+                rows = np.fromiter(
+                    (r for (r,) in self._conn.execute(f"SELECT row FROM entries WHERE {sql}", params)), dtype=np.int64
+                )
+            else:
+                rows = None
+            vectors, scales, alive, size = self._vectors, self._scales, self._alive, self._size
+
+        if vectors is None or k <= 0:
+            return []
+        if rows is not None:
+            if not len(rows):
+                return []
+            scores = (vectors[rows].astype(np.float32) @ query) * scales[rows]
+        else:
+            scores = np.empty(size, dtype=np.float32)
+            block = np.empty((SEARCH_BLOCK_ROWS, vectors.shape[1]), dtype=np.float32)
+            for start in range(0, size, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, size)
+                np.copyto(block[: end - start], vectors[start:end], casting="unsafe")
+                np.dot(block[: end - start], query, out=scores[start:end])
+            scores *= scales[:size]
+            scores[~alive[:size]] = -np.inf
+            rows = np.arange(size)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        if not len(top):
+            return []
+
+        found = self._by_row([int(rows[i]) for i in top])
+        return [
+            Document(page_content=found[r][1], metadata=found[r][2], id=found[r][0])
+            for r in (int(rows[i]) for i in top)
+            if r in found
+        ]
+
+    def _by_row(self, rows: List[int]) -> Dict[int, Tuple[str, str, Dict[str, Any]]]:
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            found = self._conn.execute(
+                f"SELECT row, doc_id, document, metadata FROM entries WHERE row IN ({placeholders})", rows
+            ).fetchall()
+        return {row: (doc_id, text, json.loads(meta)) for row, doc_id, text, meta in found}
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._alive[: self._size].sum())
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._scales.flush()
+            self._conn.close()
+
+    def drop(self):
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+# Open local indexes by directory, while anything still uses them
+_local_stores: "weakref.WeakValueDictionary[str, LocalVectorStore]" = weakref.WeakValueDictionary()
+_local_stores_lock = threading.Lock()
+
+
+def _local_vector_store(path: str) -> LocalVectorStore:
+    key = os.path.realpath(path)
+    with _local_stores_lock:
+        store = _local_stores.get(key)
+        if store is None or store.closed:
+            store = _local_stores[key] = LocalVectorStore(path)
+            logger.info(f"Local vector index {path}: {store.count()} chunks")
+        return store
+
+
+def open_vector_store(backend: str, storage_dir: str, collection_name: str, embedding: Embeddings) -> VectorStore:
+    """
+    The vector store of `collection_name` under `storage_dir`:
+    "chroma" (storage/chroma_db) or "local" (storage/vectors/<collection>).
+    Opening a local index that is already open returns the same instance.
+    """
+    if backend == "chroma":
+        return ChromaVectorStore(os.path.join(storage_dir, "chroma_db"), collection_name, embedding)
+    if backend == "local":
+        return _local_vector_store(os.path.join(storage_dir, "vectors", collection_name))
+    raise ValueError(f"Unknown vector store backend {backend!r} (expected one of {', '.join(BACKENDS)})")
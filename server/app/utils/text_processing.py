@@ -0,0 +1,171 @@
+import re
+from typing import List, Optional
+
+from bs4 import BeautifulSoup
+
+# Preferred places to end a chunk, best first
+CHUNK_BOUNDARIES = ("\n\n", "\n", ". ", "? ", "! ", " ")
+
+
+def chunk_text(text: str, chunk_size: int = 1500, overlap: int = 200) -> List[str]:
+    """
+    Split `text` into chunks of at most `chunk_size` characters, each
+    overlapping the previous one by about `overlap` characters.
+    Chunks end on a paragraph / line / sentence / word boundary when one
+    exists in the second half of the window.
+    """
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text] if text else []
+
+    overlap = min(overlap, chunk_size // 2)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            window = text[start + chunk_size // 2 : end]
+            for boundary in CHUNK_BOUNDARIES:
+                cut = window.rfind(boundary)
+                if cut != -1:
+                    end = start + chunk_size // 2 + cut + len(boundary)
+                    break
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+
+        # Step back for the overlap, then forward to the start of a word
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+
+    return chunks
+
+
+# -----------------------
+# Body Cleaning
+# -----------------------
+
+# Tags whose content is never readable text
+DROP_TAGS = ("script", "style", "head", "title", "meta", "noscript", "template", "svg")
+
+# Gmail / Outlook / Apple Mail markup for quoted history and signatures
+QUOTE_SELECTORS = (
+    "blockquote",
+    "div.gmail_quote",
+    "div.gmail_signature",
+    "div.yahoo_quoted",
+    "div#appendonsend",
+    "div#divRplyFwdMsg",
+    "div.moz-cite-prefix",
+)
+
+BLOCK_TAGS = ("p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "section", "article")
+
+# "On Mon, Jan 6, 2025 at 10:00 AM Alice <a@b.com> wrote:" (may wrap onto two lines)
+REPLY_HEADER_PATTERN = re.compile(r"^\s*On\b.{0,200}?\bwrote:\s*$", re.IGNORECASE | re.MULTILINE | re.DOTALL)
+FORWARD_MARKER_PATTERN = re.compile(
+    r"^\s*(-{2,}\s*(Original Message|Forwarded message)\s*-{2,}|_{10,}|From:\s.+\n\s*(Sent|Date):\s)",
+    re.IGNORECASE | re.MULTILINE,
+)
+SIGNATURE_PATTERN = re.compile(
+    r"^(--\s*|Sent from my \w+.*|Get Outlook for \w+.*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+BOILERPLATE_PATTERN = re.compile(
+    r"^.*\b(unsubscribe|view (this email )?in (your )?browser|manage (your )?(email )?preferences|"
+    r"you are receiving this|update your preferences)\b.*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+DISCLAIMER_PATTERN = re.compile(
+    r"^(CONFIDENTIALITY NOTICE|DISCLAIMER|This (e-?mail|message) and any attachments?)\b.*?(\n\s*\n|\Z)",
+    re.IGNORECASE | re.MULTILINE | re.DOTALL,
+)
+URL_PATTERN = re.compile(r"https?://\S{60,}")
+FORWARD_SUBJECT_PATTERN = re.compile(r"^\s*(fwd?|fw)\s*:", re.IGNORECASE)
+
+
+def html_to_text(html: str) -> str:
+    """Extract readable text from an HTML body (no quoted history, scripts or hidden elements)."""
+    soup = BeautifulSoup(html, "lxml")
+
+    for tag in soup(DROP_TAGS):
+        tag.decompose()
+    for selector in QUOTE_SELECTORS:
+        for tag in soup.select(selector):
+            tag.decompose()
+    for tag in soup.find_all(style=True):
+        style = tag.get("style", "").replace(" ", "").lower()
+        if "display:none" in style or "visibility:hidden" in style:
+            tag.decompose()
+
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.insert_before("\n")
+        tag.insert_after("\n")
+
+    return soup.get_text()
+
+
+def strip_quoted_text(text: str) -> str:
+    """Drop reply history: everything after a reply / forward header, and '>' quoted lines."""
+    for pattern in (REPLY_HEADER_PATTERN, FORWARD_MARKER_PATTERN):
+        match = pattern.search(text)
+        if match and match.start() > 0:
+            text = text[: match.start()]
+    return "\n".join(line for line in text.splitlines() if not line.lstrip().startswith(">"))
+
+
+def strip_signature(text: str) -> str:
+    """Cut the text at a signature delimiter ("-- ", "Sent from my iPhone", ...)."""
+    match = SIGNATURE_PATTERN.search(text)
+    if match and match.start() > 0:
+        return text[: match.start()]
+    return text
+
+
+def normalize_whitespace(text: str) -> str:
+    text = text.replace("\r\n", "\n").replace("\xa0", " ").replace("\u200c", "")
+    text = re.sub(r"[ \t\f\v]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def clean_email_body(
+    body_text: Optional[str],
+    body_html: Optional[str],
+    max_chars: int = 20_000,
+    subject: Optional[str] = None,
+) -> str:
+    """
+    Normalize an email body for embedding.
+    Uses the text/plain part when present, otherwise the text extracted
+    from HTML. Quoted reply history, signatures, disclaimers, unsubscribe
+    boilerplate and long tracking URLs are removed, and the result is
+    capped at `max_chars` (on a word boundary). For forwards (subject
+    "Fwd:" / "FW:") the forwarded message is the content, so it is kept.
+    """
+    text = body_text if body_text and body_text.strip() else (html_to_text(body_html) if body_html else "")
+    text = normalize_whitespace(text)
+    if not text:
+        return ""
+
+    if subject and FORWARD_SUBJECT_PATTERN.match(subject):
+        cleaned = SIGNATURE_PATTERN.sub("", text)
+    else:
+        cleaned = strip_signature(strip_quoted_text(text))
+    cleaned = DISCLAIMER_PATTERN.sub("", cleaned)
+    cleaned = BOILERPLATE_PATTERN.sub("", cleaned)
+    cleaned = URL_PATTERN.sub("[link]", cleaned)
+    cleaned = normalize_whitespace(cleaned)
+    if not cleaned:
+        # The message was nothing but a quote: keep the original
+        cleaned = text
+
+    if len(cleaned) > max_chars:
+        cut = cleaned.rfind(" ", 0, max_chars)
+        cleaned = cleaned[: cut if cut > max_chars // 2 else max_chars].rstrip() + " [...]"
+    return cleaned
@@ -0,0 +1,117 @@
+"""
+Dashboard load: N canned questions asked one POST /api/v1/chat at a time,
+against a single POST /api/v1/chat/batch.
+
+Reports wall-clock time, time to the first answer and the number of
+embedding calls, with fake embeddings / LLM and the answer cache off.
+
+    cd server
+    python -m benchmarks.bench_batch_chat --llm-latency 0.8 --embed-latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from typing import List, Tuple
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+import httpx
+from benchmarks.fake_embeddings import FakeEmbeddings
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from benchmarks.fake_llm import FakeLLM
+from app.core.services import get_rag_pipeline
+from app.main import app
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.chroma_store import ChromaStore
+from app.services.gmail_service import GmailService
+from app.services.rag_pipeline import RagPipeline
+from app.services.rate_limiter import AdaptiveRateLimiter
+
+DASHBOARD_QUESTIONS = [
+    "what are my open action items",
+    "which emails are waiting for my reply",
+    "what deadlines are coming up this week",
+    "any updates on the budget review",
+    "what did the client say about the invoice",
+    "summarize the launch plan feedback",
+]
+
+
+async def one_by_one(client: httpx.AsyncClient, questions: List[str]) -> Tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    for question in questions:
+        resp = await client.post("/api/v1/chat", json={"query": question})
+        resp.raise_for_status()
+        first = first or time.perf_counter() - start
+    return time.perf_counter() - start, first
+
+
+async def batched(client: httpx.AsyncClient, questions: List[str]) -> Tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    answers = 0
+    async with client.stream("POST", "/api/v1/chat/batch", json={"queries": questions}) as resp:
+        resp.raise_for_status()
+        event = None
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event == "answer":
+                json.loads(line[len("data: "):])
+                answers += 1
+                first = first or time.perf_counter() - start
+    assert answers == len(questions), f"{answers} answers for {len(questions)} questions"
+    return time.perf_counter() - start, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--questions", type=int, default=len(DASHBOARD_QUESTIONS))
+    parser.add_argument("--embed-latency", type=float, default=0.1, help="seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="seconds per LLM call")
+    args = parser.parse_args()
+
+    questions = [f"{DASHBOARD_QUESTIONS[i % len(DASHBOARD_QUESTIONS)]} (#{i})" for i in range(args.questions)]
+    mailbox = SyntheticMailbox(size=args.messages, attachment_bytes=1_000)
+    gmail = GmailService(service=FakeGmailApi(mailbox, latency=0, per_item_latency=0))
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        embeddings = FakeEmbeddings(latency=args.embed_latency)
+        chroma = ChromaStore(storage_dir=storage_dir, embedding_model=embeddings, embedding_model_name="fake-hash-64")
+        chroma.upsert_emails(gmail.fetch_messages_batch(list(mailbox.order)))
+
+        def pipeline() -> RagPipeline:
+            return RagPipeline(
+                chroma=chroma,
+                llm=FakeLLM(latency=args.llm_latency, token_latency=0),
+                limiter=AdaptiveRateLimiter("bench-llm", requests_per_minute=1_000_000),
+                cache=SemanticAnswerCache(threshold=2.0),
+            )
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                for name, scenario, suffix in (("one by one", one_by_one, ""), ("batch", batched, "?")):
+                    current = pipeline()
+                    app.dependency_overrides[get_rag_pipeline] = lambda: current
+                    calls_before = embeddings.stats["calls"]
+                    # Distinct texts per run, so the embedding cache doesn't serve the second one
+                    elapsed, first = await scenario(client, [q + suffix for q in questions])
+                    print(
+                        f"  {name:<11} {len(questions)} questions in {elapsed:6.2f}s, "
+                        f"first answer after {first:5.2f}s, {embeddings.stats['calls'] - calls_before} embedding calls"
+                    )
+
+        print(f"{args.messages} messages, LLM {args.llm_latency}s / call, embeddings {args.embed_latency}s / call:")
+        try:
+            asyncio.run(run())
+        finally:
+            app.dependency_overrides.clear()
+            chroma.lexical_index.close()
+
+
+if __name__ == "__main__":
+    main()
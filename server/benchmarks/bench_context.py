@@ -0,0 +1,102 @@
+"""
+Compare answer prompt sizes: the previous context (top 5 emails pasted at
+full length) against the token-budgeted ContextBuilder (MMR over
+CONTEXT_CANDIDATES, thread de-duplication, per-email excerpts).
+
+The synthetic mailbox is topped up with long newsletters and reply chains
+quoting earlier messages, the cases the builder is meant for.
+
+    cd server
+    python -m benchmarks.bench_context --budget 2000 --budget 1000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from email.message import EmailMessage
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from benchmarks.fake_embeddings import FakeEmbeddings
+from benchmarks.fake_gmail import WORDS, FakeGmailApi, SyntheticMailbox
+from benchmarks.load_chat import QUESTIONS
+from app.services.chroma_store import ChromaStore
+from app.services.context_builder import ContextBuilder, estimate_tokens
+from app.services.gmail_service import GmailService
+from app.services.rag_pipeline import ANSWER_PROMPT
+
+
+def add_newsletters_and_replies(mailbox: SyntheticMailbox, count: int):
+    rng = mailbox.rng
+    for n in range(count):
+        newsletter = EmailMessage()
+        newsletter["From"] = "Weekly Digest <digest@news.example.com>"
+        newsletter["To"] = "me@example.com"
+        newsletter["Subject"] = f"Weekly digest {n}: {rng.choice(WORDS)} and {rng.choice(WORDS)}"
+        newsletter.set_content("\n\n".join(mailbox._sentence(rng.randint(20, 40)) for _ in range(120)))
+        mailbox.add_message(mime=newsletter)
+
+        original = "\n\n".join(mailbox._sentence(25) for _ in range(8))
+        for reply in range(3):
+            msg = EmailMessage()
+            msg["From"] = f"Colleague {reply} <colleague{reply}@example.com>"
+            msg["To"] = "me@example.com"
+            msg["Subject"] = f"Re: {WORDS[n % 10]} {WORDS[(n + 3) % 10]} plan"
+            # Forwarded without quote markers, so the cleaner keeps the repeated text
+            msg.set_content(f"{mailbox._sentence(12)}\n\n{original}")
+            mailbox.add_message(mime=msg)
+
+
+def naive_context(docs) -> str:
+    parts = []
+    for i, doc in enumerate(docs[:5], 1):
+        meta = doc.metadata
+        parts.append(f"Email {i} from {meta.get('sender')} (Subject: {meta.get('subject')}):\n{doc.page_content}\n---")
+    return "\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--newsletters", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--budget", type=int, action="append", help="token budgets to try (repeatable)")
+    args = parser.parse_args()
+
+    mailbox = SyntheticMailbox(size=args.messages, attachment_bytes=1_000)
+    add_newsletters_and_replies(mailbox, args.newsletters)
+    gmail = GmailService(service=FakeGmailApi(mailbox, latency=0, per_item_latency=0))
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        chroma = ChromaStore(storage_dir=storage_dir, embedding_model=FakeEmbeddings(), embedding_model_name="fake-hash-64")
+        chroma.upsert_emails(gmail.fetch_messages_batch(list(mailbox.order)))
+
+        retrieved = []
+        for question in QUESTIONS:
+            embedding = chroma.embed_query(question)
+            docs = chroma.query_similar_emails(question, n_results=args.candidates, query_embedding=embedding)
+            retrieved.append((question, embedding, docs, chroma.message_vectors(docs)))
+        chroma.lexical_index.close()
+
+    naive = [estimate_tokens(ANSWER_PROMPT.format(context=naive_context(d), question=q)) for q, _, d, _ in retrieved]
+    print(f"{len(mailbox.order)} messages, {len(QUESTIONS)} questions")
+    print(f"  top-5 full text       prompt tokens mean {statistics.mean(naive):7.0f}, max {max(naive):6d}")
+
+    for budget in args.budget or [3000, 2000, 1000]:
+        builder = ContextBuilder(token_budget=budget)
+        tokens, selected, dropped, build_ms = [], [], [], []
+        for question, embedding, docs, vectors in retrieved:
+            start = time.perf_counter()
+            packed = builder.build(question, docs, embedding, vectors)
+            build_ms.append((time.perf_counter() - start) * 1000)
+            tokens.append(estimate_tokens(ANSWER_PROMPT.format(context=packed.text, question=question)))
+            selected.append(len(packed.docs))
+            dropped.append(len(packed.duplicates))
+        print(
+            f"  budget {budget:>5} tokens   prompt tokens mean {statistics.mean(tokens):7.0f}, max {max(tokens):6d}, "
+            f"{statistics.mean(selected):4.1f} emails, {statistics.mean(dropped):3.1f} redundant dropped, "
+            f"build {statistics.mean(build_ms):5.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
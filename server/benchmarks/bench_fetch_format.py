@@ -0,0 +1,68 @@
+"""
+Compare the two `messages.get` formats GmailService can fetch with:
+RAW (the whole RFC822 message, attachments included) and FULL with a
+`fields` mask (headers and text parts only).
+
+Reports bytes on the wire and parse time per message, over the recorded
+fixtures in benchmarks/corpus/*.eml plus synthetic mail, a share of which
+carries an attachment of --attachment-bytes.
+
+    cd server
+    python -m benchmarks.bench_fetch_format --synthetic 500 --attachment-bytes 2000000
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import time
+from email import policy
+from email.parser import BytesParser
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from app.services.gmail_service import GmailService
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def build_mailbox(synthetic: int, attachment_bytes: int) -> SyntheticMailbox:
+    mailbox = SyntheticMailbox(size=synthetic, attachment_bytes=attachment_bytes)
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.eml"))):
+        with open(path, "rb") as f:
+            mailbox.add_message(mime=BytesParser(policy=policy.default).parse(f))
+    return mailbox
+
+
+def measure(name: str, svc: GmailService, ids):
+    wire_bytes, parse_ms = [], []
+    for message_id in ids:
+        response = svc._get_message_request(message_id).execute()
+        wire_bytes.append(len(json.dumps(response)))
+        start = time.perf_counter()
+        svc.parse_message(response)
+        parse_ms.append((time.perf_counter() - start) * 1000)
+
+    print(
+        f"  {name:<5} {sum(wire_bytes) / 2**20:8.1f} MiB total, "
+        f"{statistics.mean(wire_bytes) / 1024:8.1f} KiB/msg (max {max(wire_bytes) / 1024:8.1f} KiB), "
+        f"parse {statistics.mean(parse_ms):6.2f} ms/msg (p95 {statistics.quantiles(parse_ms, n=20)[-1]:6.2f} ms)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--synthetic", type=int, default=300, help="synthetic messages added to the fixtures")
+    parser.add_argument("--attachment-bytes", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    mailbox = build_mailbox(args.synthetic, args.attachment_bytes)
+    api = FakeGmailApi(mailbox, latency=0, per_item_latency=0)
+    ids = list(mailbox.order)
+    print(f"{len(ids)} messages ({args.attachment_bytes / 2**20:.1f} MiB attachments on 1 in 5 synthetic):")
+    for fmt in ("raw", "full"):
+        measure(fmt, GmailService(service=api, fetch_format=fmt), ids)
+
+
+if __name__ == "__main__":
+    main()
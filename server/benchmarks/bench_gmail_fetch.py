@@ -0,0 +1,59 @@
+"""
+Compare serial `messages.get` fetching against batched fetching.
+
+    cd server
+    python -m benchmarks.bench_gmail_fetch --messages 500 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import time
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from app.services.gmail_service import GmailService
+
+
+def run_serial(svc: GmailService, ids):
+    docs = []
+    for message_id in ids:
+        try:
+            docs.append(svc.fetch_message_details(message_id))
+        except Exception:
+            pass
+    return docs
+
+
+def run_batched(svc: GmailService, ids, batch_size: int):
+    return svc.fetch_messages_batch(ids, batch_size=batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per HTTP round-trip")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of sub-requests failing with 429")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    mailbox = SyntheticMailbox(size=args.messages, attachment_bytes=20_000)
+    ids = list(mailbox.order)
+
+    modes = [("batched", lambda svc: run_batched(svc, ids, args.batch_size))]
+    if not args.skip_serial:
+        modes.insert(0, ("serial", lambda svc: run_serial(svc, ids)))
+
+    for name, fn in modes:
+        api = FakeGmailApi(mailbox, latency=args.latency, error_rate=args.error_rate)
+        svc = GmailService(service=api)
+        start = time.perf_counter()
+        docs = fn(svc)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>8}: {len(docs)}/{len(ids)} messages in {elapsed:.2f}s "
+            f"({len(docs) / elapsed:.1f} msg/s, {api.stats['round_trips']} round-trips, "
+            f"{api.stats['errors']} injected errors)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Tune the embedding rate limiter offline against a fake backend that returns
+simulated 429s. Runs on a virtual clock, so minutes of quota behaviour
+replay in well under a second.
+
+    cd server
+    python -m benchmarks.bench_rate_limiter --texts 2000 --quota 100
+"""
+import argparse
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from benchmarks.fake_embeddings import FakeEmbeddings, VirtualClock
+from app.services.rate_limiter import AdaptiveRateLimiter, RateLimitedEmbeddings, is_rate_limit_error
+
+
+def run_legacy(texts, quota: int, latency: float):
+    """The previous upsert loop: batches of 2, a fixed 10s sleep, linear backoff."""
+    clock = VirtualClock()
+    backend = FakeEmbeddings(quota_per_minute=quota, latency=latency, clock=clock.time, sleep=clock.sleep)
+    done = 0
+    for i in range(0, len(texts), 2):
+        batch = texts[i : i + 2]
+        for attempt in range(3):
+            try:
+                backend.embed_documents(batch)
+                done += len(batch)
+                break
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < 2:
+                    clock.sleep((attempt + 1) * 10)
+        if i + 2 < len(texts):
+            clock.sleep(10.0)
+    return done, clock.now, backend.stats
+
+
+def run_adaptive(texts, quota: int, latency: float, rpm: int, max_batch: int):
+    clock = VirtualClock()
+    backend = FakeEmbeddings(quota_per_minute=quota, latency=latency, clock=clock.time, sleep=clock.sleep)
+    limiter = AdaptiveRateLimiter(
+        "bench",
+        requests_per_minute=rpm,
+        max_batch=max_batch,
+        initial_batch=4,
+        increase=2,
+        max_retries=20,
+        clock=clock.time,
+        sleep=clock.sleep,
+    )
+    embeddings = RateLimitedEmbeddings(backend, limiter)
+    vectors = embeddings.embed_documents(texts)
+    return len(vectors), clock.now, {**backend.stats, **limiter.stats, "final_batch": limiter.batch_size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--quota", type=int, default=100, help="simulated texts per minute allowed by the backend")
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated seconds per embedding call")
+    parser.add_argument("--max-batch", type=int, default=100)
+    args = parser.parse_args()
+
+    texts = [f"email number {i} about project budget review" for i in range(args.texts)]
+
+    done, elapsed, stats = run_legacy(texts, args.quota, args.latency)
+    print(f"{'legacy (2 / 10s)':>24}: {done} texts in {elapsed:8.1f}s simulated ({60 * done / elapsed:6.1f}/min) {stats}")
+
+    # Configured limit below, at, and above the real quota
+    for rpm in (args.quota // 2, args.quota, args.quota * 2):
+        done, elapsed, stats = run_adaptive(texts, args.quota, args.latency, rpm, args.max_batch)
+        label = f"adaptive rpm={rpm}"
+        print(f"{label:>24}: {done} texts in {elapsed:8.1f}s simulated ({60 * done / elapsed:6.1f}/min) {stats}")
+
+
+if __name__ == "__main__":
+    main()
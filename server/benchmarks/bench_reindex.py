@@ -0,0 +1,103 @@
+"""
+Rebuilding the index after a model / chunking change: a full re-sync from
+Gmail against a re-index from the local message store (reindex.py).
+
+A mailbox is synced once (filling the message store), then the index is
+rebuilt three ways, against a fake Gmail API and fake embedding model
+with simulated latency:
+
+- re-sync:          full sync from Gmail with a new embedding model
+- re-index (model): re-index from the store with a new embedding model
+- re-index (chunks): re-index with the same model, e.g. after a chunking or
+                     cleaning change that leaves most chunks unchanged
+                     (they come from the embedding cache)
+
+Also reports the store's compression and raw read speed.
+
+    cd server
+    python -m benchmarks.bench_reindex --messages 2000 --gmail-latency 0.2 --embed-latency 0.3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from benchmarks.fake_embeddings import FakeEmbeddings
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from app.services import sync_service
+from app.services.chroma_store import ChromaStore
+from app.services.gmail_service import GmailService
+from app.services.message_store import MessageStore
+from app.services.sync_service import SyncService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--gmail-latency", type=float, default=0.2, help="seconds per Gmail round-trip")
+    parser.add_argument("--embed-latency", type=float, default=0.3, help="seconds per embedding call")
+    parser.add_argument("--backend", default="local", choices=("chroma", "local"))
+    args = parser.parse_args()
+    # Nothing else searches these stores
+    sync_service.RETIRE_DELAY_SECONDS = 0.0
+
+    mailbox = SyntheticMailbox(size=args.messages, attachment_bytes=20_000)
+    api = FakeGmailApi(mailbox, latency=args.gmail_latency, per_item_latency=0.001)
+    gmail = GmailService(service=api)
+    embeddings = FakeEmbeddings(latency=args.embed_latency, per_text_latency=0.0005)
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        store_path = os.path.join(storage_dir, "messages.sqlite")
+
+        def service(model: str, collection: str, message_store_path=store_path) -> SyncService:
+            chroma = ChromaStore(
+                storage_dir=storage_dir,
+                collection_name=collection,
+                embedding_model=embeddings,
+                embedding_model_name=model,
+                vector_backend=args.backend,
+            )
+            return SyncService(
+                gmail,
+                chroma,
+                state_path=os.path.join(storage_dir, f"{collection}_state.json"),
+                checkpoint_path=os.path.join(storage_dir, f"{collection}_checkpoint.json"),
+                message_store_path=message_store_path,
+            )
+
+        print(f"Initial sync of {args.messages} messages...")
+        service("fake-a", "inbox").run(full_sync=True)
+
+        store = MessageStore(store_path)
+        stats = store.stats()
+        start = time.perf_counter()
+        read = sum(len(batch) for batch in store.iter_emails())
+        elapsed = time.perf_counter() - start
+        store.close()
+        print(
+            f"  message store: {stats['messages']} messages, {stats['bytes'] / 2**20:.1f} MiB -> "
+            f"{stats['stored_bytes'] / 2**20:.1f} MiB ({stats['bytes'] / max(stats['stored_bytes'], 1):.1f}x), "
+            f"file {os.path.getsize(store_path) / 2**20:.1f} MiB; read {read / elapsed:,.0f} msg/s"
+        )
+
+        runs = {
+            "re-sync": lambda: service("fake-b", "resync", message_store_path=None).run(full_sync=True),
+            "re-index (model)": lambda: service("fake-c", "inbox").reindex(),
+            "re-index (chunks)": lambda: service("fake-a", "inbox").reindex(),
+        }
+        for name, run in runs.items():
+            gmail_before = api.stats["sub_requests"]
+            calls_before = embeddings.stats["calls"]
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(
+                f"  {name:<18} {elapsed:7.2f}s ({args.messages / elapsed:7.1f} msg/s), "
+                f"{api.stats['sub_requests'] - gmail_before:5d} Gmail requests, "
+                f"{embeddings.stats['calls'] - calls_before:4d} embedding calls"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare retrieval latency and quality of vector-only search, hybrid
+(BM25 + vector, rank-fused) search and hybrid search with query pre-filters.
+
+Builds a synthetic index of N messages with offline hash embeddings, plants
+"needle" messages that carry an exact token (an invoice number) and asks
+questions like "what did alice@acme.com send about invoice 4471". A query
+scores a hit when its needle is among the top-k results.
+
+    cd server
+    python -m benchmarks.bench_retrieval --sizes 10000 100000 --queries 100
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from benchmarks.fake_embeddings import FakeEmbeddings
+from app.core.config import settings
+from app.models.domain import EmailDocument
+from app.services.chroma_store import ChromaStore
+from app.services.query_filters import QueryFilters, parse_query
+
+TOPICS = (
+    "project meeting invoice deadline review budget report schedule update client launch contract "
+    "design release feedback travel payment team quarter roadmap hiring offer agenda notes approval"
+).split()
+
+
+def synthetic_corpus(size: int, needles: int, seed: int = 11) -> Tuple[List[EmailDocument], List[Tuple[str, str]]]:
+    """`size` messages, plus (query, expected gmail_id) pairs for `needles` of them."""
+    rng = random.Random(seed)
+    vocabulary = TOPICS + [f"w{i}" for i in range(3000)]
+    senders = [f"person{i}@company{i % 40}.com" for i in range(400)]
+    now = datetime.now()
+
+    emails, queries = [], []
+    needle_indexes = set(rng.sample(range(size), needles))
+    for i in range(size):
+        sender = rng.choice(senders)
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(40, 160))]
+        subject = " ".join(rng.choice(TOPICS) for _ in range(3)).capitalize()
+        # Ordinary mail mentions invoices too, with other numbers
+        words.insert(rng.randrange(len(words)), f"invoice {rng.randint(1000, 9999)}")
+        if i in needle_indexes:
+            number = 10_000 + i
+            words.insert(rng.randrange(len(words)), f"invoice {number} is attached")
+            queries.append((f"what did {sender} send about invoice {number}", f"m{i}"))
+        emails.append(
+            EmailDocument(
+                gmail_id=f"m{i}",
+                thread_id=f"t{i // 3}",
+                sender=f"Person <{sender}>",
+                recipients=["me@example.com"],
+                subject=subject,
+                body_text=" ".join(words),
+                timestamps=now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+                labels=["INBOX", "UNREAD"] if i % 3 else ["INBOX"],
+            )
+        )
+    return emails, queries
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run_mode(store: ChromaStore, queries, mode: str, k: int):
+    settings.HYBRID_SEARCH = mode != "vector"
+    latencies, hits, reciprocal_ranks = [], 0, []
+    for query, expected in queries:
+        embedding = store.embed_query(query)
+        filters = parse_query(query) if mode == "hybrid+filters" else QueryFilters(text=query)
+        start = time.perf_counter()
+        docs = store.query_similar_emails(query, n_results=k, query_embedding=embedding, filters=filters)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids = [d.metadata.get("gmail_id") for d in docs]
+        if expected in ids:
+            hits += 1
+            reciprocal_ranks.append(1 / (ids.index(expected) + 1))
+        else:
+            reciprocal_ranks.append(0.0)
+    print(
+        f"  {mode:<15} recall@{k} {hits / len(queries):6.1%}  MRR {statistics.mean(reciprocal_ranks):.3f}  "
+        f"latency p50 {percentile(latencies, 0.5):6.1f} ms  p95 {percentile(latencies, 0.95):6.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=64, help="fake embedding dimension")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        emails, queries = synthetic_corpus(size, min(args.queries, size))
+        with tempfile.TemporaryDirectory() as storage_dir:
+            store = ChromaStore(storage_dir=storage_dir, embedding_model=FakeEmbeddings(dim=args.dim))
+            start = time.perf_counter()
+            for i in range(0, len(emails), 2000):
+                store.upsert_emails(emails[i : i + 2000], batch_size=2000)
+            print(
+                f"{size:,} messages ({store.lexical_index.count():,} chunks) indexed "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+            for mode in ("vector", "hybrid", "hybrid+filters"):
+                run_mode(store, queries, mode, args.k)
+            store.lexical_index.close()
+
+
+if __name__ == "__main__":
+    main()
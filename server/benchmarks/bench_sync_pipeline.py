@@ -0,0 +1,75 @@
+"""
+Compare the serial sync (list every ID, fetch every message, then upsert)
+with the streaming SyncPipeline, against a fake Gmail API and fake
+embedding model with simulated latency.
+
+Reports messages/s and per-stage busy time; with --memory, also the peak
+Python heap growth (tracemalloc, which slows parsing down noticeably). The
+pipeline's peak should stay flat as the mailbox grows.
+
+    cd server
+    python -m benchmarks.bench_sync_pipeline --sizes 500 2000 --gmail-latency 0.2 --embed-latency 0.5
+    python -m benchmarks.bench_sync_pipeline --sizes 500 2000 --memory
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from benchmarks.fake_embeddings import FakeEmbeddings
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from app.services.chroma_store import ChromaStore
+from app.services.gmail_service import GmailService
+from app.services.sync_pipeline import SyncPipeline
+
+
+def serial_sync(gmail: GmailService, chroma: ChromaStore) -> int:
+    ids = [m["id"] for m in gmail.list_messages(max_results=None)]
+    emails = gmail.fetch_messages_batch(ids)
+    chroma.upsert_emails(emails)
+    return len(emails)
+
+
+def pipelined_sync(gmail: GmailService, chroma: ChromaStore) -> int:
+    pipeline = SyncPipeline(gmail, chroma)
+    pages = ([m["id"] for m in page] for page, _ in gmail.iter_message_pages())
+    stats = pipeline.run(pages)
+    print("    " + ", ".join(f"{name} {s.busy_seconds:5.2f}s" for name, s in stats.items()))
+    return stats["write"].messages
+
+
+def measure(name: str, sync, size: int, args):
+    mailbox = SyntheticMailbox(size=size, attachment_bytes=20_000)
+    gmail = GmailService(service=FakeGmailApi(mailbox, latency=args.gmail_latency, per_item_latency=0.001))
+    embeddings = FakeEmbeddings(latency=args.embed_latency, per_text_latency=0.0005)
+    with tempfile.TemporaryDirectory() as storage_dir:
+        chroma = ChromaStore(storage_dir=storage_dir, embedding_model=embeddings, embedding_model_name="fake-hash-64")
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        synced = sync(gmail, chroma)
+        elapsed = time.perf_counter() - start
+        memory = ""
+        if args.memory:
+            memory = f", peak heap +{tracemalloc.get_traced_memory()[1] / 2**20:6.1f} MiB"
+            tracemalloc.stop()
+        chroma.lexical_index.close()
+    print(f"  {name:<9} {size:>6} msgs: {synced} synced in {elapsed:6.2f}s -> {synced / elapsed:7.1f} msg/s{memory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000])
+    parser.add_argument("--gmail-latency", type=float, default=0.2, help="seconds per Gmail round-trip")
+    parser.add_argument("--embed-latency", type=float, default=0.5, help="seconds per embedding call")
+    parser.add_argument("--memory", action="store_true", help="track peak heap growth with tracemalloc")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        measure("serial", serial_sync, size, args)
+        measure("pipeline", pipelined_sync, size, args)
+
+
+if __name__ == "__main__":
+    main()
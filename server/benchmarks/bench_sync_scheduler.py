@@ -0,0 +1,117 @@
+"""
+Freshness against Gmail API spend for background sync policies, simulated
+over days of mail in virtual time.
+
+Mail arrives as a Poisson process: busy on weekday working hours, with
+occasional bursts (a thread taking off), and quiet at night. Each check
+costs one `getProfile` call; a check that finds new history also runs an
+incremental sync (`history.list`, plus a batch fetch of the new messages,
+the same for every policy). Staleness is how long a message waits between
+arriving and the check that syncs it.
+
+Fixed intervals are compared with the adaptive MailboxSchedule the
+SyncScheduler uses.
+
+    cd server
+    python -m benchmarks.bench_sync_scheduler --days 7
+"""
+import argparse
+import bisect
+import random
+import statistics
+from typing import Callable, Dict, List, Optional
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from app.core.config import settings
+from app.services.sync_scheduler import MailboxSchedule
+
+DAY = 86_400.0
+HOUR = 3_600.0
+
+
+def arrivals(days: int, busy_per_hour: float, quiet_per_hour: float, seed: int = 3) -> List[float]:
+    rng = random.Random(seed)
+    times: List[float] = []
+    t = 0.0
+    while t < days * DAY:
+        hour = (t % DAY) / HOUR
+        weekday = int(t // DAY) % 7 < 5
+        rate = busy_per_hour if weekday and 9 <= hour < 18 else quiet_per_hour
+        t += rng.expovariate(rate / HOUR)
+        times.append(t)
+        if rng.random() < 0.05:
+            # A burst: replies trickling in over the next minutes
+            times.extend(t + rng.uniform(0, 600) for _ in range(rng.randint(2, 6)))
+    return sorted(x for x in times if x < days * DAY)
+
+
+def simulate(mail: List[float], horizon: float, next_check: Callable[[float, Optional[bool]], float]) -> Dict[str, float]:
+    checks = syncs = 0
+    lags: List[float] = []
+    synced = 0                      # index of the first message not yet synced
+    t = next_check(0.0, None)
+    while t < horizon:
+        checks += 1
+        arrived = bisect.bisect_right(mail, t)
+        changed = arrived > synced
+        if changed:
+            syncs += 1
+            lags.extend(t - a for a in mail[synced:arrived])
+            synced = arrived
+        t = next_check(t, changed)
+    return {
+        "api_calls": checks + syncs,
+        "checks": checks,
+        "syncs": syncs,
+        "mean_lag": statistics.mean(lags) if lags else 0.0,
+        "p95_lag": statistics.quantiles(lags, n=20)[-1] if len(lags) > 1 else 0.0,
+    }
+
+
+def fixed(interval: float) -> Callable[[float, Optional[bool]], float]:
+    return lambda now, changed: now + interval
+
+
+def adaptive(min_interval: float, max_interval: float, backoff: float, jitter: float) -> Callable[[float, Optional[bool]], float]:
+    schedule = MailboxSchedule(
+        "bench", min_interval=min_interval, max_interval=max_interval, backoff=backoff, jitter=jitter, interval=min_interval
+    )
+    rng = random.Random(1)
+
+    def next_check(now: float, changed: Optional[bool]) -> float:
+        # The first call (changed=None) just starts the schedule
+        return schedule.reschedule(now, True if changed is None else changed, rng)
+
+    return next_check
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--busy-per-hour", type=float, default=12.0, help="mail arrival rate in working hours")
+    parser.add_argument("--quiet-per-hour", type=float, default=0.5, help="arrival rate otherwise")
+    parser.add_argument("--min-interval", type=float, default=settings.SYNC_POLL_MIN_SECONDS)
+    parser.add_argument("--max-interval", type=float, default=settings.SYNC_POLL_MAX_SECONDS)
+    parser.add_argument("--backoff", type=float, default=settings.SYNC_POLL_BACKOFF)
+    parser.add_argument("--jitter", type=float, default=settings.SYNC_POLL_JITTER)
+    args = parser.parse_args()
+
+    mail = arrivals(args.days, args.busy_per_hour, args.quiet_per_hour)
+    horizon = args.days * DAY
+    print(f"{len(mail)} messages over {args.days} days; per day: API calls (checks + syncs), staleness")
+
+    policies = {f"fixed {int(s)}s": fixed(s) for s in (60, 300, 900)}
+    policies[f"adaptive {int(args.min_interval)}-{int(args.max_interval)}s"] = adaptive(
+        args.min_interval, args.max_interval, args.backoff, args.jitter
+    )
+    for name, policy in policies.items():
+        r = simulate(mail, horizon, policy)
+        print(
+            f"  {name:<18} {r['api_calls'] / args.days:7.0f} calls/day ({r['checks'] / args.days:5.0f} checks, "
+            f"{r['syncs'] / args.days:4.0f} syncs)  staleness mean {r['mean_lag'] / 60:5.1f} min, "
+            f"p95 {r['p95_lag'] / 60:5.1f} min"
+        )
+
+
+if __name__ == "__main__":
+    main()
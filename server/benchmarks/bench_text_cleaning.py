@@ -0,0 +1,87 @@
+"""
+Measure how much body cleaning shrinks what gets embedded, and what it
+costs per message.
+
+Runs over the hand-written fixtures in benchmarks/corpus/*.eml plus a
+synthetic mailbox (HTML-only mail, attachments, long quoted threads).
+
+    cd server
+    python -m benchmarks.bench_text_cleaning --synthetic 500 --price-per-mtok 0.15
+"""
+import argparse
+import base64
+import glob
+import os
+import time
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from app.core.config import settings
+from app.services.gmail_service import GmailService
+from app.utils.text_processing import clean_email_body
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+CHARS_PER_TOKEN = 4  # rough estimate for English text
+
+
+def load_corpus(svc: GmailService):
+    docs = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.eml"))):
+        with open(path, "rb") as f:
+            raw = base64.urlsafe_b64encode(f.read()).decode("ascii")
+        docs.append((os.path.basename(path), svc._parse_raw_message({"id": os.path.basename(path), "threadId": "corpus", "raw": raw})))
+    return docs
+
+
+def measure(docs, price_per_mtok: float, verbose: bool):
+    totals = {"raw": 0, "before": 0, "after": 0, "seconds": 0.0}
+    for name, doc in docs:
+        raw_body = len(doc.body_text or "") + len(doc.body_html or "")
+        # What used to be embedded: subject + text/plain part (empty for HTML-only mail)
+        before = len(f"Subject: {doc.subject}\n\n{doc.body_text or ''}")
+
+        start = time.perf_counter()
+        cleaned = clean_email_body(doc.body_text, doc.body_html, max_chars=settings.MAX_BODY_CHARS, subject=doc.subject)
+        totals["seconds"] += time.perf_counter() - start
+        after = len(f"Subject: {doc.subject}\n\n{cleaned}")
+
+        totals["raw"] += raw_body
+        totals["before"] += before
+        totals["after"] += after
+        if verbose:
+            print(f"  {name:<28} raw body {raw_body:>7} B | embedded before {before:>6} B -> after {after:>6} B")
+
+    n = len(docs)
+    tokens_before = totals["before"] / CHARS_PER_TOKEN
+    tokens_after = totals["after"] / CHARS_PER_TOKEN
+    print(
+        f"  {n} messages: raw bodies {totals['raw'] / n:,.0f} B/msg, embedded {totals['before'] / n:,.0f} -> "
+        f"{totals['after'] / n:,.0f} B/msg ({totals['before'] / max(totals['after'], 1):.1f}x smaller)"
+    )
+    print(
+        f"  ~{tokens_before / n:,.0f} -> ~{tokens_after / n:,.0f} tokens/msg, "
+        f"${price_per_mtok * tokens_before / n / 1e6 * 1000:.4f} -> ${price_per_mtok * tokens_after / n / 1e6 * 1000:.4f} per 1k msgs, "
+        f"cleaning {totals['seconds'] / n * 1000:.2f} ms/msg"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--synthetic", type=int, default=300, help="synthetic messages to add to the corpus")
+    parser.add_argument("--price-per-mtok", type=float, default=0.15, help="embedding price in $ per 1M input tokens")
+    args = parser.parse_args()
+
+    mailbox = SyntheticMailbox(size=args.synthetic, attachment_bytes=1_000)
+    svc = GmailService(service=FakeGmailApi(mailbox, latency=0, per_item_latency=0))
+
+    print("Fixture corpus:")
+    measure(load_corpus(svc), args.price_per_mtok, verbose=True)
+
+    if args.synthetic:
+        print("Synthetic mailbox:")
+        docs = svc.fetch_messages_batch(list(mailbox.order))
+        measure([(d.gmail_id, d) for d in docs], args.price_per_mtok, verbose=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Vector store backends side by side: Chroma against the local int8
+memory-mapped index (app/services/vector_store.py).
+
+For each size, a collection of N emails (one chunk each, clustered random
+vectors standing in for embeddings) is built in one child process, then
+reopened in another - a cold start - which runs unfiltered and
+sender-filtered top-k queries. Reports build time, open time, query
+latency, recall@k against exact float32 search, RSS added by the open
+index and its size on disk.
+
+    cd server
+    python -m benchmarks.bench_vector_store --sizes 10000 100000 500000 --dim 768
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+from app.services.vector_store import BACKENDS, open_vector_store
+
+SENDERS = 400
+TOPICS = 200
+UPSERT_BATCH = 1_000
+
+
+def corpus_batches(size: int, dim: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    (first index, vectors) batches of emails gathered around topic
+    centroids, like real mail embeddings; generated batch by batch so large
+    corpora fit in memory.
+    """
+    centroids = np.random.default_rng(5).standard_normal((TOPICS, dim), dtype=np.float32)
+    for start in range(0, size, UPSERT_BATCH):
+        rng = np.random.default_rng((5, start))
+        n = min(UPSERT_BATCH, size - start)
+        yield start, centroids[rng.integers(0, TOPICS, n)] + 0.8 * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def query_vectors(count: int, dim: int, size: int) -> np.ndarray:
+    """Queries near randomly picked emails."""
+    rng = np.random.default_rng(7)
+    picks = rng.integers(0, size, count)
+    queries = np.empty((count, dim), dtype=np.float32)
+    for start, vectors in corpus_batches(size, dim):
+        inside = (picks >= start) & (picks < start + len(vectors))
+        queries[inside] = vectors[picks[inside] - start]
+    return queries + 0.5 * rng.standard_normal((count, dim), dtype=np.float32)
+
+
+def metadata(i: int) -> Dict[str, Any]:
+    return {
+        "gmail_id": f"m{i}",
+        "thread_id": f"t{i // 3}",
+        "sender_email": f"person{i % SENDERS}@example.com",
+        "timestamp_epoch": 1_700_000_000 + i * 60,
+        "labels": "INBOX",
+        "label_INBOX": True,
+        "chunk_index": 0,
+    }
+
+
+def rss_mib() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def dir_mib(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files) / 2**20
+
+
+def exact_top_k(queries: np.ndarray, size: int, k: int) -> List[set]:
+    """IDs of the true top `k` of each query (float32 cosine over the whole corpus)."""
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = np.empty((len(queries), size), dtype=np.float32)
+    for start, vectors in corpus_batches(size, queries.shape[1]):
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores[:, start : start + len(vectors)] = queries @ vectors.T
+    return [{f"m{i}#0" for i in np.argpartition(-row, k)[:k]} for row in scores]
+
+
+# -----------------------
+# Child processes
+# -----------------------
+
+def build(backend: str, directory: str, size: int, dim: int) -> Dict[str, float]:
+    store = open_vector_store(backend, directory, "bench", embedding=None)
+    elapsed = 0.0
+    for first, vectors in corpus_batches(size, dim):
+        ids = range(first, first + len(vectors))
+        embeddings = vectors.tolist()
+        start = time.perf_counter()
+        store.upsert(
+            ids=[f"m{i}#0" for i in ids],
+            embeddings=embeddings,
+            documents=[f"Subject: email {i}\n\nbody of email {i}" for i in ids],
+            metadatas=[metadata(i) for i in ids],
+        )
+        elapsed += time.perf_counter() - start
+    store.close()
+    return {"build_s": elapsed}
+
+
+def query(backend: str, directory: str, size: int, dim: int, queries: int, k: int) -> Dict[str, float]:
+    test_queries = query_vectors(queries, dim, size)
+    expected = exact_top_k(test_queries, size, k)
+    baseline = rss_mib()
+
+    start = time.perf_counter()
+    store = open_vector_store(backend, directory, "bench", embedding=None)
+    store.search(test_queries[0].tolist(), k)
+    open_s = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for query_vector, truth in zip(test_queries, expected):
+        start = time.perf_counter()
+        hits = store.search(query_vector.tolist(), k)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({d.id for d in hits} & truth) / k)
+
+    filtered = []
+    for n, query_vector in enumerate(test_queries):
+        where = {"sender_email": f"person{n % SENDERS}@example.com"}
+        start = time.perf_counter()
+        store.search(query_vector.tolist(), k, where)
+        filtered.append(time.perf_counter() - start)
+
+    result = {
+        "open_s": open_s,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1] * 1000,
+        "filtered_p50_ms": statistics.median(filtered) * 1000,
+        "recall": statistics.mean(recalls),
+        "rss_mib": rss_mib() - baseline,
+    }
+    store.close()
+    return result
+
+
+def run_child(*args: str) -> Dict[str, float]:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_vector_store", "--child", *args],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--child", nargs=3, metavar=("PHASE", "BACKEND", "DIR"), help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        phase, backend, directory = args.child
+        if phase == "build":
+            result = build(backend, directory, args.size, args.dim)
+        else:
+            result = query(backend, directory, args.size, args.dim, args.queries, args.k)
+        print(json.dumps(result))
+        return
+
+    print(f"dim {args.dim}, top {args.k}, {args.queries} queries")
+    for size in args.sizes:
+        for backend in args.backends:
+            with tempfile.TemporaryDirectory() as directory:
+                common = ["--size", str(size), "--dim", str(args.dim), "--queries", str(args.queries), "--k", str(args.k)]
+                built = run_child("build", backend, directory, *common)
+                disk = dir_mib(directory)
+                queried = run_child("query", backend, directory, *common)
+            print(
+                f"  {size:>7} emails  {backend:<6}  build {built['build_s']:7.1f}s  open {queried['open_s']:6.2f}s  "
+                f"query p50 {queried['p50_ms']:7.2f} ms  p95 {queried['p95_ms']:7.2f} ms  "
+                f"filtered p50 {queried['filtered_p50_ms']:7.2f} ms  recall@{args.k} {queried['recall']:.3f}  "
+                f"RSS +{queried['rss_mib']:6.0f} MiB  disk {disk:7.0f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
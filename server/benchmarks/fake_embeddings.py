@@ -0,0 +1,100 @@
+"""
+Deterministic, offline embedding model with an optional simulated quota.
+
+Vectors are feature-hashed bags of words, so texts sharing words land close
+together and retrieval benchmarks behave sensibly. When `quota_per_minute`
+is set, calls that would exceed it in a sliding 60s window fail with a
+429-style error carrying `retry_after`, like the Gemini API does.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class VirtualClock:
+    """Simulated time, so quota behaviour can be replayed instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        with self.lock:
+            self.now += max(0.0, seconds)
+
+
+class FakeQuotaError(Exception):
+    code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"429 RESOURCE_EXHAUSTED: quota exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def hash_embedding(text: str, dim: int) -> List[float]:
+    vec = [0.0] * dim
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(
+        self,
+        dim: int = 64,
+        latency: float = 0.0,
+        per_text_latency: float = 0.0,
+        quota_per_minute: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.dim = dim
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.quota_per_minute = quota_per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self.window = deque()  # (timestamp, cost)
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "texts": 0, "rejected": 0}
+
+    def _charge(self, cost: int):
+        if self.quota_per_minute is None:
+            return
+        with self.lock:
+            now = self.clock()
+            while self.window and self.window[0][0] <= now - 60:
+                self.window.popleft()
+            used = sum(c for _, c in self.window)
+            if used + cost > self.quota_per_minute:
+                self.stats["rejected"] += 1
+                retry_after = max(0.1, self.window[0][0] + 60 - now) if self.window else 1.0
+                raise FakeQuotaError(retry_after)
+            self.window.append((now, cost))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._charge(len(texts))
+        self.sleep(self.latency + self.per_text_latency * len(texts))
+        with self.lock:
+            self.stats["calls"] += 1
+            self.stats["texts"] += len(texts)
+        return [hash_embedding(t, self.dim) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
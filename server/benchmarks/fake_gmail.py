@@ -0,0 +1,476 @@
+"""
+Offline stand-in for the Gmail API client returned by googleapiclient's `build()`.
+
+Serves a synthetic mailbox and simulates HTTP round-trip latency and
+rate-limit failures, so `GmailService` can be exercised and benchmarked
+without talking to Google:
+
+    api = FakeGmailApi(SyntheticMailbox(size=500), latency=0.05)
+    svc = GmailService(service=api)
+"""
+import base64
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage, Message
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httplib2
+from googleapiclient.errors import BatchError, HttpError
+
+MAX_BATCH_SIZE = 100
+
+SYSTEM_LABEL_IDS = ("INBOX", "SENT", "DRAFT", "SPAM", "TRASH", "UNREAD", "STARRED", "IMPORTANT", "CATEGORY_PERSONAL")
+
+WORDS = (
+    "project meeting invoice deadline review budget report schedule update "
+    "client launch contract design release feedback travel payment team "
+    "quarter roadmap hiring offer agenda notes follow-up approval"
+).split()
+
+
+def make_http_error(status: int, reason: str = "") -> HttpError:
+    """Build an HttpError shaped like the ones googleapiclient raises."""
+    resp = httplib2.Response({"status": status})
+    content = json.dumps(
+        {"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}}
+    ).encode("utf-8")
+    return HttpError(resp, content)
+
+
+# -----------------------
+# Synthetic Mailbox
+# -----------------------
+
+class SyntheticMailbox:
+    """
+    Deterministic mailbox of `size` messages. The mix includes plain-text,
+    HTML-only, multipart/alternative, messages with attachments and long
+    reply threads with quoted history.
+    """
+
+    def __init__(self, size: int = 200, seed: int = 7, attachment_bytes: int = 200_000):
+        self.rng = random.Random(seed)
+        self.attachment_bytes = attachment_bytes
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.order: List[str] = []  # newest first
+        self.history_id = 1000
+        self.history: List[Dict[str, Any]] = []
+        self.min_history_id = 0  # startHistoryId values below this are "expired"
+        self.added = 0              # messages ever added (deleted ones keep their index)
+        self.user_labels: Dict[str, str] = {}  # label ID -> name, of labels made by create_label
+        start = datetime(2025, 1, 1)
+        for i in range(size):
+            self.add_message(start + timedelta(minutes=37 * i))
+
+    def _sentence(self, n: int = 12) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+    def _build_mime(self, index: int, thread_len: int) -> EmailMessage:
+        kind = index % 5
+        msg = EmailMessage()
+        sender = f"user{index % 23}@example{index % 4}.com"
+        msg["From"] = f"User {index % 23} <{sender}>"
+        msg["To"] = "me@example.com"
+        if index % 3 == 0:
+            msg["Cc"] = f"team{index % 7}@example.com"
+        msg["Subject"] = f"{self.rng.choice(WORDS).capitalize()} {self.rng.choice(WORDS)} #{index}"
+
+        text = "\n\n".join(self._sentence(self.rng.randint(8, 30)) for _ in range(self.rng.randint(1, 5)))
+        if kind == 4:
+            # Long reply thread: quoted history plus a signature block
+            quoted = "\n".join(
+                f"> {self._sentence(14)}" for _ in range(thread_len * 6)
+            )
+            text += f"\n\nOn Mon, Jan 6, 2025 at 10:00 AM {sender} wrote:\n{quoted}"
+        text += f"\n\n--\nUser {index % 23}\nExample Corp | +1 555 0100"
+        html = "<html><body>" + "".join(
+            f"<p>{p}</p>" for p in text.split("\n\n")
+        ) + "<div style='display:none'>tracking</div></body></html>"
+
+        if kind == 1:
+            msg.set_content(html, subtype="html")
+        elif kind == 2:
+            msg.set_content(text)
+            msg.add_alternative(html, subtype="html")
+        elif kind == 3:
+            msg.set_content(text)
+            payload = bytes(self.rng.getrandbits(8) for _ in range(min(self.attachment_bytes, 4096)))
+            payload = (payload * (self.attachment_bytes // max(len(payload), 1) + 1))[: self.attachment_bytes]
+            msg.add_attachment(payload, maintype="application", subtype="pdf", filename=f"doc{index}.pdf")
+        else:
+            msg.set_content(text)
+        return msg
+
+    def add_message(
+        self,
+        when: Optional[datetime] = None,
+        labels: Optional[List[str]] = None,
+        mime: Optional[Message] = None,
+    ) -> str:
+        """Append a message (newest) to the mailbox and return its ID; `mime` defaults to a generated one."""
+        index = self.added
+        self.added += 1
+        message_id = f"{index:016x}"
+        self.history_id += 1
+        mime = mime or self._build_mime(index, thread_len=self.rng.randint(2, 6))
+        when = when or datetime.now()
+        self.messages[message_id] = {
+            "id": message_id,
+            "threadId": f"t{index // 3:015x}",
+            "historyId": str(self.history_id),
+            "labelIds": labels or (["INBOX", "UNREAD"] if index % 2 else ["INBOX"]),
+            "internalDate": str(int(when.timestamp() * 1000)),
+            "mime": mime,
+            "raw_bytes": mime.as_bytes(),
+        }
+        self.order.insert(0, message_id)
+        stub = {"id": message_id, "threadId": self.messages[message_id]["threadId"]}
+        self.history.append({
+            "id": str(self.history_id),
+            "messages": [stub],
+            "messagesAdded": [{"message": {**stub, "labelIds": list(self.messages[message_id]["labelIds"])}}],
+        })
+        return message_id
+
+    def modify_labels(self, message_id: str, add: Iterable[str] = (), remove: Iterable[str] = ()):
+        """Change a message's labels as `messages.modify` would, recording labelAdded / labelRemoved history."""
+        m = self.messages[message_id]
+        stub = {"id": message_id, "threadId": m["threadId"]}
+        for key, delta in (("labelsAdded", [l for l in add if l not in m["labelIds"]]),
+                           ("labelsRemoved", [l for l in remove if l in m["labelIds"]])):
+            if not delta:
+                continue
+            if key == "labelsAdded":
+                m["labelIds"] = m["labelIds"] + delta
+            else:
+                m["labelIds"] = [l for l in m["labelIds"] if l not in delta]
+            self.history_id += 1
+            m["historyId"] = str(self.history_id)
+            self.history.append({
+                "id": str(self.history_id),
+                "messages": [stub],
+                key: [{"message": {**stub, "labelIds": list(m["labelIds"])}, "labelIds": delta}],
+            })
+
+    def create_label(self, name: str) -> str:
+        """Create a user label, as `labels.create` would; returns its ID (Label_N)."""
+        label_id = f"Label_{len(self.user_labels) + 1}"
+        self.user_labels[label_id] = name
+        return label_id
+
+    def delete_message(self, message_id: str):
+        """Permanently delete a message, recording messageDeleted history."""
+        m = self.messages.pop(message_id)
+        self.order.remove(message_id)
+        self.history_id += 1
+        stub = {"id": message_id, "threadId": m["threadId"]}
+        self.history.append({"id": str(self.history_id), "messages": [stub], "messagesDeleted": [{"message": stub}]})
+
+    def expire_history(self):
+        """Make every history ID issued so far too old for `history.list`."""
+        self.min_history_id = self.history_id + 1
+
+    def raw_message(self, message_id: str) -> Dict[str, Any]:
+        m = self.messages[message_id]
+        return {
+            "id": m["id"],
+            "threadId": m["threadId"],
+            "historyId": m["historyId"],
+            "labelIds": list(m["labelIds"]),
+            "internalDate": m["internalDate"],
+            "sizeEstimate": len(m["raw_bytes"]),
+            "raw": base64.urlsafe_b64encode(m["raw_bytes"]).decode("ascii"),
+        }
+
+    def full_message(self, message_id: str) -> Dict[str, Any]:
+        """The message as `messages.get(format="full")` returns it."""
+        m = self.messages[message_id]
+        return {
+            "id": m["id"],
+            "threadId": m["threadId"],
+            "historyId": m["historyId"],
+            "labelIds": list(m["labelIds"]),
+            "internalDate": m["internalDate"],
+            "snippet": m["mime"].get("Subject", "")[:200],
+            "sizeEstimate": len(m["raw_bytes"]),
+            "payload": _full_payload(message_id, m["mime"], ""),
+        }
+
+    def attachment(self, message_id: str, attachment_id: str) -> Dict[str, Any]:
+        part = _find_part(self.messages[message_id]["mime"], attachment_id.rsplit("-", 1)[-1])
+        data = part.get_payload(decode=True) or b""
+        return {"size": len(data), "data": base64.urlsafe_b64encode(data).decode("ascii")}
+
+
+# Bodies Gmail leaves out of FULL responses (fetched with attachments.get instead)
+INLINE_BODY_LIMIT = 2_000_000
+
+
+def _full_payload(message_id: str, part: Message, part_id: str) -> Dict[str, Any]:
+    payload = {
+        "partId": part_id,
+        "mimeType": part.get_content_type(),
+        "filename": part.get_filename() or "",
+        "headers": [{"name": k, "value": str(v)} for k, v in part.raw_items()],
+    }
+    if part.is_multipart():
+        payload["body"] = {"size": 0}
+        payload["parts"] = [
+            _full_payload(message_id, sub, f"{part_id}.{i}" if part_id else str(i))
+            for i, sub in enumerate(part.get_payload())
+        ]
+        return payload
+
+    data = part.get_payload(decode=True) or b""
+    if payload["filename"] or len(data) > INLINE_BODY_LIMIT:
+        payload["body"] = {"attachmentId": f"att-{message_id}-{part_id}", "size": len(data)}
+    else:
+        payload["body"] = {"size": len(data), "data": base64.urlsafe_b64encode(data).decode("ascii")}
+    return payload
+
+
+def _find_part(part: Message, part_id: str) -> Message:
+    for index in filter(None, part_id.split(".")):
+        part = part.get_payload()[int(index)]
+    return part
+
+
+# -----------------------
+# Partial Responses (`fields`)
+# -----------------------
+
+def _parse_fields(spec: str, pos: int = 0) -> Tuple[Dict[str, Any], int]:
+    """Parse a `fields` selector ("a,b/c,d(e,f)") into {name: sub-selector or None}."""
+    selection: Dict[str, Any] = {}
+    while pos < len(spec):
+        end = pos
+        while end < len(spec) and spec[end] not in ",()":
+            end += 1
+        path = spec[pos:end].strip().split("/")
+        sub = None
+        if end < len(spec) and spec[end] == "(":
+            sub, end = _parse_fields(spec, end + 1)
+            end += 1  # ")"
+        node = selection
+        for name in path[:-1]:
+            node = node.setdefault(name, {}) or {}
+        node[path[-1]] = sub
+        if end < len(spec) and spec[end] == ")":
+            return selection, end
+        pos = end + 1
+    return selection, pos
+
+
+def _select(value: Any, selection: Optional[Dict[str, Any]]) -> Any:
+    if selection is None:
+        return value
+    if isinstance(value, list):
+        return [_select(v, selection) for v in value]
+    if isinstance(value, dict):
+        return {k: _select(value[k], sub) for k, sub in selection.items() if k in value}
+    return value
+
+
+def apply_fields(response: Dict[str, Any], fields: Optional[str]) -> Dict[str, Any]:
+    """Trim a response to a `fields` selector, like Google's partial responses."""
+    return _select(response, _parse_fields(fields)[0]) if fields else response
+
+
+# -----------------------
+# Fake API Resources
+# -----------------------
+
+class FakeRequest:
+    """Mimics googleapiclient.http.HttpRequest: one `execute()` is one round-trip."""
+
+    def __init__(self, api: "FakeGmailApi", fn: Callable[[], Any]):
+        self.api = api
+        self.fn = fn
+
+    def execute(self, http=None, num_retries: int = 0):
+        self.api._round_trip(1)
+        return self.api._maybe_fail(self.fn)
+
+
+class FakeBatch:
+    """Mimics googleapiclient.http.BatchHttpRequest."""
+
+    def __init__(self, api: "FakeGmailApi", callback: Optional[Callable] = None):
+        self.api = api
+        self.callback = callback
+        self.requests: List[tuple] = []
+
+    def add(self, request: FakeRequest, callback: Optional[Callable] = None, request_id: Optional[str] = None):
+        if len(self.requests) >= MAX_BATCH_SIZE:
+            raise BatchError(f"Exceeded the maximum calls({MAX_BATCH_SIZE}) in a single batch request.")
+        request_id = request_id or str(len(self.requests))
+        self.requests.append((request_id, request, callback or self.callback))
+
+    def execute(self, http=None):
+        if not self.requests:
+            return
+        self.api._round_trip(len(self.requests))
+        for request_id, request, callback in self.requests:
+            response, exception = None, None
+            try:
+                response = self.api._maybe_fail(request.fn)
+            except HttpError as e:
+                exception = e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class _Messages:
+    def __init__(self, api: "FakeGmailApi"):
+        self.api = api
+
+    def list(self, userId: str = "me", q: Optional[str] = None, maxResults: int = 100, pageToken: Optional[str] = None, **kwargs):
+        def run():
+            order = self.api.mailbox.order
+            start = int(pageToken or 0)
+            page = order[start : start + maxResults]
+            resp = {
+                "messages": [{"id": mid, "threadId": self.api.mailbox.messages[mid]["threadId"]} for mid in page],
+                "resultSizeEstimate": len(order),
+            }
+            if start + maxResults < len(order):
+                resp["nextPageToken"] = str(start + maxResults)
+            return resp
+
+        return FakeRequest(self.api, run)
+
+    def get(self, userId: str = "me", id: str = "", format: str = "full", fields: Optional[str] = None, **kwargs):
+        def run():
+            if id not in self.api.mailbox.messages:
+                raise make_http_error(404, "notFound")
+            if format == "raw":
+                return apply_fields(self.api.mailbox.raw_message(id), fields)
+            if format == "full":
+                return apply_fields(self.api.mailbox.full_message(id), fields)
+            raise NotImplementedError(f"format={format!r} is not simulated")
+
+        return FakeRequest(self.api, run)
+
+    def attachments(self) -> "_Attachments":
+        return _Attachments(self.api)
+
+
+class _Attachments:
+    def __init__(self, api: "FakeGmailApi"):
+        self.api = api
+
+    def get(self, userId: str = "me", messageId: str = "", id: str = "", **kwargs):
+        def run():
+            if messageId not in self.api.mailbox.messages:
+                raise make_http_error(404, "notFound")
+            return self.api.mailbox.attachment(messageId, id)
+
+        return FakeRequest(self.api, run)
+
+
+class _History:
+    def __init__(self, api: "FakeGmailApi"):
+        self.api = api
+
+    def list(self, userId: str = "me", startHistoryId: str = "0", pageToken: Optional[str] = None, maxResults: int = 100, **kwargs):
+        def run():
+            mailbox = self.api.mailbox
+            if int(startHistoryId) < mailbox.min_history_id:
+                raise make_http_error(404, "notFound")
+            records = [h for h in mailbox.history if int(h["id"]) > int(startHistoryId)]
+            start = int(pageToken or 0)
+            resp = {"history": records[start : start + maxResults], "historyId": str(mailbox.history_id)}
+            if start + maxResults < len(records):
+                resp["nextPageToken"] = str(start + maxResults)
+            return resp
+
+        return FakeRequest(self.api, run)
+
+
+class _Labels:
+    def __init__(self, api: "FakeGmailApi"):
+        self.api = api
+
+    def list(self, userId: str = "me", **kwargs):
+        def run():
+            system = [{"id": label, "name": label, "type": "system"} for label in SYSTEM_LABEL_IDS]
+            user = [{"id": i, "name": name, "type": "user"} for i, name in self.api.mailbox.user_labels.items()]
+            return {"labels": system + user}
+
+        return FakeRequest(self.api, run)
+
+
+class _Users:
+    def __init__(self, api: "FakeGmailApi"):
+        self.api = api
+
+    def messages(self) -> _Messages:
+        return _Messages(self.api)
+
+    def history(self) -> _History:
+        return _History(self.api)
+
+    def labels(self) -> _Labels:
+        return _Labels(self.api)
+
+    def getProfile(self, userId: str = "me"):
+        mailbox = self.api.mailbox
+        return FakeRequest(
+            self.api,
+            lambda: {
+                "emailAddress": "me@example.com",
+                "messagesTotal": len(mailbox.messages),
+                "threadsTotal": len(mailbox.messages) // 3 + 1,
+                "historyId": str(mailbox.history_id),
+            },
+        )
+
+
+class FakeGmailApi:
+    """
+    Offline Gmail API client.
+
+    `latency` is the cost of one HTTP round-trip, `per_item_latency` the
+    server-side cost of each (sub-)request, and `error_rate` the probability
+    that a sub-request fails with a 429.
+    """
+
+    def __init__(
+        self,
+        mailbox: SyntheticMailbox,
+        latency: float = 0.05,
+        per_item_latency: float = 0.002,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.mailbox = mailbox
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"round_trips": 0, "sub_requests": 0, "errors": 0}
+
+    def users(self) -> _Users:
+        return _Users(self)
+
+    def new_batch_http_request(self, callback: Optional[Callable] = None) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+    def _round_trip(self, items: int):
+        with self.lock:
+            self.stats["round_trips"] += 1
+            self.stats["sub_requests"] += items
+        time.sleep(self.latency + self.per_item_latency * items)
+
+    def _maybe_fail(self, fn: Callable[[], Any]):
+        with self.lock:
+            fail = self.error_rate and self.rng.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+        if fail:
+            raise make_http_error(429, "rateLimitExceeded")
+        return fn()
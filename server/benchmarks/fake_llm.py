@@ -0,0 +1,51 @@
+"""
+Offline chat model with configurable latency.
+
+`latency` is the time to first token and `token_latency` the delay between
+streamed tokens, so both blocking and streaming paths can be benchmarked.
+Sync calls block with time.sleep; async calls use asyncio.sleep, like a
+real network-bound client.
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeLLM(BaseChatModel):
+    latency: float = 0.5
+    token_latency: float = 0.01
+    answer: str = "Based on your emails, the budget review meeting is on Thursday and the invoice is still pending."
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency-llm"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        self.calls += 1
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        return f"{self.answer} (prompt: {prompt_chars} chars)"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency + self.token_latency * len(self.answer.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency + self.token_latency * len(self.answer.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in self._reply(messages).split(" "):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for token in self._reply(messages).split(" "):
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
@@ -0,0 +1,198 @@
+"""
+Multi-account load test: many simulated accounts served by one process.
+
+1. Every account gets a synthetic mailbox, synced into its own collection.
+2. Chat: concurrent clients send POST /api/v1/chat with the JWT of an
+   account drawn from a Zipf distribution (a few hot accounts, a long
+   tail), so the per-account services pool sees hits, misses and evictions.
+   Each account's collection is then checked to hold only its own mail.
+3. Gmail clients: the same kind of access sequence acquires real
+   (discovery-built, offline) Gmail API clients, with and without the pool.
+
+    cd server
+    python -m benchmarks.load_accounts --accounts 200 --pool-size 32 --clients 16
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+import httpx
+from fastapi import Depends
+from google.oauth2.credentials import Credentials
+from benchmarks.fake_embeddings import FakeEmbeddings
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from benchmarks.fake_llm import FakeLLM
+from app.core.accounts import Account, account_for_email, get_current_account, issue_token
+from app.core.config import settings
+from app.core.metrics import CACHE_EVICTIONS, CACHE_LOOKUPS
+from app.core.services import ServiceRegistry, get_rag_pipeline
+from app.main import app
+from app.services.chroma_store import ChromaStore
+from app.services.gmail_service import GmailService
+from app.services.rag_pipeline import RagPipeline
+from app.services.rate_limiter import AdaptiveRateLimiter
+from app.services.sync_service import SyncService
+
+QUESTIONS = [
+    "what meetings do I have this week",
+    "is the invoice from the client paid",
+    "summarize the budget review feedback",
+    "when is the launch deadline",
+]
+
+
+def zipf_sequence(n_accounts: int, length: int, s: float, seed: int = 1) -> List[int]:
+    weights = [1.0 / (rank ** s) for rank in range(1, n_accounts + 1)]
+    return random.Random(seed).choices(range(n_accounts), weights=weights, k=length)
+
+
+def pool_stats(cache: str) -> Dict[str, float]:
+    lookups = {result: CACHE_LOOKUPS._values.get((cache, result), 0.0) for result in ("hit", "miss")}
+    total = lookups["hit"] + lookups["miss"]
+    return {
+        "hit_rate": lookups["hit"] / total if total else 0.0,
+        "misses": lookups["miss"],
+        "evictions": CACHE_EVICTIONS._values.get((cache,), 0.0),
+    }
+
+
+def ms(samples: List[float], q: int) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1] * 1000
+
+
+# -----------------------
+# Phases
+# -----------------------
+
+def sync_accounts(registry: ServiceRegistry, accounts: List[Account], messages: int) -> Dict[str, set]:
+    subjects: Dict[str, set] = {}
+    start = time.perf_counter()
+    for n, account in enumerate(accounts):
+        mailbox = SyntheticMailbox(size=messages, seed=n, attachment_bytes=1_000)
+        subjects[account.id] = {m["mime"]["Subject"] for m in mailbox.messages.values()}
+        SyncService(
+            gmail=GmailService(service=FakeGmailApi(mailbox, latency=0, per_item_latency=0)),
+            chroma=registry.chroma_store(account),
+            cache=registry.rag_pipeline(account).answer_cache,
+            state_path=account.sync_state_path,
+            checkpoint_path=account.sync_checkpoint_path,
+        ).run(full_sync=True)
+    elapsed = time.perf_counter() - start
+    print(f"Synced {len(accounts)} accounts x {messages} messages in {elapsed:.1f}s")
+    return subjects
+
+
+async def run_chat(accounts: List[Account], sequence: List[int], clients: int) -> List[float]:
+    tokens = [issue_token(a.email) for a in accounts]
+    latencies: List[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def worker(n: int):
+            for i in range(n, len(sequence), clients):
+                headers = {"Authorization": f"Bearer {tokens[sequence[i]]}"}
+                start = time.perf_counter()
+                resp = await client.post("/api/v1/chat", json={"query": QUESTIONS[i % len(QUESTIONS)]}, headers=headers)
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+    return latencies
+
+
+def check_isolation(registry: ServiceRegistry, accounts: List[Account], subjects: Dict[str, set]) -> int:
+    """Chunks found in an account's collection that don't come from its mailbox."""
+    foreign = 0
+    for account in accounts:
+        metadatas = registry.chroma_store(account).vector_db.get(include=["metadatas"])["metadatas"]
+        foreign += sum(1 for m in metadatas if m.get("subject") not in subjects[account.id])
+    return foreign
+
+
+def bench_gmail_pool(accounts: List[Account], sequence: List[int], pool_size: int) -> List[float]:
+    settings.GMAIL_CLIENT_POOL_SIZE = pool_size
+    registry = ServiceRegistry()
+    expiry = datetime.utcnow() + timedelta(days=1)
+    for account in accounts:
+        # Offline: the tokens are never sent anywhere
+        creds = Credentials(
+            token="offline", refresh_token="offline", client_id="offline", client_secret="offline",
+            token_uri="https://oauth2.googleapis.com/token", scopes=["https://mail.google.com/"], expiry=expiry,
+        )
+        registry.credentials(account).save(creds)
+
+    latencies = []
+    for index in sequence:
+        start = time.perf_counter()
+        registry.gmail_service(accounts[index])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20, help="messages per account")
+    parser.add_argument("--requests", type=int, default=1000, help="chat requests in total")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent chat clients")
+    parser.add_argument("--zipf", type=float, default=1.1, help="skew of the account popularity")
+    parser.add_argument("--pool-size", type=int, default=32, help="GMAIL_CLIENT_POOL_SIZE / ACCOUNT_SERVICES_CACHE_SIZE")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    settings.MULTI_ACCOUNT = True
+    settings.ACCOUNT_SERVICES_CACHE_SIZE = args.pool_size
+    accounts = [account_for_email(f"user{n}@example.com") for n in range(args.accounts)]
+    sequence = zipf_sequence(args.accounts, args.requests, args.zipf)
+    print(f"{args.accounts} accounts, {len(set(sequence))} active, pool size {args.pool_size}")
+
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # Account state lives under ./storage/accounts
+        os.chdir(workdir)
+        try:
+            chroma = ChromaStore(storage_dir="chroma", embedding_model=FakeEmbeddings(), embedding_model_name="fake-hash-64")
+            rag = RagPipeline(
+                chroma=chroma,
+                llm=FakeLLM(latency=args.llm_latency, token_latency=0),
+                limiter=AdaptiveRateLimiter("bench-llm", requests_per_minute=1_000_000),
+            )
+            registry = ServiceRegistry(chroma=chroma, rag=rag)
+            subjects = sync_accounts(registry, accounts, args.messages)
+
+            registry.accounts.clear()  # start the chat phase cold
+            app.dependency_overrides[get_rag_pipeline] = lambda account=Depends(get_current_account): registry.rag_pipeline(account)
+            start = time.perf_counter()
+            chat = asyncio.run(run_chat(accounts, sequence, args.clients))
+            elapsed = time.perf_counter() - start
+            services = pool_stats("account_services")
+            print(
+                f"chat: {len(chat)} requests in {elapsed:.1f}s -> {len(chat) / elapsed:.1f} req/s, "
+                f"p50 {ms(chat, 50):.1f} ms, p95 {ms(chat, 95):.1f} ms, p99 {ms(chat, 99):.1f} ms; "
+                f"services pool hit rate {services['hit_rate']:.1%}, {services['evictions']:.0f} evictions"
+            )
+            print(f"isolation: {check_isolation(registry, accounts, subjects)} foreign chunks across {len(accounts)} collections")
+
+            for pool_size in (0, args.pool_size):
+                before = pool_stats("gmail_clients")
+                latencies = bench_gmail_pool(accounts, sequence, pool_size)
+                after = pool_stats("gmail_clients")
+                misses = after["misses"] - before["misses"]
+                print(
+                    f"gmail clients, pool {pool_size:>4}: mean {statistics.mean(latencies) * 1000:7.2f} ms, "
+                    f"p50 {ms(latencies, 50):7.2f} ms, p95 {ms(latencies, 95):7.2f} ms, "
+                    f"hit rate {1 - misses / len(latencies):.1%}"
+                )
+        finally:
+            app.dependency_overrides.clear()
+            os.chdir(previous_cwd)
+
+
+if __name__ == "__main__":
+    main()
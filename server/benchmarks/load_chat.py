@@ -0,0 +1,100 @@
+"""
+Load test for POST /api/v1/chat with offline stand-ins (fake embeddings,
+a temporary Chroma collection and a fake LLM with fixed latency).
+Shows chat throughput as the number of concurrent clients grows.
+
+Every request is answered for real: the questions repeat, so the semantic
+answer cache would turn most of them into hits. `--cache` measures that
+case instead, with a cache emptied before each client count.
+
+    cd server
+    python -m benchmarks.load_chat --llm-latency 0.5 --clients 1 2 4 8 16
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+import httpx
+from benchmarks.fake_embeddings import FakeEmbeddings
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from benchmarks.fake_llm import FakeLLM
+from app.core.services import get_rag_pipeline
+from app.main import app
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.chroma_store import ChromaStore
+from app.services.gmail_service import GmailService
+from app.services.rag_pipeline import RagPipeline
+from app.services.rate_limiter import AdaptiveRateLimiter
+
+QUESTIONS = [
+    "what meetings do I have this week",
+    "is the invoice from the client paid",
+    "summarize the budget review feedback",
+    "when is the launch deadline",
+]
+
+
+def build_pipeline(storage_dir: str, messages: int, llm_latency: float) -> RagPipeline:
+    mailbox = SyntheticMailbox(size=messages, attachment_bytes=1_000)
+    gmail = GmailService(service=FakeGmailApi(mailbox, latency=0))
+    chroma = ChromaStore(storage_dir=storage_dir, embedding_model=FakeEmbeddings(), embedding_model_name="fake-hash-64")
+    chroma.upsert_emails(gmail.fetch_messages_batch(list(mailbox.order)))
+    # Generous limiter: the fake LLM has no quota to protect
+    limiter = AdaptiveRateLimiter("bench-llm", requests_per_minute=1_000_000)
+    return RagPipeline(
+        chroma=chroma,
+        llm=FakeLLM(latency=llm_latency, token_latency=0),
+        limiter=limiter,
+        # Cosine similarity never reaches 2: every question is answered for real
+        cache=SemanticAnswerCache(threshold=2.0),
+    )
+
+
+async def run_clients(clients: int, requests_per_client: int):
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def worker(n: int):
+            for i in range(requests_per_client):
+                start = time.perf_counter()
+                resp = await client.post("/api/v1/chat", json={"query": QUESTIONS[(n + i) % len(QUESTIONS)]})
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--requests", type=int, default=4, help="requests per client")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--cache", action="store_true", help="serve repeated questions from the answer cache")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        pipeline = build_pipeline(storage_dir, args.messages, args.llm_latency)
+        app.dependency_overrides[get_rag_pipeline] = lambda: pipeline
+
+        for clients in args.clients:
+            if args.cache:
+                pipeline.answer_cache = SemanticAnswerCache()
+            elapsed, latencies = asyncio.run(run_clients(clients, args.requests))
+            total = len(latencies)
+            print(
+                f"clients={clients:>3}: {total} requests in {elapsed:6.2f}s -> {total / elapsed:6.2f} req/s, "
+                f"p50 {statistics.median(latencies) * 1000:7.1f} ms, max {max(latencies) * 1000:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+Shared setup for offline benchmarks.
+
+Import this module before anything from `app` so that settings load without a
+real `.env` (no Google or Gemini credentials are needed to run benchmarks).
+"""
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for key, value in {
+    "GOOGLE_CLIENT_ID": "offline-benchmark",
+    "GOOGLE_CLIENT_SECRET": "offline-benchmark",
+    "GOOGLE_REDIRECT_URI": "http://localhost:8000/api/v1/auth/callback",
+    "SECRET_KEY": "offline-benchmark-secret-key-0123456789",
+    "GEMINI_API_KEY": "offline-benchmark",
+}.items():
+    os.environ.setdefault(key, value)
+
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
@@ -0,0 +1,244 @@
+"""
+Offline benchmark suite: end-to-end numbers for one commit, with every
+external service replaced by a local stand-in (fake Gmail API serving a
+synthetic mailbox, hashed fake embeddings, fake LLM with fixed latency).
+
+Measures
+- sync:       full sync of the mailbox through SyncService (messages/s)
+- chat:       POST /api/v1/chat latency (p50 / p95 / p99), answer cache off
+- highlights: forced regeneration and GET /api/v1/highlights latency
+- memory:     peak RSS of the process
+
+Results are written to benchmarks/results/<commit>.json and compared with
+the previous run, so regressions show up between commits:
+
+    cd server
+    python -m benchmarks.suite
+    python -m benchmarks.suite --messages 2000 --gmail-latency 0.05 --llm-latency 0.3 --no-save
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks import offline  # noqa: F401  (must precede app imports)
+import httpx
+from benchmarks.fake_embeddings import FakeEmbeddings
+from benchmarks.fake_gmail import FakeGmailApi, SyntheticMailbox
+from benchmarks.fake_llm import FakeLLM
+from app.core.config import settings
+from app.core.services import get_highlights_service, get_rag_pipeline
+from app.main import app
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.chroma_store import ChromaStore
+from app.services.gmail_service import GmailService
+from app.services.highlights_service import HighlightsService
+from app.services.rag_pipeline import RagPipeline
+from app.services.rate_limiter import AdaptiveRateLimiter
+from app.services.sync_service import SyncService
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+QUESTIONS = [
+    "what meetings do I have this week",
+    "is the invoice from the client paid",
+    "summarize the budget review feedback",
+    "when is the launch deadline",
+    "any updates on the contract design",
+    "who sent the travel payment report",
+    "what did the team say about hiring",
+    "notes from the quarter roadmap agenda",
+]
+
+# Metrics where a lower value is better (the others are throughputs)
+LOWER_IS_BETTER = ("_ms", "_mib")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def git_commit() -> str:
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout
+        return f"{sha}-dirty" if dirty.strip() else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# -----------------------
+# Scenarios
+# -----------------------
+
+def bench_sync(gmail: GmailService, chroma: ChromaStore, messages: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    summary = SyncService(gmail=gmail, chroma=chroma).run(full_sync=True)
+    elapsed = time.perf_counter() - start
+    return {"sync_messages": summary["synced"], "sync_total_ms": elapsed * 1000, "sync_msgs_per_sec": summary["synced"] / elapsed}
+
+
+async def bench_chat(requests: int, clients: int) -> Tuple[float, List[float]]:
+    latencies: List[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def worker(n: int):
+            for i in range(n, requests, clients):
+                start = time.perf_counter()
+                resp = await client.post("/api/v1/chat", json={"query": QUESTIONS[i % len(QUESTIONS)]})
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+async def bench_highlights_get(requests: int) -> List[float]:
+    latencies: List[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            resp = await client.get("/api/v1/highlights")
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_highlights_refresh(service: HighlightsService, runs: int) -> List[float]:
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        service.refresh(force=True)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_suite(args) -> Dict[str, float]:
+    metrics: Dict[str, float] = {}
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # SyncService / HighlightsService keep their state under ./storage
+        os.chdir(workdir)
+        try:
+            mailbox = SyntheticMailbox(size=args.messages, attachment_bytes=args.attachment_bytes)
+            gmail = GmailService(service=FakeGmailApi(mailbox, latency=args.gmail_latency, per_item_latency=0.001))
+            embeddings = FakeEmbeddings(latency=args.embed_latency, per_text_latency=0.0005)
+            chroma = ChromaStore(storage_dir="chroma", embedding_model=embeddings, embedding_model_name="fake-hash-64")
+
+            metrics.update(bench_sync(gmail, chroma, args.messages))
+
+            pipeline = RagPipeline(
+                chroma=chroma,
+                llm=FakeLLM(latency=args.llm_latency, token_latency=0),
+                # The fake LLM has no quota to protect
+                limiter=AdaptiveRateLimiter("bench-llm", requests_per_minute=1_000_000),
+                # Cosine similarity never reaches 2: every question is answered for real
+                cache=SemanticAnswerCache(threshold=2.0),
+            )
+            highlights = HighlightsService(pipeline)
+            app.dependency_overrides[get_rag_pipeline] = lambda: pipeline
+            app.dependency_overrides[get_highlights_service] = lambda: highlights
+
+            elapsed, chat = asyncio.run(bench_chat(args.chat_requests, args.clients))
+            metrics.update({f"chat_{k}_ms": v * 1000 for k, v in percentiles(chat).items()})
+            metrics["chat_req_per_sec"] = len(chat) / elapsed
+
+            refresh = bench_highlights_refresh(highlights, args.highlights_runs)
+            metrics.update({f"highlights_refresh_{k}_ms": v * 1000 for k, v in percentiles(refresh).items()})
+            served = asyncio.run(bench_highlights_get(args.chat_requests))
+            metrics.update({f"highlights_get_{k}_ms": v * 1000 for k, v in percentiles(served).items()})
+
+            chroma.lexical_index.close()
+        finally:
+            app.dependency_overrides.clear()
+            os.chdir(previous_cwd)
+
+    metrics["peak_rss_mib"] = peak_rss_mib()
+    return metrics
+
+
+# -----------------------
+# Results
+# -----------------------
+
+def load_previous(commit: str) -> Optional[Dict[str, Any]]:
+    runs = [p for p in glob.glob(os.path.join(RESULTS_DIR, "*.json")) if os.path.basename(p) != f"{commit}.json"]
+    if not runs:
+        return None
+    with open(max(runs, key=os.path.getmtime)) as f:
+        return json.load(f)
+
+
+def report(result: Dict[str, Any], previous: Optional[Dict[str, Any]], threshold: float):
+    print(f"\nCommit {result['commit']} ({result['config']['messages']} messages):")
+    same_config = previous is not None and previous["config"] == result["config"]
+    if previous is not None and not same_config:
+        print(f"  (previous run {previous['commit']} used other settings, not comparing)")
+
+    for name, value in result["metrics"].items():
+        line = f"  {name:<28} {value:10.2f}"
+        if same_config and name in previous["metrics"] and previous["metrics"][name]:
+            before = previous["metrics"][name]
+            change = (value - before) / before
+            worse = change > threshold if name.endswith(LOWER_IS_BETTER) else change < -threshold
+            line += f"   {change:+7.1%} vs {previous['commit']}" + ("   <-- REGRESSION" if worse else "")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--attachment-bytes", type=int, default=200_000)
+    parser.add_argument("--gmail-latency", type=float, default=0.05, help="seconds per Gmail round-trip")
+    parser.add_argument("--embed-latency", type=float, default=0.1, help="seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per LLM call")
+    parser.add_argument("--chat-requests", type=int, default=40)
+    parser.add_argument("--clients", type=int, default=4, help="concurrent chat clients")
+    parser.add_argument("--highlights-runs", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change flagged as a regression")
+    parser.add_argument("--no-save", action="store_true", help="don't write results/<commit>.json")
+    args = parser.parse_args()
+
+    # Sync the whole synthetic mailbox whatever the local .env says
+    settings.SYNC_FULL_SYNC_DAYS = 0
+    settings.SYNC_MAX_MESSAGES = 0
+
+    commit = git_commit()
+    config = {k: v for k, v in vars(args).items() if k not in ("threshold", "no_save")}
+    result = {
+        "commit": commit,
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "metrics": {k: round(v, 3) for k, v in run_suite(args).items()},
+    }
+
+    report(result, load_previous(commit), args.threshold)
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(os.path.join(RESULTS_DIR, f"{commit}.json"), "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()